@@ -0,0 +1,70 @@
+"""
+Single-pass extraction from record files. Each ActionHandler subscribes to the action types it needs, and
+run_handlers decodes the record once, dispatching every action to the handlers subscribed to its type. Actions no
+handler subscribes to are skipped over without being decoded.
+
+    game = GameHandler()
+    build_id = BuildIdHandler()
+    run_handlers("record_123.txt", [game, build_id])
+    game.result(), build_id.result()
+"""
+import os
+from abc import ABC, abstractmethod
+from typing import BinaryIO, Dict, FrozenSet, Iterable, List, Optional, Union
+
+from record_parser import DecodeStats, RecoveryReport, id_to_action_name, iter_actions
+
+
+class ActionHandler(ABC):
+    """
+    Base class of the handlers run by run_handlers. Subclasses set action_names to the action types they want (None
+    for every action), and implement handle, called with each of those actions in record order, and result, called
+    once the record has been parsed.
+    """
+    action_names: Optional[FrozenSet[str]] = None
+
+    @abstractmethod
+    def handle(self, action_name: str, action):
+        pass
+
+    @abstractmethod
+    def result(self):
+        pass
+
+
+def subscribed_action_names(handlers: Iterable[ActionHandler]) -> Optional[FrozenSet[str]]:
+    """Every action type any of handlers wants, or None if one of them wants every action."""
+    action_names = set()
+    for handler in handlers:
+        if handler.action_names is None:
+            return None
+        action_names.update(handler.action_names)
+    return frozenset(action_names)
+
+
+def _dispatch_table(handlers: List[ActionHandler]) -> Dict[str, list]:
+    return {action_name: [handler.handle for handler in handlers
+                          if handler.action_names is None or action_name in handler.action_names]
+            for action_name in id_to_action_name.values()}
+
+
+def run_handlers(path_or_file: Union[str, os.PathLike, BinaryIO], handlers: Iterable[ActionHandler],
+                 guid_format: str = "hex", report: Optional[RecoveryReport] = None, compiled: bool = False,
+                 stats: Optional[DecodeStats] = None) -> int:
+    """
+    Decodes the record once, passing every action to the handlers subscribed to its type, in the order they were
+    given. Returns the number of bytes at the end of the record that could not be parsed. The remaining arguments are
+    passed on to iter_actions.
+    """
+    if isinstance(path_or_file, (str, os.PathLike)):
+        with open(path_or_file, 'rb') as f:
+            return run_handlers(f, handlers, guid_format, report, compiled, stats)
+    handlers = list(handlers)
+    dispatch = _dispatch_table(handlers)
+    actions = iter_actions(path_or_file, action_names=subscribed_action_names(handlers), guid_format=guid_format,
+                           report=report, compiled=compiled, stats=stats)
+    for _, action in actions:
+        action_name = id_to_action_name[action.action_id]
+        for handle in dispatch[action_name]:
+            handle(action_name, action)
+    return len(path_or_file.read())
@@ -1,18 +1,21 @@
 import pickle
-from collections import defaultdict
+import sys
+from typing import Dict, Iterable
 
 import pandas as pd
-import numpy as np
 import itertools
 
+from game_format import GAMES_SUFFIX, load_games
 from run_history_reader import Game, Unit, Board, Player, TreasureChoice
 
+# My main account's ID
+MAIN_PLAYER_ID = "429402B2E2AD1FA4"
+
 
 def is_main(game: Game):
     results = game.final_results
     for i, item in enumerate(results):
-        # My main account's ID
-        if item.id == "429402B2E2AD1FA4":
+        if item.id == MAIN_PLAYER_ID:
             return True
     return results is not None and game.final_board is not None
 
@@ -20,7 +23,7 @@ def is_main(game: Game):
 def get_final_level(game: Game):
     results = game.final_results
     for i, item in enumerate(results):
-        if item.id == "429402B2E2AD1FA4":
+        if item.id == MAIN_PLAYER_ID:
             return item.level
     return 0
 
@@ -28,126 +31,162 @@ def get_final_level(game: Game):
 def get_current_level(game: Game, turn_number: int):
     leaderboard = game.leaderboards[turn_number - 1]
     for i, item in enumerate(leaderboard):
-        if item.id == "429402B2E2AD1FA4":
+        if item.id == MAIN_PLAYER_ID:
             return item.level
 
 
-if __name__ == "__main__":
-    games = pickle.load(open("games.pkl", "rb"))
-
+def classify_comp(board: Board) -> str:
+    trees = 0
+    evils = 0
+    mages = 0
+    slays = 0
+    dwarves = 0
+    good_boys = 0
+    for unit in board.units:
+        if "slay" in unit.keywords:
+            slays += 1
+        if "mage" in unit.subtypes:
+            mages += 1
+        if "treant" in unit.subtypes:
+            trees += 1
+        if "evil" in unit.subtypes:
+            evils += 1
+        if "dwarf" in unit.subtypes:
+            dwarves += 1
+        if unit.name == "Good Boy":
+            good_boys += 1
+        if unit.name in ["Baba Yaga", "Grim Soul", "Riverwish Mermaid", "Lightning Dragon"]:
+            slays += 1
+    if good_boys > 0:
+        return "Good Boy"
+    elif slays > 1:
+        return "Slay"
+    elif trees > 4:
+        return "Pure Trees"
+    elif dwarves > 3:
+        return "Dwarves"
+    elif evils > 5:
+        return "Evil"
+    elif mages > 2:
+        return "Mages"
+    else:
+        return "Other"
+
+
+def build_frames(games: Iterable[Game]) -> Dict[str, pd.DataFrame]:
+    """
+    Flattens the main account's games into long-form DataFrames, one row per game, treasure pick, purchase, shop turn
+    or opponent result.
+    """
+    game_rows = []
+    treasure_rows = []
+    purchase_rows = []
+    roll_rows = []
+    opponent_rows = []
     count = 0
-    made_to_6 = 0
-    treasures = {2: {}, 3: {}, 4: {}, 5: {}, 6: {}}
-    treasure_choices = []
-    comps = []
-    purchases = []
-    rolls_per_turn = defaultdict(list)
-    records = {}
     for game in games:
         if not is_main(game):
             continue
         count += 1
-        was_6 = get_final_level(game) == 6
-        if was_6:
-            made_to_6 += 1
+        final_level = get_final_level(game)
+        game_rows.append((count, game.placement, final_level, classify_comp(game.final_board)))
         for player in game.final_results:
-            current_record = records.get(player.name, (0, 0))
-            if player.place > game.placement:
-                records[player.name] = (current_record[0] + 1, current_record[1])
-            else:
-                records[player.name] = (current_record[0], current_record[1] + 1)
+            opponent_rows.append((player.name, player.place > game.placement))
         for choice in game.treasure_choices:
             if choice.chosen != "Skip":
-                treasure_record = pd.Series({"tier": choice.tier, "placement": game.placement, "name": choice.chosen})
-                treasure_choices.append(treasure_record)
+                treasure_rows.append((choice.tier, game.placement, choice.chosen))
         for turn in range(1, game.turn + 1):
             player_level = get_current_level(game, turn)
-            rolls_per_turn[turn].append(len(game.shops[turn-1]) - 1)
-            for purchase in itertools.chain.from_iterable(game.bought[turn-1]):
-                purchase_record = pd.Series({"name": purchase.name, "level": player_level, "placement": game.placement, "game": count})
-                purchases.append(purchase_record)
-        trees = 0
-        evils = 0
-        mages = 0
-        slays = 0
-        dwarves = 0
-        good_boys = 0
-        for unit in game.final_board.units:
-            if "slay" in unit.keywords:
-                slays += 1
-            if "mage" in unit.subtypes:
-                mages += 1
-            if "treant" in unit.subtypes:
-                trees += 1
-            if "evil" in unit.subtypes:
-                evils += 1
-            if "dwarf" in unit.subtypes:
-                dwarves += 1
-            if unit.name == "Good Boy":
-                good_boys += 1
-            if unit.name in ["Baba Yaga", "Grim Soul", "Riverwish Mermaid", "Lightning Dragon"]:
-                slays += 1
-        if good_boys > 0:
-            comp = {"comp": "Good Boy", "placement": game.placement}
-        elif slays > 1:
-            comp = {"comp": "Slay", "placement": game.placement}
-        elif trees > 4:
-            comp = {"comp": "Pure Trees", "placement": game.placement}
-        elif dwarves > 3:
-            comp = {"comp": "Dwarves", "placement": game.placement}
-        elif evils > 5:
-            comp = {"comp": "Evil", "placement": game.placement}
-        elif mages > 2:
-            comp = {"comp": "Mages", "placement": game.placement}
-        else:
-            comp = {"comp": "Other", "placement": game.placement}
-            print(game.final_board.units)
-        if was_6:
-            comps.append(pd.Series(comp))
-
-    treasure_choices = pd.DataFrame(treasure_choices)
+            roll_rows.append((turn, len(game.shops[turn - 1]) - 1))
+            for purchase in itertools.chain.from_iterable(game.bought[turn - 1]):
+                purchase_rows.append((purchase.name, player_level, game.placement, count))
+    return {
+        "games": pd.DataFrame(game_rows, columns=["game", "placement", "final_level", "comp"]),
+        "treasure_choices": pd.DataFrame(treasure_rows, columns=["tier", "placement", "name"]),
+        "purchases": pd.DataFrame(purchase_rows, columns=["name", "level", "placement", "game"]),
+        "rolls": pd.DataFrame(roll_rows, columns=["turn", "rolls"]),
+        "opponents": pd.DataFrame(opponent_rows, columns=["name", "won"]),
+    }
+
+
+def _count_and_mean_placement(frame: pd.DataFrame, keys) -> pd.DataFrame:
+    """Count and mean placement per group, most common first, ties in order of first appearance."""
+    table = frame.groupby(keys, sort=False).placement.agg(count="size", placement="mean").reset_index()
+    return table.sort_values("count", ascending=False, kind="stable", ignore_index=True)
+
+
+def treasure_report(treasure_choices: pd.DataFrame) -> pd.DataFrame:
+    """For each tier, every treasure picked at that tier, with its pick count and mean placement over all tiers."""
+    by_name = _count_and_mean_placement(treasure_choices, "name")
+    tiers = treasure_choices[["tier", "name"]].drop_duplicates()
+    table = tiers.merge(by_name, on="name", how="left")
+    return table.sort_values(["tier", "count"], ascending=[True, False], kind="stable", ignore_index=True)
+
+
+def comp_report(games: pd.DataFrame) -> pd.DataFrame:
+    """Count and mean placement of each final board comp, among games that reached level 6."""
+    return _count_and_mean_placement(games[games.final_level == 6], "comp")
+
+
+def purchase_report(purchases: pd.DataFrame) -> pd.DataFrame:
+    """Count and mean placement of each unit bought at each player level, counting a unit once per game and level."""
+    table = _count_and_mean_placement(purchases.drop_duplicates(), ["level", "name"])
+    return table.sort_values(["level", "count"], ascending=[True, False], kind="stable", ignore_index=True)
+
+
+def rolls_report(rolls: pd.DataFrame) -> pd.DataFrame:
+    """Mean number of rolls on each turn."""
+    return rolls.groupby("turn").rolls.mean().reset_index()
+
+
+def opponent_report(opponents: pd.DataFrame) -> pd.DataFrame:
+    """Wins and losses against each opponent, most played first."""
+    table = opponents.groupby("name", sort=False).won.agg(wins="sum", games="size").reset_index()
+    table["losses"] = table.games - table.wins
+    table = table.sort_values("games", ascending=False, kind="stable", ignore_index=True)
+    return table[["name", "wins", "losses"]]
+
+
+def analyze_games(games: Iterable[Game]) -> Dict[str, pd.DataFrame]:
+    """Builds every report over the main account's games, returning the result tables by name."""
+    frames = build_frames(games)
+    return {
+        "games": frames["games"],
+        "treasures": treasure_report(frames["treasure_choices"]),
+        "comps": comp_report(frames["games"]),
+        "purchases": purchase_report(frames["purchases"]),
+        "rolls": rolls_report(frames["rolls"]),
+        "opponents": opponent_report(frames["opponents"]),
+    }
+
+
+def _as_tuples(table: pd.DataFrame):
+    return list(table.itertuples(index=False, name=None))
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else "games.pkl"
+    games = load_games(path) if path.endswith(GAMES_SUFFIX) else pickle.load(open(path, "rb"))
+    reports = analyze_games(games)
+
+    treasures = reports["treasures"]
     for tier in [2, 3, 4, 5, 6, 7]:
-        my_list = []
-        for treasure in treasure_choices[treasure_choices['tier'] == tier].name.unique():
-            df_subset = treasure_choices[treasure_choices['name'] == treasure]
-            my_list.append((treasure, len(df_subset), np.mean(df_subset.placement)))
-        my_list = sorted(my_list, key=lambda x: x[1], reverse=True)
-        print(my_list)
-
-    comps = pd.DataFrame(comps)
-    my_list = []
-    for comp in comps.comp.unique():
-        df_subset = comps[comps["comp"] == comp]
-        my_list.append((comp, len(df_subset), np.mean(df_subset.placement)))
-    my_list = sorted(my_list, key=lambda x: x[1], reverse=True)
-    print(my_list)
-
-    purchases = pd.DataFrame(purchases)
-    purchases = purchases.drop_duplicates()
+        print(_as_tuples(treasures[treasures.tier == tier][["name", "count", "placement"]]))
+
+    print(_as_tuples(reports["comps"]))
+
+    purchases = reports["purchases"]
     for level in [2, 3, 4, 5, 6]:
-        my_list = []
-        for unit in purchases[purchases['level'] == level].name.unique():
-            df_subset = purchases[purchases['level'] == level]
-            df_subset = df_subset[df_subset['name'] == unit]
-            my_list.append((unit, len(df_subset), np.mean(df_subset.placement)))
-        my_list = sorted(my_list, key=lambda x: x[1], reverse=True)
         print("Level {} purchases:".format(level))
-        print(my_list[:100])
+        print(_as_tuples(purchases[purchases.level == level][["name", "count", "placement"]])[:100])
 
-    print("Hit level 6: {}/{}".format(made_to_6, count))
+    made_to_6 = (reports["games"].final_level == 6).sum()
+    print("Hit level 6: {}/{}".format(made_to_6, len(reports["games"])))
 
-    avg_rolls = [(i, np.mean(rolls_per_turn[i])) for i in rolls_per_turn.keys()]
-    for turn, rolls in avg_rolls:
+    for turn, rolls in _as_tuples(reports["rolls"]):
         standard_turn_1 = (turn - 1) // 3 + 2
         standard_turn_2 = (turn - 1) % 3
         print(f"Turn {turn} ({standard_turn_1}.{standard_turn_2}):\t{rolls} rolls")
 
-    record_keys = sorted(records.keys(), key=lambda x: sum(records[x]), reverse=True)
-    for i in range(20):
-        record = records[record_keys[i]]
-        print("{}: {} wins, {} losses".format(record_keys[i], record[0], record[1]))
-
-
-
-
-
+    for name, wins, losses in _as_tuples(reports["opponents"].head(20)):
+        print("{}: {} wins, {} losses".format(name, wins, losses))
@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import argparse
+import concurrent.futures
+import datetime
+import functools
+import os
+import pathlib
+import pickle
+import traceback
+from typing import Callable, Iterable, Iterator, List, NamedTuple, Optional
+
+from game_cache import GameCache
+from game_format import GAMES_SUFFIX, dump_games
+from game_store import STORE_SUFFIXES, GameStore
+from record_parser import DecodeStats
+from run_history_reader import extract_game_from_record_file, extract_game_with_recovery, extract_game_with_stats
+
+
+class IngestResult(NamedTuple):
+    path: str
+    value: object
+    error: Optional[str]
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def default_save_dir() -> pathlib.Path:
+    return pathlib.Path(os.environ["APPDATA"]).parent.joinpath("LocalLow/Good Luck Games/Storybook Brawl")
+
+
+def find_record_files(save_dir, limit: Optional[int] = None, since: Optional[datetime.datetime] = None) -> List[str]:
+    """Record files in save_dir, most recent first, optionally only the newest `limit` created on or after `since`."""
+    filenames = pathlib.Path(save_dir).glob("record_*.txt")
+    sorted_by_recent = sorted(filenames, key=os.path.getctime, reverse=True)
+    if since is not None:
+        sorted_by_recent = [filename for filename in sorted_by_recent
+                            if datetime.datetime.fromtimestamp(os.path.getctime(filename)) >= since]
+    if limit is not None:
+        sorted_by_recent = sorted_by_recent[:limit]
+    return [os.fspath(filename) for filename in sorted_by_recent]
+
+
+def _ingest_one(extractor: Callable, path: str) -> IngestResult:
+    try:
+        return IngestResult(path, extractor(path), None)
+    except Exception:
+        return IngestResult(path, None, traceback.format_exc())
+
+
+def ingest_records(paths: Iterable, workers: Optional[int] = None, ordered: bool = True,
+                   extractor: Callable = extract_game_from_record_file,
+                   cache: Optional[GameCache] = None) -> Iterator[IngestResult]:
+    """
+    Runs extractor over every record file in paths on a pool of `workers` processes (os.cpu_count() by default),
+    yielding an IngestResult per file as soon as it is available. Results come back in input order if ordered is set,
+    otherwise in completion order. A file that raises only produces a failed result and never stops the batch.
+
+    If a cache is given, records it already holds a valid value for are not parsed again, and new successful results
+    are added to it.
+
+    extractor must be picklable, i.e. a module-level function. With workers=1 everything runs in this process.
+    """
+    paths = [os.fspath(path) for path in paths]
+    cached = {}
+    if cache is not None:
+        for path in paths:
+            try:
+                value = cache.get(path, extractor)
+            except OSError:
+                value = None
+            if value is not None:
+                cached[path] = IngestResult(path, value, None)
+    to_parse = [path for path in paths if path not in cached]
+
+    def store(result: IngestResult) -> IngestResult:
+        if cache is not None and result.ok:
+            cache.put(result.path, extractor, result.value)
+        return result
+
+    if not ordered:
+        yield from cached.values()
+    if workers == 1 or not to_parse:
+        for path in paths:
+            if path in cached:
+                if ordered:
+                    yield cached[path]
+            else:
+                yield store(_ingest_one(extractor, path))
+        return
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {path: executor.submit(_ingest_one, extractor, path) for path in to_parse}
+        if ordered:
+            for path in paths:
+                if path in cached:
+                    yield cached[path]
+                else:
+                    yield store(futures[path].result())
+        else:
+            for future in concurrent.futures.as_completed(futures.values()):
+                yield store(future.result())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parse Storybook Brawl record files into a pickle of Game objects.")
+    parser.add_argument("save_dir", nargs="?", default=None,
+                        help="Directory containing record_*.txt files (defaults to the game's save directory)")
+    parser.add_argument("-o", "--output", default="games.pkl",
+                        help="Where to pickle the list of games, or to write a games file if it ends in {}, or to add "
+                             "them to a game store if it ends in {}".format(GAMES_SUFFIX, " or ".join(STORE_SUFFIXES)))
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Number of worker processes")
+    parser.add_argument("-n", "--limit", type=int, default=None, help="Only parse the N most recent records")
+    parser.add_argument("--since", type=datetime.datetime.fromisoformat, default=None,
+                        help="Only parse records created on or after this ISO date")
+    parser.add_argument("--unordered", action="store_true",
+                        help="Collect games in completion order rather than most recent first")
+    parser.add_argument("--cache-dir", default="game_cache",
+                        help="Directory of cached games, so unchanged records are not parsed again")
+    parser.add_argument("--no-cache", action="store_true", help="Parse every record, ignoring the cache")
+    parser.add_argument("--content-hash", action="store_true",
+                        help="Also check a hash of each record's contents before trusting its cached game")
+    parser.add_argument("--recover", action="store_true",
+                        help="Skip over actions that cannot be parsed instead of stopping at the first one")
+    parser.add_argument("--stats", action="store_true",
+                        help="Print decode time per action type and per phase over the batch (implies --no-cache)")
+    args = parser.parse_args(argv)
+
+    save_dir = args.save_dir if args.save_dir is not None else default_save_dir()
+    paths = find_record_files(save_dir, args.limit, args.since)
+    games = []
+    sources = []
+    failures = 0
+    # Cached games were not timed by this run, so collecting stats means parsing everything
+    cache = None if args.no_cache or args.stats else GameCache(args.cache_dir, args.content_hash)
+    if args.stats:
+        extractor = functools.partial(extract_game_with_stats, recover=args.recover)
+    else:
+        extractor = extract_game_with_recovery if args.recover else extract_game_from_record_file
+    stats = DecodeStats()
+    for result in ingest_records(paths, args.workers, not args.unordered, extractor, cache):
+        if result.ok:
+            games.append(result.value)
+            sources.append(result.path)
+            if args.stats:
+                stats.merge(result.value.decode_stats)
+            if args.recover and result.value.recovery_report:
+                print("Recovered {}: {}".format(result.path, result.value.recovery_report))
+        else:
+            failures += 1
+            print("Failed to parse {}:\n{}".format(result.path, result.error))
+    print("Parsed {}/{} record files.".format(len(games), len(paths)))
+    if args.stats:
+        print(stats.format())
+    if args.output.endswith(GAMES_SUFFIX):
+        dump_games(games, args.output)
+    elif args.output.endswith(STORE_SUFFIXES):
+        with GameStore(args.output) as store:
+            store.add_games(games, sources)
+    else:
+        with open(args.output, "wb") as f:
+            pickle.dump(games, f)
+    return 0 if failures == 0 else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,306 @@
+"""
+Benchmarks for the record reader, so that performance changes can be measured rather than guessed at.
+
+    python benchmark.py -o results.json                  # run every suite and save the results
+    python benchmark.py --compare results.json           # run again and compare against the saved results
+    python benchmark.py --suite actions --suite memory   # run only some suites
+
+Every result is a named metric with a unit, and whether higher is better, so that any two result files can be compared.
+"""
+import argparse
+import datetime
+import gc
+import glob
+import json
+import os
+import pickle
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import construct
+
+import game_format
+from record_parser import ActionDecoder
+from run_history_reader import extract_game_from_record_file
+
+SAMPLE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_samples")
+EXAMPLE_RECORD = os.path.join(SAMPLE_DIR, "example_record.bin")
+DEFAULT_IMPORT_MODULES = ["record_parser", "run_history_reader", "batch_ingest"]
+SUITES = ["actions", "extract", "memory", "storage", "imports"]
+
+
+class Metric(NamedTuple):
+    value: float
+    unit: str
+    higher_is_better: bool
+
+
+class Comparison(NamedTuple):
+    name: str
+    baseline: float
+    current: float
+    unit: str
+    # current relative to baseline, > 1 means better whichever way the metric goes
+    speedup: float
+
+    def is_regression(self, threshold: float) -> bool:
+        return self.speedup < 1 - threshold
+
+
+def best_time(func: Callable[[], object], min_time: float = 0.2, rounds: int = 3) -> float:
+    """The best time in seconds of a single func() call, over `rounds` rounds of at least min_time seconds each."""
+    best = float("inf")
+    for _ in range(rounds):
+        calls = 0
+        start = time.perf_counter()
+        elapsed = 0.0
+        while calls == 0 or elapsed < min_time:
+            func()
+            calls += 1
+            elapsed = time.perf_counter() - start
+        best = min(best, elapsed / calls)
+    return best
+
+
+def _decode_all(buffer: bytes, compiled: bool) -> int:
+    decoder = ActionDecoder(buffer, compiled=compiled)
+    offset = 0
+    count = 0
+    while offset < len(buffer):
+        _, offset = decoder.decode(offset)
+        count += 1
+    return count
+
+
+def benchmark_actions(sample_dir: str = SAMPLE_DIR, min_time: float = 0.2,
+                      buffer_size: int = 1 << 16) -> Dict[str, Metric]:
+    """Actions/s and MB/s decoding each Action*.bin sample, repeated to fill a buffer, interpreted and compiled."""
+    results = {}
+    for path in sorted(glob.glob(os.path.join(sample_dir, "Action*.bin"))):
+        action_name = os.path.basename(path)[:-len(".bin")]
+        with open(path, 'rb') as f:
+            sample = f.read()
+        count = max(1, buffer_size // len(sample))
+        buffer = sample * count
+        for variant, compiled in (("interpreted", False), ("compiled", True)):
+            seconds = best_time(lambda: _decode_all(buffer, compiled), min_time)
+            key = "actions/{}/{}".format(action_name, variant)
+            results[key + "/actions_per_sec"] = Metric(count / seconds, "actions/s", True)
+            results[key + "/mb_per_sec"] = Metric(len(buffer) / seconds / 1e6, "MB/s", True)
+    return results
+
+
+def write_synthetic_record(path: str, copies: int, source: str = EXAMPLE_RECORD):
+    """A larger record made of `copies` back-to-back copies of source."""
+    with open(source, 'rb') as f:
+        contents = f.read()
+    with open(path, 'wb') as f:
+        for _ in range(copies):
+            f.write(contents)
+
+
+def _benchmark_extract_file(name: str, path: str, min_time: float, results: Dict[str, Metric]):
+    size = os.path.getsize(path)
+    for variant, compiled in (("interpreted", False), ("compiled", True)):
+        seconds = best_time(lambda: extract_game_from_record_file(path, compiled=compiled), min_time, rounds=1)
+        key = "extract/{}/{}".format(name, variant)
+        results[key + "/seconds"] = Metric(seconds, "s", False)
+        results[key + "/mb_per_sec"] = Metric(size / seconds / 1e6, "MB/s", True)
+
+
+def benchmark_extract(record: str = EXAMPLE_RECORD, synthetic_copies: List[int] = (8,),
+                      min_time: float = 0.2) -> Dict[str, Metric]:
+    """End-to-end extract_game_from_record_file on record, and on synthetic records `copies` times its size."""
+    results = {}
+    _benchmark_extract_file(os.path.basename(record), record, min_time, results)
+    with tempfile.TemporaryDirectory() as directory:
+        for copies in synthetic_copies:
+            path = os.path.join(directory, "synthetic_x{}.bin".format(copies))
+            write_synthetic_record(path, copies, record)
+            _benchmark_extract_file("synthetic_x{}".format(copies), path, min_time, results)
+    return results
+
+
+def benchmark_memory(record: str = EXAMPLE_RECORD) -> Dict[str, Metric]:
+    """Peak memory allocated by Python while extracting one game, and the size of the result in memory and pickled."""
+    results = {}
+    for variant, compiled in (("interpreted", False), ("compiled", True)):
+        # Keep one-off costs, like building the schema, out of the measurement
+        extract_game_from_record_file(record, compiled=compiled)
+        tracemalloc.start()
+        try:
+            game = extract_game_from_record_file(record, compiled=compiled)
+            # The parse leaves reference cycles behind, which would otherwise count as retained
+            gc.collect()
+            retained, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        key = "memory/{}/{}".format(os.path.basename(record), variant)
+        results[key + "/peak_mb"] = Metric(peak / 1e6, "MB", False)
+        results[key + "/retained_mb"] = Metric(retained / 1e6, "MB", False)
+        results[key + "/pickled_kb"] = Metric(len(pickle.dumps(game)) / 1e3, "KB", False)
+        del game
+    return results
+
+
+def benchmark_storage(record: str = EXAMPLE_RECORD, games: int = 20, min_time: float = 0.2) -> Dict[str, Metric]:
+    """Loading `games` copies of the game of record from a pickled list and from a games file, and their sizes."""
+    game = extract_game_from_record_file(record)
+    game.recovery_report = game.decode_stats = None
+    # Distinct copies, so that pickle cannot share them
+    copies = [pickle.loads(pickle.dumps(game)) for _ in range(games)]
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        pickle_path = os.path.join(directory, "games.pkl")
+        with open(pickle_path, 'wb') as f:
+            pickle.dump(copies, f)
+        games_path = os.path.join(directory, "games" + game_format.GAMES_SUFFIX)
+        game_format.dump_games(copies, games_path)
+
+        def load_pickle():
+            with open(pickle_path, 'rb') as f:
+                return pickle.load(f)
+
+        for variant, path, load in (("pickle", pickle_path, load_pickle),
+                                    ("game_format", games_path, lambda: game_format.load_games(games_path))):
+            key = "storage/{}".format(variant)
+            results[key + "/load_ms_per_game"] = Metric(best_time(load, min_time) / games * 1e3, "ms", False)
+            results[key + "/kb_per_game"] = Metric(os.path.getsize(path) / games / 1e3, "KB", False)
+    return results
+
+
+def parse_importtime(output: str, module: str) -> int:
+    """The cumulative import time in microseconds of module, from the stderr of python -X importtime."""
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if name.strip() == module:
+            return int(cumulative)
+    raise ValueError("{} does not appear in the -X importtime output".format(module))
+
+
+def measure_import_time(module: str, repeat: int = 5) -> List[int]:
+    """
+    Imports module in `repeat` fresh interpreters and returns how long each import took, in microseconds. A warm-up
+    import runs first, with bytecode writing enabled, so that compiling the sources is not part of the measurement.
+    """
+    env = dict(os.environ)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    command = [sys.executable, "-X", "importtime", "-c", "import " + module]
+    timings = []
+    for run in range(repeat + 1):
+        result = subprocess.run(command, cwd=cwd, env=env, capture_output=True, text=True, check=True)
+        if run > 0:
+            timings.append(parse_importtime(result.stderr, module))
+    return timings
+
+
+def benchmark_imports(modules: List[str] = DEFAULT_IMPORT_MODULES, repeat: int = 5) -> Dict[str, Metric]:
+    results = {}
+    for module in modules:
+        timings = measure_import_time(module, repeat)
+        results["imports/{}/median_ms".format(module)] = Metric(statistics.median(timings) / 1000, "ms", False)
+    return results
+
+
+def run_suites(suites: List[str], min_time: float = 0.2, synthetic_copies: List[int] = (8,),
+               import_repeat: int = 5) -> Dict[str, Metric]:
+    results = {}
+    for suite in suites:
+        if suite == "actions":
+            results.update(benchmark_actions(min_time=min_time))
+        elif suite == "extract":
+            results.update(benchmark_extract(synthetic_copies=synthetic_copies, min_time=min_time))
+        elif suite == "memory":
+            results.update(benchmark_memory())
+        elif suite == "storage":
+            results.update(benchmark_storage(min_time=min_time))
+        elif suite == "imports":
+            results.update(benchmark_imports(repeat=import_repeat))
+        else:
+            raise ValueError("unknown benchmark suite {!r}".format(suite))
+    return results
+
+
+def environment() -> dict:
+    return {"date": datetime.datetime.now().isoformat(timespec="seconds"), "python": sys.version.split()[0],
+            "platform": platform.platform(), "construct": construct.__version__}
+
+
+def save_results(path, results: Dict[str, Metric]):
+    document = {"environment": environment(),
+                "results": {name: metric._asdict() for name, metric in sorted(results.items())}}
+    with open(path, 'w') as f:
+        json.dump(document, f, indent=2)
+
+
+def load_results(path) -> Dict[str, Metric]:
+    with open(path) as f:
+        document = json.load(f)
+    return {name: Metric(**metric) for name, metric in document["results"].items()}
+
+
+def compare_results(baseline: Dict[str, Metric], current: Dict[str, Metric]) -> List[Comparison]:
+    """Comparisons of every metric present in both result sets."""
+    comparisons = []
+    for name in sorted(baseline.keys() & current.keys()):
+        old = baseline[name]
+        new = current[name]
+        if old.value == 0 or new.value == 0:
+            continue
+        speedup = new.value / old.value if new.higher_is_better else old.value / new.value
+        comparisons.append(Comparison(name, old.value, new.value, new.unit, speedup))
+    return comparisons
+
+
+def format_results(results: Dict[str, Metric]) -> str:
+    return "\n".join("{:<72} {:>12.3f} {}".format(name, metric.value, metric.unit)
+                     for name, metric in sorted(results.items()))
+
+
+def format_comparisons(comparisons: List[Comparison], threshold: float) -> str:
+    lines = []
+    for comparison in comparisons:
+        flag = "  REGRESSION" if comparison.is_regression(threshold) else ""
+        lines.append("{:<72} {:>12.3f} -> {:>12.3f} {:<9} {:>6.2f}x{}".format(
+            comparison.name, comparison.baseline, comparison.current, comparison.unit, comparison.speedup, flag))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark parsing, reconstruction, memory use and import time.")
+    parser.add_argument("--suite", action="append", choices=SUITES,
+                        help="Suite to run, may be repeated (defaults to all of them)")
+    parser.add_argument("-o", "--output", default=None, help="Save the results as JSON to this file")
+    parser.add_argument("--compare", default=None, help="Compare against results previously saved with --output")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="Relative slowdown that counts as a regression when comparing (default 0.1)")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Minimum seconds per timing round")
+    parser.add_argument("--synthetic-copies", type=int, action="append", default=None,
+                        help="Size of each synthetic record, in copies of example_record.bin (default 8)")
+    parser.add_argument("--import-repeat", type=int, default=5, help="Fresh interpreters per import measurement")
+    args = parser.parse_args(argv)
+
+    results = run_suites(args.suite or SUITES, args.min_time, args.synthetic_copies or [8], args.import_repeat)
+    print(format_results(results))
+    if args.output is not None:
+        save_results(args.output, results)
+    if args.compare is not None:
+        comparisons = compare_results(load_results(args.compare), results)
+        print()
+        print(format_comparisons(comparisons, args.threshold))
+        if any(comparison.is_regression(args.threshold) for comparison in comparisons):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
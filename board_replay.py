@@ -0,0 +1,151 @@
+"""
+Replays the cards of a record to know the boards at every brawl. BoardReplay applies card creations, updates, moves,
+removals and deaths to a state indexed by (player id, zone), and snapshots both boards of every brawl.
+
+The game deploys every card again at the start of each shop and brawl phase, so the state starts empty at every
+ActionEnterShopPhase and ActionEnterBrawlPhase, and a brawl's snapshot is taken once its boards have been deployed,
+at the first action after ActionEnterBrawlPhase that is not an ActionCreateCard.
+
+Card states are immutable and only replaced when a card changes, so snapshots share every card that did not change in
+between and cost a tuple per zone.
+"""
+import os
+from typing import BinaryIO, Dict, List, NamedTuple, Optional, Tuple, Union
+
+from action_handlers import ActionHandler, run_handlers
+
+
+class CardState(NamedTuple):
+    """The state of a card, with the field names of STRUCT_UNIT so that it can stand in for one."""
+    card_id: object
+    template_id: int
+    is_golden: bool
+    zone: str
+    slot: int
+    attack: int
+    health: int
+    player_id: str
+    subtypes: Tuple[str, ...]
+    keywords: Tuple[str, ...]
+
+    @classmethod
+    def from_unit_struct(cls, unit_struct) -> "CardState":
+        return cls(unit_struct.card_id, unit_struct.template_id, unit_struct.is_golden, str(unit_struct.zone),
+                   unit_struct.slot, unit_struct.attack, unit_struct.health, unit_struct.player_id,
+                   tuple(str(subtype) for subtype in unit_struct.subtypes),
+                   tuple(str(keyword) for keyword in unit_struct.keywords))
+
+
+class BoardSnapshot(NamedTuple):
+    player_id: str
+    hero: Optional[CardState]
+    # By slot
+    characters: Tuple[CardState, ...]
+    treasures: Tuple[CardState, ...]
+    spells: Tuple[CardState, ...]
+    hand: Tuple[CardState, ...]
+
+
+class BrawlSnapshot(NamedTuple):
+    # The number of shop phases before the brawl, i.e. the index of the turn in Game.shops plus one
+    turn: int
+    player: BoardSnapshot
+    opponent: BoardSnapshot
+
+
+def _by_slot(cards: Optional[Dict[object, CardState]]) -> Tuple[CardState, ...]:
+    if not cards:
+        return ()
+    return tuple(sorted(cards.values(), key=lambda card: card.slot))
+
+
+class BoardReplay(ActionHandler):
+    """Handler replaying card actions, with a BrawlSnapshot for every brawl of the record as its result."""
+    action_names = frozenset(["ActionCreateCard", "ActionUpdateCard", "ActionMoveCard", "ActionRemoveCard",
+                              "ActionDeath", "ActionEnterShopPhase", "ActionEnterBrawlPhase", "ActionAttack",
+                              "ActionDealDamage", "ActionPlayFX", "ActionBrawlComplete", "ActionEnterResultsPhase"])
+
+    def __init__(self):
+        self.zones: Dict[Tuple[str, str], Dict[object, CardState]] = {}
+        self.locations: Dict[object, Tuple[str, str]] = {}
+        self.turn = 0
+        # The player who recorded the file, from their shop phases
+        self.player_id: Optional[str] = None
+        self.snapshots: List[BrawlSnapshot] = []
+        # (player id, opponent id) of a brawl whose boards are being deployed
+        self.deploying: Optional[Tuple[str, str]] = None
+
+    def clear(self):
+        self.zones = {}
+        self.locations = {}
+
+    def card(self, card_id) -> Optional[CardState]:
+        location = self.locations.get(card_id)
+        if location is None:
+            return None
+        return self.zones[location][card_id]
+
+    def put(self, card: CardState):
+        self.remove(card.card_id)
+        location = (card.player_id, card.zone)
+        zone = self.zones.get(location)
+        if zone is None:
+            zone = self.zones[location] = {}
+        zone[card.card_id] = card
+        self.locations[card.card_id] = location
+
+    def remove(self, card_id):
+        location = self.locations.pop(card_id, None)
+        if location is not None:
+            del self.zones[location][card_id]
+
+    def board(self, player_id: str) -> BoardSnapshot:
+        """A snapshot of the current board of player_id."""
+        zones = self.zones
+        heroes = _by_slot(zones.get((player_id, "hero")))
+        return BoardSnapshot(player_id, heroes[0] if heroes else None, _by_slot(zones.get((player_id, "character"))),
+                             _by_slot(zones.get((player_id, "treasure"))), _by_slot(zones.get((player_id, "spell"))),
+                             _by_slot(zones.get((player_id, "hand"))))
+
+    def _snapshot_brawl(self):
+        player_id, opponent_id = self.deploying
+        self.snapshots.append(BrawlSnapshot(self.turn, self.board(player_id), self.board(opponent_id)))
+        self.deploying = None
+
+    def handle(self, action_name: str, action):
+        if self.deploying is not None and action_name != "ActionCreateCard":
+            self._snapshot_brawl()
+        if action_name == "ActionCreateCard" or action_name == "ActionUpdateCard":
+            self.put(CardState.from_unit_struct(action.card))
+        elif action_name == "ActionMoveCard":
+            card = self.card(action.card_id)
+            if card is not None:
+                self.put(card._replace(zone=str(action.target_zone), slot=action.target_index))
+        elif action_name == "ActionRemoveCard":
+            self.remove(action.card_id)
+        elif action_name == "ActionDeath":
+            self.remove(action.target)
+        elif action_name == "ActionEnterShopPhase":
+            self.turn += 1
+            self.player_id = action.player_id
+            self.clear()
+        elif action_name == "ActionEnterBrawlPhase":
+            self.clear()
+            # Either side of the brawl can be the player who recorded it
+            if action.player_2_id == self.player_id:
+                self.deploying = (action.player_2_id, action.player_1_id)
+            else:
+                self.deploying = (action.player_1_id, action.player_2_id)
+
+    def result(self) -> List[BrawlSnapshot]:
+        if self.deploying is not None:
+            # The record ended while the boards were being deployed
+            self._snapshot_brawl()
+        return self.snapshots
+
+
+def replay_brawls(path_or_file: Union[str, os.PathLike, BinaryIO]) -> List[BrawlSnapshot]:
+    """The boards of both players at every brawl of a record."""
+    replay = BoardReplay()
+    run_handlers(path_or_file, [replay], guid_format="bytes")
+    return replay.result()
@@ -0,0 +1,235 @@
+import os
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from record_parser import guid_bytes_to_hex, id_to_action_name, iter_actions
+
+INT = "int"
+FLOAT = "float"
+BOOL = "bool"
+STRING = "string"
+GUID = "guid"
+
+NUMPY_TYPES = {INT: np.int64, FLOAT: np.float64, BOOL: np.bool_, STRING: np.int32, GUID: np.int32}
+
+# Where STRUCT_UNITs can be found in each action, as (field, attribute of each element holding the unit)
+UNIT_CONTAINERS = {
+    "ActionCreateCard": [("card", None)],
+    "ActionUpdateCard": [("card", None)],
+    "ActionEnterResultsPhase": [("characters", None), ("treasures", None)],
+    "ActionPresentDiscover": [("treasures", None)],
+    "ActionPresentHeroDiscover": [("heroes", "card")],
+}
+
+UNIT_FIELDS = ["card_id", "template_id", "is_locked", "is_targeted", "is_golden", "is_movable", "makes_pair",
+               "makes_triple", "zone", "slot", "cost", "attack", "health", "counter", "damage", "art_id", "player_id",
+               "frame_override"]
+
+
+def _enum_mask(values) -> int:
+    mask = 0
+    for value in values:
+        mask |= 1 << int(getattr(value, "intvalue", value))
+    return mask
+
+
+class ColumnarExport:
+    """
+    Parsed actions laid out as one NumPy structured array per action type, plus a flattened "units" table of every
+    STRUCT_UNIT carried by create/update/results/discover actions.
+
+    Every table starts with `record` (index into records), `offset` and `timestamp` columns. Strings and GUIDs are
+    dictionary-encoded as int32 codes into the export-wide `strings` and `guids` lists (-1 for a missing value), so
+    codes can be compared and joined across tables. Subtypes and keywords of units are bitmasks of their enum values.
+    """
+
+    def __init__(self, records: List[str], tables: Dict[str, np.ndarray], column_kinds: Dict[str, Dict[str, str]],
+                 strings: List[str], guids: List[str]):
+        self.records = records
+        self.tables = tables
+        self.column_kinds = column_kinds
+        self.strings = strings
+        self.guids = guids
+
+    def __getitem__(self, table_name: str) -> np.ndarray:
+        return self.tables[table_name]
+
+    def string_code(self, value: str) -> int:
+        """The code of value in string columns, or -1 if it never occurs."""
+        try:
+            return self.strings.index(value)
+        except ValueError:
+            return -1
+
+    def decode(self, table_name: str, column: str) -> list:
+        """The values of a dictionary-encoded column as Python strings."""
+        kind = self.column_kinds[table_name][column]
+        dictionary = self.guids if kind == GUID else self.strings
+        return [dictionary[code] if code >= 0 else None for code in self.tables[table_name][column]]
+
+    def to_pandas(self, table_name: str):
+        """The table as a DataFrame, with string and GUID columns as Categoricals."""
+        import pandas as pd
+        table = self.tables[table_name]
+        columns = {}
+        for column, kind in self.column_kinds[table_name].items():
+            if kind in (STRING, GUID):
+                dictionary = self.guids if kind == GUID else self.strings
+                columns[column] = pd.Categorical.from_codes(table[column], categories=pd.Index(dictionary))
+            else:
+                columns[column] = table[column]
+        return pd.DataFrame(columns)
+
+    def to_arrow(self, table_name: str):
+        """The table as a pyarrow Table, with string and GUID columns as DictionaryArrays. Requires pyarrow."""
+        import pyarrow as pa
+        table = self.tables[table_name]
+        strings = pa.array(self.strings, type=pa.string())
+        guids = pa.array(self.guids, type=pa.string())
+        arrays = {}
+        for column, kind in self.column_kinds[table_name].items():
+            if kind in (STRING, GUID):
+                codes = pa.array(table[column], mask=table[column] < 0)
+                arrays[column] = pa.DictionaryArray.from_arrays(codes, guids if kind == GUID else strings)
+            else:
+                arrays[column] = pa.array(table[column])
+        return pa.table(arrays)
+
+    def write_parquet(self, directory):
+        """Writes every table to <directory>/<table>.parquet. Requires pyarrow."""
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Writing Parquet files requires pyarrow (pip install pyarrow)")
+        os.makedirs(directory, exist_ok=True)
+        for table_name in self.tables:
+            pq.write_table(self.to_arrow(table_name), os.path.join(directory, table_name + ".parquet"))
+
+    def save_npz(self, path):
+        """Saves every table, and the string and GUID dictionaries, to a single .npz file."""
+        arrays = {"table_" + table_name: table for table_name, table in self.tables.items()}
+        np.savez_compressed(path, records=np.array(self.records), strings=np.array(self.strings, dtype=object),
+                            guids=np.array(self.guids), **arrays)
+
+
+class _TableBuilder:
+
+    def __init__(self):
+        self.kinds = {}
+        self.columns = {}
+        self.rows = 0
+
+    def add_row(self, row: dict):
+        for column, (kind, value) in row.items():
+            if column not in self.columns:
+                self.kinds[column] = kind
+                self.columns[column] = [0] * self.rows if kind not in (STRING, GUID) else [-1] * self.rows
+            self.columns[column].append(value)
+        self.rows += 1
+        for column, values in self.columns.items():
+            if len(values) < self.rows:
+                values.append(-1 if self.kinds[column] in (STRING, GUID) else 0)
+
+    def build(self) -> np.ndarray:
+        dtype = [(column, NUMPY_TYPES[self.kinds[column]]) for column in self.columns]
+        table = np.empty(self.rows, dtype=dtype)
+        for column, values in self.columns.items():
+            table[column] = values
+        return table
+
+
+class _Exporter:
+
+    def __init__(self):
+        self.strings = {}
+        self.guids = {}
+        self.builders = {}
+
+    def string(self, value) -> int:
+        if value is None:
+            return -1
+        value = str(value)
+        code = self.strings.get(value)
+        if code is None:
+            code = self.strings[value] = len(self.strings)
+        return code
+
+    def guid(self, value) -> int:
+        code = self.guids.get(value)
+        if code is None:
+            code = self.guids[value] = len(self.guids)
+        return code
+
+    def cell(self, value):
+        if isinstance(value, bool):
+            return BOOL, value
+        if isinstance(value, str):
+            return STRING, self.string(value)
+        if isinstance(value, int):
+            return INT, value
+        if isinstance(value, float):
+            return FLOAT, value
+        if isinstance(value, bytes) and len(value) == 16:
+            return GUID, self.guid(value)
+        return None
+
+    def builder(self, table_name: str) -> _TableBuilder:
+        builder = self.builders.get(table_name)
+        if builder is None:
+            builder = self.builders[table_name] = _TableBuilder()
+        return builder
+
+    def add_action(self, record: int, offset: int, action):
+        action_name = id_to_action_name[action.action_id]
+        fields = action._asdict() if isinstance(action, tuple) else action
+        row = {"record": (INT, record), "offset": (INT, offset), "timestamp": (INT, action.timestamp)}
+        for field, value in fields.items():
+            if field.startswith("_") or field in ("action_id", "timestamp") or field.endswith("_length"):
+                continue
+            cell = self.cell(value)
+            if cell is not None:
+                row[field] = cell
+        self.builder(action_name).add_row(row)
+        for container, attribute in UNIT_CONTAINERS.get(action_name, []):
+            units = fields[container]
+            if not isinstance(units, list):
+                units = [units]
+            for position, unit in enumerate(units):
+                if attribute is not None:
+                    unit = unit[attribute]
+                if unit is not None:
+                    self.add_unit(row, action_name, container, position, unit)
+
+    def add_unit(self, action_row: dict, action_name: str, container: str, position: int, unit):
+        row = {"record": action_row["record"], "offset": action_row["offset"], "timestamp": action_row["timestamp"],
+               "action": (STRING, self.string(action_name)), "container": (STRING, self.string(container)),
+               "position": (INT, position)}
+        for field in UNIT_FIELDS:
+            cell = self.cell(unit[field])
+            if cell is not None:
+                row[field] = cell
+        row["subtype_mask"] = (INT, _enum_mask(unit.subtypes))
+        row["keyword_mask"] = (INT, _enum_mask(unit.keywords))
+        self.builder("units").add_row(row)
+
+    def finish(self, records: List[str]) -> ColumnarExport:
+        tables = {table_name: builder.build() for table_name, builder in self.builders.items()}
+        column_kinds = {table_name: dict(builder.kinds) for table_name, builder in self.builders.items()}
+        return ColumnarExport(records, tables, column_kinds, list(self.strings),
+                              [guid_bytes_to_hex(guid) for guid in self.guids])
+
+
+def export_actions(paths: Iterable, action_names: Optional[Iterable[str]] = None) -> ColumnarExport:
+    """
+    Parses every record file in paths into a ColumnarExport, optionally keeping only the given action types (the
+    units table is still filled from whichever of them carry units).
+    """
+    exporter = _Exporter()
+    records = []
+    for path in paths:
+        record = len(records)
+        records.append(os.fspath(path))
+        for offset, action in iter_actions(path, action_names=action_names, guid_format="bytes"):
+            exporter.add_action(record, offset, action)
+    return exporter.finish(records)
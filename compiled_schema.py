@@ -0,0 +1,190 @@
+"""
+Compiled variants of the record_schema action structs. construct turns each STRUCT_ACTION_* into generated Python code
+that parses several times faster than the interpreted constructs. The generated module is written to a cache directory
+the first time it is needed and imported from there afterwards, so the compile cost is only paid once per install (and
+again whenever construct or the schema changes).
+"""
+import glob
+import hashlib
+import importlib.machinery
+import importlib.util
+import os
+import struct
+import sys
+from typing import Dict
+
+import construct
+from construct import Construct, StreamError
+from construct.core import CodeGen
+
+import record_parser
+import record_schema
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".compiled_schema")
+
+_HEADER = """
+    # Generated by compiled_schema from record_schema, do not edit
+
+    from construct import *
+    from construct.lib import *
+    from io import BytesIO
+    import struct
+    import collections
+    import itertools
+
+    from record_parser import id_to_action_name
+
+    def restream(data, func):
+        return func(BytesIO(data))
+    def reuse(obj, func):
+        return func(obj)
+
+    len_ = len
+    sum_ = sum
+    min_ = min
+    max_ = max
+    abs_ = abs
+"""
+
+
+class CompiledParser(Construct):
+    """
+    Parses with a generated function, and builds and sizes with the interpreted construct it was compiled from.
+
+    Generated code does not check that fixed-size reads got all their bytes, so an action that ends exactly at the end
+    of the stream (possibly truncated) is parsed again with the interpreted construct, which does.
+    """
+
+    def __init__(self, parsefunc, reference: Construct):
+        super().__init__()
+        self.parsefunc = parsefunc
+        self.reference = reference
+        self.flagbuildnone = reference.flagbuildnone
+
+    def _parse(self, stream, context, path):
+        start = stream.tell()
+        try:
+            obj = self.parsefunc(stream, context)
+        except struct.error as e:
+            raise StreamError(str(e), path=path)
+        if stream.read(1) == b"":
+            stream.seek(start)
+            return self.reference._parsereport(stream, context, path)
+        stream.seek(-1, 1)
+        return obj
+
+    def _build(self, obj, stream, context, path):
+        return self.reference._build(obj, stream, context, path)
+
+    def _sizeof(self, context, path):
+        return self.reference._sizeof(context, path)
+
+
+def schema_fingerprint() -> str:
+    """Identifies the generated code: it changes with the construct and Python versions and the schema sources."""
+    digest = hashlib.sha1()
+    digest.update(construct.__version__.encode("utf-8"))
+    digest.update(sys.version.encode("utf-8"))
+    for module in (record_parser, record_schema):
+        with open(module.__file__, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def generate_source() -> str:
+    code = CodeGen()
+    code.append(_HEADER)
+    expressions = {action_name: action_struct._compileparse(code)
+                   for action_name, action_struct in record_schema.action_name_to_struct.items()}
+    if code.linkedinstances:
+        raise TypeError("the schema has constructs that cannot be compiled: {}".format(
+            ", ".join(repr(instance) for instance in code.linkedinstances.values())))
+    code.append("\n".join(["parsers = {"] + ["    {!r}: lambda io, this: {},".format(action_name, expression)
+                                            for action_name, expression in expressions.items()] + ["}"]))
+    code.append("""
+        id_to_parser = {action_id: parsers[action_name] for action_id, action_name in id_to_action_name.items()}
+
+        def parse_action(io, this):
+            fallback = io.tell()
+            action_id = io.read(2)
+            io.seek(fallback)
+            try:
+                parser = id_to_parser[action_id]
+            except KeyError:
+                raise MappingError("unknown action id {!r}".format(action_id))
+            return parser(io, this)
+    """)
+    return code.toString()
+
+
+def _import_source(path: str, module_name: str):
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _exec_source(source: str, module_name: str):
+    spec = importlib.machinery.ModuleSpec(module_name, None)
+    module = importlib.util.module_from_spec(spec)
+    exec(compile(source, module_name, "exec"), module.__dict__)
+    return module
+
+
+def _remove_stale_modules(cache_dir: str, module_name: str):
+    """Deletes the modules generated for other fingerprints from cache_dir, along with their bytecode."""
+    stale = [path for path in glob.glob(os.path.join(cache_dir, "compiled_schema_*.py"))
+             if os.path.basename(path) != module_name + ".py"]
+    for path in stale:
+        stale_name = os.path.basename(path)[:-len(".py")]
+        for stale_path in [path] + glob.glob(os.path.join(cache_dir, "__pycache__", stale_name + ".*")):
+            try:
+                os.remove(stale_path)
+            except OSError:
+                # Already removed by another process, or not ours to remove
+                pass
+
+
+_compiled_modules = {}
+
+
+def load_compiled_module(cache_dir=DEFAULT_CACHE_DIR):
+    """
+    The generated parser module, imported from cache_dir if it is there and up to date, otherwise generated and saved
+    there first, replacing the modules of other fingerprints. Falls back to compiling in memory if cache_dir cannot be
+    written to.
+    """
+    cache_dir = os.fspath(cache_dir)
+    fingerprint = schema_fingerprint()
+    module = _compiled_modules.get((cache_dir, fingerprint))
+    if module is not None:
+        return module
+    module_name = "compiled_schema_" + fingerprint
+    path = os.path.join(cache_dir, module_name + ".py")
+    if not os.path.exists(path):
+        source = generate_source()
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            temporary_path = "{}.{}.tmp".format(path, os.getpid())
+            with open(temporary_path, 'w') as f:
+                f.write(source)
+            os.replace(temporary_path, path)
+            _remove_stale_modules(cache_dir, module_name)
+        except OSError:
+            module = _exec_source(source, module_name)
+    if module is None:
+        module = _import_source(path, module_name)
+    _compiled_modules[(cache_dir, fingerprint)] = module
+    return module
+
+
+def compiled_action_struct(cache_dir=DEFAULT_CACHE_DIR) -> CompiledParser:
+    """Compiled equivalent of STRUCT_ACTION, dispatching on the action id."""
+    return CompiledParser(load_compiled_module(cache_dir).parse_action, record_schema.STRUCT_ACTION)
+
+
+def compiled_action_structs(cache_dir=DEFAULT_CACHE_DIR) -> Dict[str, CompiledParser]:
+    """Compiled equivalents of every STRUCT_ACTION_*, by action name."""
+    parsers = load_compiled_module(cache_dir).parsers
+    return {action_name: CompiledParser(parsers[action_name], action_struct)
+            for action_name, action_struct in record_schema.action_name_to_struct.items()}
@@ -0,0 +1,88 @@
+import functools
+import hashlib
+import os
+import pickle
+from typing import Callable
+
+from run_history_reader import PARSER_VERSION
+
+
+def _extractor_name(extractor: Callable) -> str:
+    if isinstance(extractor, functools.partial):
+        arguments = [repr(argument) for argument in extractor.args]
+        arguments += ["{}={!r}".format(name, value) for name, value in sorted(extractor.keywords.items())]
+        return "{}({})".format(_extractor_name(extractor.func), ", ".join(arguments))
+    qualname = getattr(extractor, "__qualname__", None)
+    if qualname is None:
+        # A callable object; its repr is the best name there is
+        return repr(extractor)
+    return "{}.{}".format(extractor.__module__, qualname)
+
+
+def hash_file(path) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class GameCache:
+    """
+    On-disk cache of whatever an extractor (extract_game_from_record_file by default) produced for each record file,
+    so only new or changed records need parsing. Entries are keyed by the record's absolute path and are valid while
+    its size and mtime are unchanged, the extractor is the same and PARSER_VERSION has not been bumped. With
+    use_content_hash, a hash of the record contents must match as well, and a record that was merely touched still
+    counts as unchanged.
+    """
+
+    def __init__(self, cache_dir, use_content_hash: bool = False):
+        self.cache_dir = os.fspath(cache_dir)
+        self.use_content_hash = use_content_hash
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _entry_path(self, record_path) -> str:
+        key = hashlib.sha1(os.path.abspath(record_path).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, key + ".pkl")
+
+    def _identity(self, record_path) -> dict:
+        stat = os.stat(record_path)
+        identity = {"path": os.path.abspath(record_path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        if self.use_content_hash:
+            identity["hash"] = hash_file(record_path)
+        return identity
+
+    def get(self, record_path, extractor: Callable):
+        """Returns the cached value for record_path, or None if there is no valid entry."""
+        try:
+            with open(self._entry_path(record_path), 'rb') as f:
+                entry = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            return None
+        if entry["parser_version"] != PARSER_VERSION or entry["extractor"] != _extractor_name(extractor):
+            return None
+        identity = self._identity(record_path)
+        cached = entry["identity"]
+        if cached["path"] != identity["path"] or cached["size"] != identity["size"]:
+            return None
+        if self.use_content_hash:
+            if cached.get("hash") != identity["hash"]:
+                return None
+        elif cached["mtime_ns"] != identity["mtime_ns"]:
+            return None
+        return entry["value"]
+
+    def put(self, record_path, extractor: Callable, value):
+        entry = {"parser_version": PARSER_VERSION, "extractor": _extractor_name(extractor),
+                 "identity": self._identity(record_path), "value": value}
+        entry_path = self._entry_path(record_path)
+        temporary_path = entry_path + ".tmp"
+        with open(temporary_path, 'wb') as f:
+            pickle.dump(entry, f)
+        os.replace(temporary_path, entry_path)
+
+    def invalidate(self, record_path):
+        try:
+            os.remove(self._entry_path(record_path))
+        except FileNotFoundError:
+            pass
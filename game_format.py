@@ -0,0 +1,460 @@
+"""
+A compact binary file of extracted games, much smaller and faster to load than a pickled list of Game objects.
+
+    with GameWriter("games.sbbg") as writer:
+        for game in games:
+            writer.write(game)
+    for game in iter_games("games.sbbg"):      # one game at a time
+        ...
+    with GameFile("games.sbbg") as games:      # random access
+        game = games[42]
+
+The file is a header (magic and version), then one frame per game, then an index of the frame offsets followed by a
+trailer pointing at it. A frame is its varint length followed by:
+
+    strings   every string of the game, UTF-8, joined by NUL characters
+    scalars   turn, mmr change, game over, placement and final level
+    units     one column per Unit attribute, over the distinct units of the game
+    players   one column per Player attribute, over the distinct players of the game
+    structure the shops, purchases, spells, leaderboards, results, treasure choices and boards, as counts and references
+              into the tables above
+
+Every column is a block of varints, zigzag-coded if the column has negative values. Varints of several bytes have to be
+decoded one byte at a time in Python, so columns with values of 128 or more are instead packed as fixed width little
+endian integers, which load in one call. Strings, units and players are referenced by their index plus one, 0 standing
+for None. Units and players with equal attributes are stored once, and load as a single shared object. Diagnostics
+(recovery_report, decode_stats) are not stored.
+"""
+import os
+import struct
+import sys
+from array import array
+from typing import BinaryIO, Iterator, List, Optional, Union
+
+from run_history_reader import Board, Game, Player, TreasureChoice, Unit
+
+GAMES_SUFFIX = ".sbbg"
+GAMES_MAGIC = b"SBBG"
+GAMES_VERSION = 1
+
+# magic, version
+STRUCT_GAMES_HEADER = struct.Struct("<4sH")
+# offset of the index, number of games, magic; the last bytes of the file
+STRUCT_GAMES_TRAILER = struct.Struct("<QI4s")
+
+# Column flags: values are zigzag-coded; values are a packed array of fixed width integers rather than varints
+ZIGZAG = 1
+PACKED = 2
+# Packed array types by width
+PACKED_TYPECODES = {1: "B", 2: "H", 4: "L" if array("L").itemsize == 4 else "I"}
+LITTLE_ENDIAN = sys.byteorder == "little"
+
+
+def encode_varints(values, out: bytearray):
+    for value in values:
+        while value >= 0x80:
+            out.append(value & 0x7f | 0x80)
+            value >>= 7
+        out.append(value)
+
+
+def decode_varints(data) -> List[int]:
+    if not data or max(data) < 0x80:
+        # Every value fits in a single byte
+        return list(data)
+    values = []
+    value = 0
+    shift = 0
+    for byte in data:
+        if byte < 0x80:
+            values.append(value | byte << shift)
+            value = 0
+            shift = 0
+        else:
+            value |= (byte & 0x7f) << shift
+            shift += 7
+    return values
+
+
+def _read_varint(buffer, position: int):
+    value = 0
+    shift = 0
+    while True:
+        byte = buffer[position]
+        position += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+
+def _write_column(values: List[int], out: bytearray):
+    flags = 0
+    if values and min(values) < 0:
+        flags |= ZIGZAG
+        values = [value * 2 if value >= 0 else -value * 2 - 1 for value in values]
+    largest = max(values, default=0)
+    if 0x80 <= largest < 1 << 32:
+        # Varints of more than one byte are slow to decode, so such columns are packed, at some cost in size
+        flags |= PACKED
+        width = 2 if largest < 1 << 16 else 4
+        block = array(PACKED_TYPECODES[width], values)
+        if not LITTLE_ENDIAN:
+            block.byteswap()
+        block = block.tobytes()
+        encode_varints((flags, width, len(values)), out)
+    else:
+        block = bytearray()
+        encode_varints(values, block)
+        encode_varints((flags, len(block)), out)
+    out += block
+
+
+def _read_column(buffer, position: int):
+    flags, position = _read_varint(buffer, position)
+    if flags & PACKED:
+        width, position = _read_varint(buffer, position)
+        count, position = _read_varint(buffer, position)
+        length = width * count
+        values = array(PACKED_TYPECODES[width])
+        values.frombytes(buffer[position:position + length])
+        if not LITTLE_ENDIAN:
+            values.byteswap()
+        values = values.tolist()
+    else:
+        length, position = _read_varint(buffer, position)
+        values = decode_varints(buffer[position:position + length])
+    if flags & ZIGZAG:
+        values = [value >> 1 ^ -(value & 1) for value in values]
+    return values, position + length
+
+
+UNIT_COLUMNS = ("name", "zone", "attack", "health", "subtype_mask", "keyword_mask")
+PLAYER_COLUMNS = ("hero", "name", "id", "health", "level", "experience", "place")
+# Columns that hold string references
+STRING_COLUMNS = {"name", "zone", "hero", "id"}
+
+
+class _GameEncoder:
+
+    def __init__(self):
+        self.strings = {}
+        self.units = {}
+        self.players = {}
+        self.structure = []
+
+    def string(self, value: Optional[str]) -> int:
+        if value is None:
+            return 0
+        index = self.strings.get(value)
+        if index is None:
+            if "\0" in value:
+                raise ValueError("strings with NUL characters cannot be stored: {!r}".format(value))
+            index = self.strings[value] = len(self.strings) + 1
+        return index
+
+    def _row(self, obj, columns) -> tuple:
+        return tuple(self.string(getattr(obj, column)) if column in STRING_COLUMNS else getattr(obj, column)
+                     for column in columns)
+
+    def unit(self, unit: Optional[Unit]) -> int:
+        if unit is None:
+            return 0
+        row = self._row(unit, UNIT_COLUMNS)
+        index = self.units.get(row)
+        if index is None:
+            index = self.units[row] = len(self.units) + 1
+        return index
+
+    def player(self, player: Optional[Player]) -> int:
+        if player is None:
+            return 0
+        row = self._row(player, PLAYER_COLUMNS)
+        index = self.players.get(row)
+        if index is None:
+            index = self.players[row] = len(self.players) + 1
+        return index
+
+    def refs(self, objects, ref):
+        self.structure.append(len(objects))
+        self.structure.extend(ref(obj) for obj in objects)
+
+    def board(self, board: Board):
+        self.structure.append(self.string(board.hero))
+        self.refs(board.units, self.unit)
+        self.refs(board.treasures, self.unit)
+
+    def encode(self, game: Game) -> bytes:
+        structure = self.structure
+        for turns in (game.shops, game.bought):
+            structure.append(len(turns))
+            for shops in turns:
+                structure.append(len(shops))
+                for shop in shops:
+                    self.refs(shop, self.unit)
+        structure.append(len(game.spells))
+        for spells in game.spells:
+            self.refs(spells, self.unit)
+        structure.append(len(game.leaderboards))
+        for leaderboard in game.leaderboards:
+            self.refs(leaderboard, self.player)
+        self.refs(game.final_results, self.player)
+        structure.append(len(game.treasure_choices))
+        for choice in game.treasure_choices:
+            self.refs(choice.choices, self.string)
+            structure.append(choice.tier)
+            structure.append(self.string(choice.chosen))
+        for boards in (game.boards, game.enemy_boards):
+            structure.append(len(boards))
+            for board in boards:
+                self.board(board)
+        structure.append(game.final_board is not None)
+        if game.final_board is not None:
+            self.board(game.final_board)
+        structure.append(self.string(game.build_id))
+
+        out = bytearray()
+        blob = "\0".join(self.strings).encode("utf-8")
+        encode_varints((len(self.strings), len(blob)), out)
+        out += blob
+        _write_column([game.turn, game.mmr_change, int(game.game_over), game.placement, game.final_level or 0], out)
+        for table, columns in ((self.units, UNIT_COLUMNS), (self.players, PLAYER_COLUMNS)):
+            encode_varints((len(table),), out)
+            rows = list(table)
+            for position in range(len(columns)):
+                _write_column([row[position] for row in rows], out)
+        _write_column(structure, out)
+        return bytes(out)
+
+
+def encode_game(game: Game) -> bytes:
+    """The frame payload of a game, without its length."""
+    return _GameEncoder().encode(game)
+
+
+def _read_table(buffer, position: int, columns):
+    count, position = _read_varint(buffer, position)
+    values = []
+    for _ in columns:
+        column, position = _read_column(buffer, position)
+        values.append(column)
+    return count, values, position
+
+
+def decode_game(buffer, position: int = 0) -> Game:
+    """Decodes a frame payload starting at position."""
+    count, position = _read_varint(buffer, position)
+    length, position = _read_varint(buffer, position)
+    strings = [None]
+    if count:
+        strings += bytes(buffer[position:position + length]).decode("utf-8").split("\0")
+    position += length
+    scalars, position = _read_column(buffer, position)
+
+    _, columns, position = _read_table(buffer, position, UNIT_COLUMNS)
+    units = [None]
+    new = Unit.__new__
+    for name, zone, attack, health, subtype_mask, keyword_mask in zip(*columns):
+        unit = new(Unit)
+        unit.name = strings[name]
+        unit.zone = strings[zone]
+        unit.attack = attack
+        unit.health = health
+        unit.subtype_mask = subtype_mask
+        unit.keyword_mask = keyword_mask
+        units.append(unit)
+
+    _, columns, position = _read_table(buffer, position, PLAYER_COLUMNS)
+    players = [None]
+    new = Player.__new__
+    for hero, name, player_id, health, level, experience, place in zip(*columns):
+        player = new(Player)
+        player.hero = strings[hero]
+        player.name = strings[name]
+        player.id = strings[player_id]
+        player.health = health
+        player.level = level
+        player.experience = experience
+        player.place = place
+        players.append(player)
+
+    structure, position = _read_column(buffer, position)
+    next_value = iter(structure).__next__
+
+    def refs(table):
+        return [table[next_value()] for _ in range(next_value())]
+
+    def board():
+        board = Board.__new__(Board)
+        board.hero = strings[next_value()]
+        board.units = refs(units)
+        board.treasures = refs(units)
+        return board
+
+    game = Game.__new__(Game)
+    game.shops = [[refs(units) for _ in range(next_value())] for _ in range(next_value())]
+    game.bought = [[refs(units) for _ in range(next_value())] for _ in range(next_value())]
+    game.spells = [refs(units) for _ in range(next_value())]
+    game.leaderboards = [refs(players) for _ in range(next_value())]
+    game.final_results = refs(players)
+    game.treasure_choices = []
+    for _ in range(next_value()):
+        choice = TreasureChoice.__new__(TreasureChoice)
+        choice.choices = refs(strings)
+        choice.tier = next_value()
+        choice.chosen = strings[next_value()]
+        game.treasure_choices.append(choice)
+    game.boards = [board() for _ in range(next_value())]
+    game.enemy_boards = [board() for _ in range(next_value())]
+    game.final_board = board() if next_value() else None
+    game.build_id = strings[next_value()]
+    game.turn, game.mmr_change, game_over, game.placement, game.final_level = scalars
+    game.game_over = bool(game_over)
+    game.recovery_report = None
+    game.decode_stats = None
+    return game
+
+
+class GameWriter:
+    """Writes games to a new games file one at a time. The file is only complete (and indexed) once closed."""
+
+    def __init__(self, path):
+        self.f = open(path, 'wb')
+        self.f.write(STRUCT_GAMES_HEADER.pack(GAMES_MAGIC, GAMES_VERSION))
+        self.offsets = array("Q")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, game: Game):
+        payload = encode_game(game)
+        frame = bytearray()
+        encode_varints((len(payload),), frame)
+        self.offsets.append(self.f.tell())
+        self.f.write(frame)
+        self.f.write(payload)
+
+    def close(self):
+        if self.f.closed:
+            return
+        # A zero length ends the frames, for readers streaming through them
+        self.f.write(b"\0")
+        index_offset = self.f.tell()
+        offsets = array("Q", self.offsets)
+        if not LITTLE_ENDIAN:
+            offsets.byteswap()
+        self.f.write(offsets.tobytes())
+        self.f.write(STRUCT_GAMES_TRAILER.pack(index_offset, len(self.offsets), GAMES_MAGIC))
+        self.f.close()
+
+
+def dump_games(games, path):
+    with GameWriter(path) as writer:
+        for game in games:
+            writer.write(game)
+
+
+def _check_header(header: bytes):
+    if len(header) != STRUCT_GAMES_HEADER.size:
+        raise ValueError("Truncated games file header")
+    magic, version = STRUCT_GAMES_HEADER.unpack(header)
+    if magic != GAMES_MAGIC or version != GAMES_VERSION:
+        raise ValueError("Not a version {} games file".format(GAMES_VERSION))
+
+
+def _read_frame(f: BinaryIO) -> Optional[bytes]:
+    length = 0
+    shift = 0
+    while True:
+        byte = f.read(1)
+        if not byte:
+            raise ValueError("Truncated games file")
+        length |= (byte[0] & 0x7f) << shift
+        if byte[0] < 0x80:
+            break
+        shift += 7
+    if length == 0:
+        return None
+    payload = f.read(length)
+    if len(payload) != length:
+        raise ValueError("Truncated games file")
+    return payload
+
+
+def iter_games(path_or_file: Union[str, os.PathLike, BinaryIO]) -> Iterator[Game]:
+    """Yields the games of a games file one at a time, reading one frame at a time."""
+    if isinstance(path_or_file, (str, os.PathLike)):
+        with open(path_or_file, 'rb') as f:
+            yield from iter_games(f)
+        return
+    f = path_or_file
+    _check_header(f.read(STRUCT_GAMES_HEADER.size))
+    while True:
+        payload = _read_frame(f)
+        if payload is None:
+            return
+        yield decode_game(payload)
+
+
+def load_games(path) -> List[Game]:
+    """Every game of a games file, read in one go."""
+    with open(path, 'rb') as f:
+        buffer = f.read()
+    _check_header(buffer[:STRUCT_GAMES_HEADER.size])
+    view = memoryview(buffer)
+    games = []
+    position = STRUCT_GAMES_HEADER.size
+    while True:
+        length, position = _read_varint(view, position)
+        if length == 0:
+            return games
+        games.append(decode_game(view[position:position + length]))
+        position += length
+
+
+class GameFile:
+    """Random access to the games of a games file, through the index at its end."""
+
+    def __init__(self, path):
+        self.f = open(path, 'rb')
+        try:
+            _check_header(self.f.read(STRUCT_GAMES_HEADER.size))
+            self.f.seek(-STRUCT_GAMES_TRAILER.size, os.SEEK_END)
+            index_offset, count, magic = STRUCT_GAMES_TRAILER.unpack(self.f.read(STRUCT_GAMES_TRAILER.size))
+            if magic != GAMES_MAGIC:
+                raise ValueError("Games file without an index, it was not closed properly")
+            self.f.seek(index_offset)
+            self.offsets = array("Q")
+            self.offsets.frombytes(self.f.read(8 * count))
+            if not LITTLE_ENDIAN:
+                self.offsets.byteswap()
+        except Exception:
+            self.f.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, index: int) -> Game:
+        if index < 0:
+            index += len(self.offsets)
+        if not 0 <= index < len(self.offsets):
+            raise IndexError("game index out of range")
+        self.f.seek(self.offsets[index])
+        return decode_game(_read_frame(self.f))
+
+    def __iter__(self) -> Iterator[Game]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def close(self):
+        self.f.close()
@@ -0,0 +1,360 @@
+"""
+An indexed SQLite database of extracted games, so that reports are answered by indexed queries instead of loading and
+scanning every game.
+
+    with GameStore("games.sqlite") as store:
+        store.add_games(games, sources)
+        store.purchases_by_level(player_id)
+
+Every game is a row of `games`, and each of its lists a table keyed by the game:
+
+    turns              game, turn, rolls (shops seen minus one)
+    shops              game, turn, roll, position and the unit offered
+    purchases          game, turn, roll, position and the unit bought
+    spells             game, turn, position and the spell cast
+    leaderboards       game, turn, position and the player, for every turn
+    results            game, position and the player, at the end of the game
+    treasure_choices   game, pick, tier, chosen
+    treasure_options   game, pick, position, name
+    final_board_units  game, kind ("character" or "treasure"), position and the unit
+
+Units and spells are stored by name, attack, health and the subtype and keyword bitsets of run_history_reader. Players
+are stored by id, name, hero, health, level, experience and place. Adding a game with the source of a stored game
+replaces it.
+"""
+import os
+import sqlite3
+from typing import Iterable, List, NamedTuple, Optional, Tuple, Union
+
+from run_history_reader import Game
+
+STORE_SUFFIXES = (".sqlite", ".db")
+STORE_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE games (
+    game INTEGER PRIMARY KEY,
+    source TEXT UNIQUE,
+    build_id TEXT,
+    turns INTEGER NOT NULL,
+    placement INTEGER NOT NULL,
+    final_level INTEGER,
+    mmr_change INTEGER,
+    game_over INTEGER NOT NULL,
+    hero TEXT
+);
+CREATE TABLE turns (
+    game INTEGER NOT NULL REFERENCES games ON DELETE CASCADE,
+    turn INTEGER NOT NULL,
+    rolls INTEGER NOT NULL,
+    PRIMARY KEY (game, turn)
+);
+CREATE TABLE shops (
+    game INTEGER NOT NULL REFERENCES games ON DELETE CASCADE,
+    turn INTEGER NOT NULL,
+    roll INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    name TEXT,
+    attack INTEGER,
+    health INTEGER,
+    subtype_mask INTEGER,
+    keyword_mask INTEGER
+);
+CREATE TABLE purchases (
+    game INTEGER NOT NULL REFERENCES games ON DELETE CASCADE,
+    turn INTEGER NOT NULL,
+    roll INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    name TEXT,
+    attack INTEGER,
+    health INTEGER,
+    subtype_mask INTEGER,
+    keyword_mask INTEGER
+);
+CREATE TABLE spells (
+    game INTEGER NOT NULL REFERENCES games ON DELETE CASCADE,
+    turn INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    name TEXT,
+    attack INTEGER,
+    health INTEGER,
+    subtype_mask INTEGER,
+    keyword_mask INTEGER
+);
+CREATE TABLE leaderboards (
+    game INTEGER NOT NULL REFERENCES games ON DELETE CASCADE,
+    turn INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    player_id TEXT,
+    name TEXT,
+    hero TEXT,
+    health INTEGER,
+    level INTEGER,
+    experience INTEGER,
+    place INTEGER
+);
+CREATE TABLE results (
+    game INTEGER NOT NULL REFERENCES games ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    player_id TEXT,
+    name TEXT,
+    hero TEXT,
+    health INTEGER,
+    level INTEGER,
+    experience INTEGER,
+    place INTEGER
+);
+CREATE TABLE treasure_choices (
+    game INTEGER NOT NULL REFERENCES games ON DELETE CASCADE,
+    pick INTEGER NOT NULL,
+    tier INTEGER NOT NULL,
+    chosen TEXT,
+    PRIMARY KEY (game, pick)
+);
+CREATE TABLE treasure_options (
+    game INTEGER NOT NULL,
+    pick INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    name TEXT,
+    FOREIGN KEY (game, pick) REFERENCES treasure_choices ON DELETE CASCADE
+);
+CREATE TABLE final_board_units (
+    game INTEGER NOT NULL REFERENCES games ON DELETE CASCADE,
+    kind TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    name TEXT,
+    attack INTEGER,
+    health INTEGER,
+    subtype_mask INTEGER,
+    keyword_mask INTEGER
+);
+CREATE INDEX shops_game ON shops (game, turn);
+CREATE INDEX shops_name ON shops (name);
+CREATE INDEX purchases_game ON purchases (game, turn);
+CREATE INDEX purchases_name ON purchases (name);
+CREATE INDEX spells_game ON spells (game, turn);
+CREATE INDEX leaderboards_player ON leaderboards (player_id, game, turn);
+CREATE INDEX leaderboards_game ON leaderboards (game, turn);
+CREATE INDEX results_player ON results (player_id, game);
+CREATE INDEX results_game ON results (game);
+CREATE INDEX treasure_choices_tier ON treasure_choices (tier, chosen);
+CREATE INDEX treasure_options_game ON treasure_options (game, pick);
+CREATE INDEX treasure_options_name ON treasure_options (name);
+CREATE INDEX final_board_units_game ON final_board_units (game);
+CREATE INDEX final_board_units_name ON final_board_units (name);
+"""
+
+UNIT_COLUMNS = "name, attack, health, subtype_mask, keyword_mask"
+PLAYER_COLUMNS = "player_id, name, hero, health, level, experience, place"
+# The tables filled from the lists of each game, and their columns after the game
+CHILD_TABLES = {
+    "turns": "turn, rolls",
+    "shops": "turn, roll, position, " + UNIT_COLUMNS,
+    "purchases": "turn, roll, position, " + UNIT_COLUMNS,
+    "spells": "turn, position, " + UNIT_COLUMNS,
+    "leaderboards": "turn, position, " + PLAYER_COLUMNS,
+    "results": "position, " + PLAYER_COLUMNS,
+    "treasure_choices": "pick, tier, chosen",
+    "treasure_options": "pick, position, name",
+    "final_board_units": "kind, position, " + UNIT_COLUMNS,
+}
+
+
+class PurchaseRow(NamedTuple):
+    level: int
+    name: str
+    # Games in which the unit was bought at that level
+    count: int
+    placement: float
+
+
+class TreasureRow(NamedTuple):
+    tier: int
+    name: str
+    offered: int
+    picked: int
+    pick_rate: float
+    # Mean placement of the games in which it was picked at that tier, None if it never was
+    placement: Optional[float]
+
+
+class HeadToHeadRow(NamedTuple):
+    player_id: str
+    # The name of the opponent in their most recent game
+    name: str
+    wins: int
+    losses: int
+
+
+def _unit_values(unit) -> tuple:
+    return unit.name, unit.attack, unit.health, unit.subtype_mask, unit.keyword_mask
+
+
+def _player_values(player) -> tuple:
+    return player.id, player.name, player.hero, player.health, player.level, player.experience, player.place
+
+
+class GameStore:
+    """A SQLite database of games, created if it does not exist yet."""
+
+    def __init__(self, path: Union[str, os.PathLike] = ":memory:"):
+        self.connection = sqlite3.connect(os.fspath(path))
+        try:
+            self.connection.execute("PRAGMA foreign_keys = ON")
+            version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+            if version == 0:
+                with self.connection:
+                    self.connection.executescript(SCHEMA + "PRAGMA user_version = {};".format(STORE_VERSION))
+            elif version != STORE_VERSION:
+                raise ValueError("Not a version {} game store".format(STORE_VERSION))
+        except Exception:
+            self.connection.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM games").fetchone()[0]
+
+    def add_game(self, game: Game, source: Optional[str] = None) -> int:
+        return self.add_games([game], [source])[0]
+
+    def add_games(self, games: Iterable[Game], sources: Optional[Iterable[Optional[str]]] = None) -> List[int]:
+        """
+        Adds games in a single transaction, replacing stored games with the same sources (typically their record
+        files). Of several games with the same source in games, only the last one is added. Returns the id of every
+        game, that of the game added in its place for those that were not.
+        """
+        games = list(games)
+        sources = [None] * len(games) if sources is None else [os.fspath(source) if source is not None else None
+                                                               for source in sources]
+        if len(sources) != len(games):
+            raise ValueError("{} sources for {} games".format(len(sources), len(games)))
+        # A game deleted in the middle of the batch would have its id reused by the next one, while its rows are
+        # still waiting to be inserted, so repeated sources are dropped before anything is written
+        last_of_source = {source: index for index, source in enumerate(sources) if source is not None}
+        rows = {table: [] for table in CHILD_TABLES}
+        ids = [None] * len(games)
+        with self.connection:
+            cursor = self.connection.cursor()
+            for index, (game, source) in enumerate(zip(games, sources)):
+                if source is not None:
+                    if last_of_source[source] != index:
+                        continue
+                    cursor.execute("DELETE FROM games WHERE source = ?", (source,))
+                cursor.execute("INSERT INTO games (source, build_id, turns, placement, final_level, mmr_change, "
+                               "game_over, hero) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                               (source, game.build_id, game.turn, game.placement, game.final_level, game.mmr_change,
+                                game.game_over, game.final_board.hero if game.final_board is not None else None))
+                ids[index] = cursor.lastrowid
+                self._game_rows(cursor.lastrowid, game, rows)
+            for table, columns in CHILD_TABLES.items():
+                placeholders = ", ".join("?" * (columns.count(",") + 2))
+                cursor.executemany("INSERT INTO {} (game, {}) VALUES ({})".format(table, columns, placeholders),
+                                   rows[table])
+        return [game_id if game_id is not None else ids[last_of_source[source]]
+                for game_id, source in zip(ids, sources)]
+
+    @staticmethod
+    def _game_rows(game_id: int, game: Game, rows: dict):
+        for turn, shops in enumerate(game.shops, 1):
+            rows["turns"].append((game_id, turn, len(shops) - 1))
+            for roll, shop in enumerate(shops):
+                for position, unit in enumerate(shop or ()):
+                    if unit is not None:
+                        rows["shops"].append((game_id, turn, roll, position) + _unit_values(unit))
+        for turn, shops in enumerate(game.bought, 1):
+            for roll, bought in enumerate(shops):
+                for position, unit in enumerate(bought):
+                    rows["purchases"].append((game_id, turn, roll, position) + _unit_values(unit))
+        for turn, spells in enumerate(game.spells, 1):
+            for position, spell in enumerate(spells):
+                rows["spells"].append((game_id, turn, position) + _unit_values(spell))
+        for turn, leaderboard in enumerate(game.leaderboards, 1):
+            for position, player in enumerate(leaderboard):
+                rows["leaderboards"].append((game_id, turn, position) + _player_values(player))
+        for position, player in enumerate(game.final_results):
+            rows["results"].append((game_id, position) + _player_values(player))
+        for pick, choice in enumerate(game.treasure_choices):
+            rows["treasure_choices"].append((game_id, pick, choice.tier, choice.chosen))
+            for position, name in enumerate(choice.choices):
+                rows["treasure_options"].append((game_id, pick, position, name))
+        if game.final_board is not None:
+            for kind, units in (("character", game.final_board.units), ("treasure", game.final_board.treasures)):
+                for position, unit in enumerate(units):
+                    rows["final_board_units"].append((game_id, kind, position) + _unit_values(unit))
+
+    def purchases_by_level(self, player_id: str, level: Optional[int] = None) -> List[PurchaseRow]:
+        """
+        Like analyze_games.purchase_report: the number of games in which each unit was bought by player_id at each of
+        their levels, and the mean placement of those games. Most bought first within a level, then by name.
+        """
+        query = """
+            SELECT level, name, COUNT(*) AS count, AVG(placement)
+            FROM (SELECT DISTINCT purchases.game, leaderboards.level, purchases.name, games.placement
+                  FROM leaderboards
+                  JOIN purchases ON purchases.game = leaderboards.game AND purchases.turn = leaderboards.turn
+                  JOIN games ON games.game = leaderboards.game
+                  WHERE leaderboards.player_id = ?{})
+            GROUP BY level, name
+            ORDER BY level, count DESC, name
+        """
+        if level is None:
+            rows = self.connection.execute(query.format(""), (player_id,))
+        else:
+            rows = self.connection.execute(query.format(" AND leaderboards.level = ?"), (player_id, level))
+        return [PurchaseRow(*row) for row in rows]
+
+    def treasure_pick_rates(self, tier: Optional[int] = None) -> List[TreasureRow]:
+        """
+        How often each treasure was offered and picked at each tier, and the mean placement when picked. Most picked
+        first within a tier, then by name.
+        """
+        query = """
+            SELECT choice.tier, option.name, COUNT(*), SUM(choice.chosen IS option.name) AS picked,
+                   AVG(choice.chosen IS option.name),
+                   AVG(CASE WHEN choice.chosen IS option.name THEN games.placement END)
+            FROM treasure_options AS option
+            JOIN treasure_choices AS choice ON choice.game = option.game AND choice.pick = option.pick
+            JOIN games ON games.game = option.game
+            {}
+            GROUP BY choice.tier, option.name
+            ORDER BY choice.tier, picked DESC, option.name
+        """
+        if tier is None:
+            rows = self.connection.execute(query.format(""))
+        else:
+            rows = self.connection.execute(query.format("WHERE choice.tier = ?"), (tier,))
+        return [TreasureRow(*row) for row in rows]
+
+    def head_to_head(self, player_id: str, opponent_id: Optional[str] = None) -> List[HeadToHeadRow]:
+        """
+        Wins and losses of player_id against every opponent they finished a game with, a win being a better final
+        place. Most played first, then by opponent id.
+        """
+        query = """
+            SELECT opponent.player_id, opponent.name, MAX(opponent.game),
+                   SUM(opponent.place > player.place), SUM(opponent.place < player.place)
+            FROM results AS player
+            JOIN results AS opponent ON opponent.game = player.game AND opponent.player_id != player.player_id
+            WHERE player.player_id = ?{}
+            GROUP BY opponent.player_id
+            ORDER BY COUNT(*) DESC, opponent.player_id
+        """
+        if opponent_id is None:
+            rows = self.connection.execute(query.format(""), (player_id,))
+        else:
+            rows = self.connection.execute(query.format(" AND opponent.player_id = ?"), (player_id, opponent_id))
+        # With a single MAX aggregate, SQLite takes the name from the row of the most recent game
+        return [HeadToHeadRow(opponent, name, wins, losses) for opponent, name, _, wins, losses in rows]
+
+    def rolls_by_turn(self) -> List[Tuple[int, float]]:
+        """The mean number of rolls on each turn, like analyze_games.rolls_report."""
+        return self.connection.execute("SELECT turn, AVG(rolls) FROM turns GROUP BY turn ORDER BY turn").fetchall()
@@ -0,0 +1,156 @@
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import Iterable, Iterator, Optional, Tuple
+
+from construct import ConstructError
+
+from record_parser import STRUCT_ACTION_TIMESTAMP, ActionDecoder, id_to_action_name
+
+INDEX_SUFFIX = ".idx"
+INDEX_MAGIC = b"SBBI"
+INDEX_VERSION = 1
+
+# magic, version, record size, record mtime (ns), bytes of the record covered by the index, number of actions
+STRUCT_INDEX_HEADER = struct.Struct("<4sHQQQI")
+
+action_name_to_number = {action_name: int.from_bytes(action_id, "little")
+                         for action_id, action_name in id_to_action_name.items()}
+
+
+def _little_endian(column: array) -> array:
+    if sys.byteorder == "big":
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column
+
+
+class ActionIndex:
+    """
+    Byte offset, action id and timestamp of every action in a record file, stored column-wise. Built once per record
+    by build_action_index and persisted as a sidecar file next to it, so later questions about the record can jump
+    straight to the actions they need instead of parsing the whole file.
+    """
+
+    def __init__(self, record_size: int, record_mtime_ns: int, parsed_length: int, offsets: array,
+                 action_ids: array, timestamps: array):
+        self.record_size = record_size
+        self.record_mtime_ns = record_mtime_ns
+        self.parsed_length = parsed_length
+        self.offsets = offsets
+        self.action_ids = action_ids
+        self.timestamps = timestamps
+
+    def __len__(self):
+        return len(self.offsets)
+
+    @property
+    def is_complete(self) -> bool:
+        return self.parsed_length == self.record_size
+
+    def positions(self, action_name: str):
+        """Positions (not byte offsets) in the index of every action of the given type."""
+        number = action_name_to_number[action_name]
+        return [i for i, action_id in enumerate(self.action_ids) if action_id == number]
+
+    def offsets_of(self, action_name: str):
+        return [self.offsets[i] for i in self.positions(action_name)]
+
+    def last_offset_of(self, action_name: str) -> Optional[int]:
+        number = action_name_to_number[action_name]
+        for i in range(len(self.action_ids) - 1, -1, -1):
+            if self.action_ids[i] == number:
+                return self.offsets[i]
+        return None
+
+    def is_fresh_for(self, record_path) -> bool:
+        stat = os.stat(record_path)
+        return stat.st_size == self.record_size and stat.st_mtime_ns == self.record_mtime_ns
+
+    def dump(self, f):
+        f.write(STRUCT_INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, self.record_size, self.record_mtime_ns,
+                                         self.parsed_length, len(self)))
+        for column in (self.offsets, self.action_ids, self.timestamps):
+            f.write(_little_endian(column).tobytes())
+
+    @classmethod
+    def load(cls, f) -> "ActionIndex":
+        header = f.read(STRUCT_INDEX_HEADER.size)
+        if len(header) != STRUCT_INDEX_HEADER.size:
+            raise ValueError("Truncated action index header")
+        magic, version, record_size, record_mtime_ns, parsed_length, count = STRUCT_INDEX_HEADER.unpack(header)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            raise ValueError("Not a version {} action index".format(INDEX_VERSION))
+        columns = []
+        for typecode in ("I", "H", "Q"):
+            column = array(typecode)
+            column.fromfile(f, count)
+            columns.append(_little_endian(column))
+        return cls(record_size, record_mtime_ns, parsed_length, *columns)
+
+
+def index_path_for(record_path) -> str:
+    return os.fspath(record_path) + INDEX_SUFFIX
+
+
+def build_action_index(record_path, write: bool = True) -> ActionIndex:
+    """
+    Makes one pass over the record, skipping over actions by length rather than decoding them, and saves the resulting
+    index next to it unless write is False.
+    """
+    stat = os.stat(record_path)
+    offsets = array("I")
+    action_ids = array("H")
+    timestamps = array("Q")
+    with open(record_path, 'rb') as f:
+        decoder = ActionDecoder(f.read())
+    buffer = decoder.buffer
+    offset = 0
+    while offset < len(buffer):
+        try:
+            end = decoder.skip(offset)
+        except ConstructError:
+            break
+        offsets.append(offset)
+        action_ids.append(int.from_bytes(buffer[offset:offset + 2], "little"))
+        timestamps.append(STRUCT_ACTION_TIMESTAMP.unpack_from(buffer, offset + 2)[0])
+        offset = end
+    parsed_length = offset
+    index = ActionIndex(stat.st_size, stat.st_mtime_ns, parsed_length, offsets, action_ids, timestamps)
+    if write:
+        with open(index_path_for(record_path), 'wb') as f:
+            index.dump(f)
+    return index
+
+
+def load_action_index(record_path) -> ActionIndex:
+    """Loads the sidecar index of a record, (re)building it if it is missing, unreadable or out of date."""
+    try:
+        with open(index_path_for(record_path), 'rb') as f:
+            index = ActionIndex.load(f)
+    except (OSError, ValueError, EOFError):
+        return build_action_index(record_path)
+    if not index.is_fresh_for(record_path):
+        return build_action_index(record_path)
+    return index
+
+
+def iter_indexed_actions(record_path, action_names: Iterable[str], index: Optional[ActionIndex] = None) \
+        -> Iterator[Tuple[int, object]]:
+    """Yields (byte offset, action) for only the actions of the given types, decoding nothing else."""
+    if index is None:
+        index = load_action_index(record_path)
+    numbers = {action_name_to_number[action_name] for action_name in action_names}
+    offsets = [offset for offset, action_id in zip(index.offsets, index.action_ids) if action_id in numbers]
+    if not offsets:
+        return
+    with open(record_path, 'rb') as f:
+        decoder = ActionDecoder(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), lazy=True)
+    try:
+        for offset in offsets:
+            action, _ = decoder.decode(offset)
+            yield offset, action
+    finally:
+        decoder.close()
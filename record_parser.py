@@ -1,18 +1,18 @@
-from typing import BinaryIO
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from collections import namedtuple
 import re
 
-import binascii
+import contextlib
+import io
+import mmap
+import os
 import struct
-from construct import Struct, Const, Padding, PascalString, Int32ub, Int8ub, Int16ul, Int32ul, Int32sl, Int16ub, \
-    Int64ul, PrefixedArray, Select, GreedyRange, Flag, Float32b, Float32l, Float32n, Sequence, Adapter, PaddedString, \
-    Array, Byte, Probe, Enum, this
-
-STRUCT_GUID = Struct(
-    "field_1" / Int32ul,
-    "field_2" / Int16ul,
-    "field_3" / Int16ul,
-    "field_4" / Int64ul
-)
+import sys
+import time
+from construct import Struct, Const, Int16ul, Select, Sequence, Adapter, PaddedString, Array, Byte, Enum, Construct, \
+    Container, ConstructError, ConstError, MappingError, SelectError, SizeofError, StreamError, StringError, \
+    Subconstruct, Renamed, Rebuild, FormatField, FocusedSeq, FixedSized, evaluate, stream_read, stream_seek, \
+    stream_tell
 
 preamble_regex = re.compile(r"ClientVersion:\[([^\]]+)\]\|TransportVersion:\[([^\]]+)\]\|CardDatabaseVersion:\[([^\]]+)\]")
 
@@ -26,20 +26,88 @@ def parse_preamble(f: BinaryIO):
     return client_version, transport_version, card_database_version
 
 
+def guid_bytes_to_hex(raw: bytes) -> str:
+    """Formats a raw 16-byte GUID as the 32-character hex string that GuidAdapter produces by default."""
+    return (raw[3::-1] + raw[5:3:-1] + raw[7:5:-1] + raw[8:16]).hex()
+
+
+def guid_bytes_to_int(raw: bytes) -> int:
+    """The 128-bit integer whose zero-padded hex form is guid_bytes_to_hex(raw)."""
+    return int.from_bytes(raw[3::-1] + raw[5:3:-1] + raw[7:5:-1] + raw[8:16], "big")
+
+
+def guid_hex_to_bytes(guid: str) -> bytes:
+    """The raw 16 bytes of a GUID formatted by guid_bytes_to_hex."""
+    raw = bytes.fromhex(guid)
+    if len(raw) != 16:
+        raise ValueError("a GUID has 32 hex digits, not {!r}".format(guid))
+    # Swapping the byte order of the first three fields is its own inverse
+    return raw[3::-1] + raw[5:3:-1] + raw[7:5:-1] + raw[8:16]
+
+
+GUID_FORMATTERS = {"hex": guid_bytes_to_hex, "bytes": bytes, "int": guid_bytes_to_int}
+
+
+def guid_to_hex(guid) -> str:
+    """Formats a GUID decoded in any of the GUID_FORMATTERS representations as a hex string."""
+    if isinstance(guid, str):
+        return guid
+    if isinstance(guid, int):
+        return format(guid, "032x")
+    return guid_bytes_to_hex(guid)
+
+
+def guid_to_bytes(guid) -> bytes:
+    """The raw 16 bytes of a GUID decoded in any of the GUID_FORMATTERS representations."""
+    if isinstance(guid, str):
+        return guid_hex_to_bytes(guid)
+    if isinstance(guid, int):
+        return guid_hex_to_bytes(format(guid, "032x"))
+    return bytes(guid)
+
+
+def make_guid_decoder(guid_format: str = "hex"):
+    """
+    Returns a function turning raw GUID bytes into the requested representation, interning the results so every
+    occurrence of the same GUID decoded through it shares one object.
+    """
+    formatter = GUID_FORMATTERS[guid_format]
+    pool = {}
+
+    def decode_guid(raw):
+        try:
+            return pool[raw]
+        except KeyError:
+            guid = pool[raw] = formatter(raw)
+            return guid
+    return decode_guid
+
+
+def _decode_guid_in_context(raw: bytes, context):
+    decode_guid = context._params.get("guid_decoder")
+    if decode_guid is None:
+        return guid_bytes_to_hex(raw)
+    return decode_guid(raw)
+
+
 class GuidAdapter(Adapter):
+    """
+    Decodes a 16-byte GUID as a hex string, or with the `guid_decoder` context parameter if one is given (see
+    make_guid_decoder).
+    """
 
     def _decode(self, obj, context, path):
-        bytes = [struct.pack(">L", obj.field_1), struct.pack(">H", obj.field_2), struct.pack(">H", obj.field_3),
-                 struct.pack("<Q", obj.field_4)]
-        hexlified = [binascii.hexlify(x).decode("ascii") for x in bytes]
-        return "".join(hexlified)
+        return _decode_guid_in_context(obj, context)
+
+    def _emitparse(self, code):
+        code.append("from record_parser import _decode_guid_in_context")
+        return "_decode_guid_in_context({}, this)".format(self.subcon._compileparse(code))
 
     def _encode(self, obj, context, path):
-        field_1 = struct.unpack(">L", binascii.unhexlify(obj[:4]))
-        field_2 = struct.unpack(">H", binascii.unhexlify(obj[4:6]))
-        field_3 = struct.unpack(">H", binascii.unhexlify(obj[6:8]))
-        field_4 = struct.unpack("<Q", binascii.unhexlify(obj[8:]))
-        return STRUCT_GUID.build(dict(field_1=field_1, field_2=field_2, field_3=field_3, field_4=field_4))
+        try:
+            return guid_to_bytes(obj)
+        except ValueError as e:
+            raise MappingError(str(e), path=path)
 
 
 ZONE = Enum(Byte, none=0, character=1, spell=2, treasure=3, hero=4, hand=5, shop=6)  # TODO: Incomplete
@@ -58,359 +126,193 @@ class ListUnitAdapter(Adapter):
         else:
             return obj[1]
 
+    def _emitparse(self, code):
+        return "reuse({}, lambda obj: None if obj == b'\\x01' else obj[1])".format(self.subcon._compileparse(code))
+
     def _encode(self, obj, context, path):
         if obj is None:
             return b"\x01"
         else:
-            return Sequence(Const(b"\x00"), obj)
-
-
-STRUCT_OPTIONAL_LIST_GUID = Select(Const(b"\x01"),
-                                   Sequence(Const(b"\x00"), PrefixedArray(Int32ul, GuidAdapter(STRUCT_GUID))))
-
-STRUCT_UNIT = Struct(
-    "card_id" / GuidAdapter(STRUCT_GUID),
-    "template_id" / Int32ul,
-    Padding(1),
-    "is_locked" / Flag,
-    "is_targeted" / Flag,  # Some of these still aren't tested
-    "is_golden" / Flag,
-    "is_movable" / Flag,
-    "makes_pair" / Flag,
-    "makes_triple" / Flag,
-    "zone" / ZONE,
-    "slot" / Int32sl,
-    "cost" / Int32ul,
-    "attack" / Int32ul,
-    "health" / Int32ul,
-    "counter" / Int32sl,
-    "damage" / Int32sl,
-    Padding(1),
-    "subtypes" / PrefixedArray(Int32ul, SUBTYPE),
-    Padding(1),
-    "keywords" / PrefixedArray(Int32ul, KEYWORD),
-    "valid_targets" / ListUnitAdapter(STRUCT_OPTIONAL_LIST_GUID),
-    "card_id_again" / GuidAdapter(STRUCT_GUID),
-    "art_id_length" / Int32ul,
-    "art_id" / PaddedString(this.art_id_length * 2, "utf_16_le"),
-    "player_id_length" / Int32ul,
-    "player_id" / PaddedString(this.player_id_length * 2, "utf_16_le"),
-    "frame_override_length" / Int32ul,
-    "frame_override" / PaddedString(this.frame_override_length * 2, "utf_16_le"),
-)
-
-STRUCT_LIST_UNIT = Select(Const(b"\x01"), Sequence(Const(b"\x00"), STRUCT_UNIT))
-
-STRUCT_ACTION_ADD_PLAYER = Struct(
-    "action_id" / Const(b"\x02\x00"),
-    "timestamp" / Int64ul,
-    "health" / Int32ul,
-    "gold" / Int32ul,
-    "experience" / Int32ul,
-    "next_level_xp" / Int32ul,
-    "level" / Int32ul,
-    "place" / Int32ul,
-    "player_id_length" / Int32ul,
-    "player_id" / PaddedString(this.player_id_length * 2, "utf_16_le"),
-    "player_name_length" / Int32ul,
-    "player_name" / PaddedString(this.player_name_length * 2, "utf_16_le"),
-    Padding(1),
-    "card_id" / GuidAdapter(STRUCT_GUID),
-    "template_id" / Int32ul
-)
-
-STRUCT_ACTION_ATTACK = Struct(
-    "action_id" / Const(b"\x1C\x00"),
-    "timestamp" / Int64ul,
-    "attacker" / GuidAdapter(STRUCT_GUID),
-    "defender" / GuidAdapter(STRUCT_GUID),
-    Padding(1)
-)
-
-STRUCT_ACTION_BRAWL_COMPLETE = Struct(
-    "action_id" / Const(b"\x21\x00"),
-    "timestamp" / Int64ul,
-    "unknown_1" / Int8ub,  # Always 0? Padding byte?
-    "round" / Int32ul,  # This is a guess
-    "id_1_length" / Int32ul,
-    "player_id_1" / PaddedString(this.id_1_length * 2, "utf_16_le"),
-    "id_2_length" / Int32ul,
-    "player_id_2" / PaddedString(this.id_2_length * 2, "utf_16_le"),
-)
-
-STRUCT_ACTION_CAST_SPELL = Struct(
-    "action_id" / Const(b"\x0E\x00"),
-    "timestamp" / Int64ul,
-    "card_id" / GuidAdapter(STRUCT_GUID),
-    "target" / GuidAdapter(STRUCT_GUID)
-)
-
-STRUCT_ACTION_CONNECTION_INFO = Struct(
-    "action_id" / Const(b"\x01\x00"),
-    "timestamp" / Int64ul,
-    "session_length" / Int32ul,
-    "session_id" / PaddedString(this.session_length * 2, "utf_16_le"),
-    "build_length" / Int32ul,
-    "build_id" / PaddedString(this.build_length * 2, "utf_16_le"),
-    "server_length" / Int32ul,
-    "server_ip" / PaddedString(this.server_length * 2, "utf_16_le"),
-)
-
-STRUCT_ACTION_CREATE_CARD = Struct(
-    "action_id" / Const(b"\x0B\x00"),
-    "timestamp" / Int64ul,
-    "card" / STRUCT_UNIT,
-)
-
-STRUCT_ACTION_DEAL_DAMAGE = Struct(
-    "action_id" / Const(b"\x1D\x00"),
-    "timestamp" / Int64ul,
-    "target" / GuidAdapter(STRUCT_GUID),
-    "source" / GuidAdapter(STRUCT_GUID),
-    "damage" / Int32ul
-)
-
-STRUCT_ACTION_DEATH = Struct(
-    "action_id" / Const(b"\x1B\x00"),
-    "timestamp" / Int64ul,
-    "target" / GuidAdapter(STRUCT_GUID)
-)
-
-STRUCT_ACTION_EMOTE = Struct(
-    "action_id" / Const(b"\x19\x00"),
-    "timestamp" / Int64ul,
-    "player_id_length" / Int32ul,
-    "player_id" / PaddedString(this.player_id_length * 2, "utf_16_le"),
-    "emote_name_length" / Int32ul,
-    "emote_name" / PaddedString(this.emote_name_length * 2, "utf_16_le")
-)
-
-STRUCT_ACTION_ENTER_BRAWL_PHASE = Struct(
-    "action_id" / Const(b"\x1A\x00"),
-    "timestamp" / Int64ul,
-    Padding(1),
-    "player_1_health" / Int32ul,
-    Padding(20),
-    "player_1_id_length" / Int32ul,
-    "player_1_id" / PaddedString(this.player_1_id_length * 2, "utf_16_le"),
-    "player_1_name_length" / Int32ul,
-    "player_1_name" / PaddedString(this.player_1_name_length * 2, "utf_16_le"),
-    Padding(1),
-    "player_1_card_id" / GuidAdapter(STRUCT_GUID),
-    "player_1_card_template_id" / Int32ul,
-    Padding(1),
-    "player_2_health" / Int32ul,
-    Padding(20),
-    "player_2_id_length" / Int32ul,
-    "player_2_id" / PaddedString(this.player_2_id_length * 2, "utf_16_le"),
-    "player_2_name_length" / Int32ul,
-    "player_2_name" / PaddedString(this.player_2_name_length * 2, "utf_16_le"),
-    Padding(1),
-    "player_2_card_id" / GuidAdapter(STRUCT_GUID),
-    "player_2_card_template_id" / Int32ul,
-    "player_1_id_length_again" / Int32ul,
-    "player_1_id_again" / PaddedString(this.player_1_id_length_again * 2, "utf_16_le"),
-    "player_2_id_length_again" / Int32ul,
-    "player_2_id_again" / PaddedString(this.player_2_id_length_again * 2, "utf_16_le"),
-)
-
-STRUCT_ACTION_ENTER_INTRO_PHASE = Struct(
-    "action_id" / Const(b"\x11\x00"),
-    "timestamp" / Int64ul
-)
-
-STRUCT_ACTION_ENTER_RESULTS_PHASE = Struct(
-    "action_id" / Const(b"\x13\x00"),
-    "timestamp" / Int64ul,
-    "health" / Int32ul,
-    "gold" / Int32ul,
-    "experience" / Int32ul,
-    "next_level_xp" / Int32ul,
-    "level" / Int32ul,
-    "place" / Int32ul,
-    "player_id_length" / Int32ul,
-    "player_id" / PaddedString(this.player_id_length * 2, "utf_16_le"),
-    "player_name_length" / Int32ul,
-    "player_name" / PaddedString(this.player_name_length * 2, "utf_16_le"),
-    Padding(1),
-    "player_hero_id" / GuidAdapter(STRUCT_GUID),
-    "player_card_template_id" / Int32ul,
-    "placement" / Int32ul,
-    "dust_reward" / Int32ul,
-    "rank_reward" / Int32sl,
-    "crown_reward" / Int32ul,
-    "first_win_dust_reward" / Int32ul,
-    "unknown" / Int32ul,
-    "characters" / PrefixedArray(Int32ul, ListUnitAdapter(STRUCT_LIST_UNIT)),
-    "treasures" / PrefixedArray(Int32ul, ListUnitAdapter(STRUCT_LIST_UNIT)),
-)
-
-STRUCT_ACTION_ENTER_SHOP_PHASE = Struct(
-    "action_id" / Const(b"\x12\x00"),
-    "timestamp" / Int64ul,
-    "health" / Int32ul,
-    Padding(20),
-    "player_id_length" / Int32ul,
-    "player_id" / PaddedString(this.player_id_length * 2, "utf_16_le"),
-    "player_name_length" / Int32ul,
-    "player_name" / PaddedString(this.player_name_length * 2, "utf_16_le"),
-    Padding(1),
-    "player_card_id" / GuidAdapter(STRUCT_GUID),
-    "player_card_template_id" / Int32ul,
-    "opponent_id_length" / Int32ul,
-    "opponent_id" / PaddedString(this.opponent_id_length * 2, "utf_16_le"),
-    "round" / Int32ul,
-    "gold" / Int32ul
-)
-
-STRUCT_ACTION_MODIFY_GOLD = Struct(
-    "action_id" / Const(b"\x05\x00"),
-    "timestamp" / Int64ul,
-    "player_id_length" / Int32ul,
-    "player_id" / PaddedString(this.player_id_length * 2, "utf_16_le"),
-    "amount" / Int32sl,
-)
-
-STRUCT_ACTION_MODIFY_LEVEL = Struct(
-    "action_id" / Const(b"\x08\x00"),
-    "timestamp" / Int64ul,
-    "player_id_length" / Int32ul,
-    "player_id" / PaddedString(this.player_id_length * 2, "utf_16_le"),
-    "amount" / Int32sl
-)
-
-STRUCT_ACTION_MODIFY_NEXT_LEVEL_XP = Struct(
-    "action_id" / Const(b"\x07\x00"),
-    "timestamp" / Int64ul,
-    "player_id_length" / Int32ul,
-    "player_id" / PaddedString(this.player_id_length * 2, "utf_16_le"),
-    "new_value" / Int32sl
-)
-
-STRUCT_ACTION_MODIFY_XP = Struct(
-    "action_id" / Const(b"\x06\x00"),
-    "timestamp" / Int64ul,
-    "player_id_length" / Int32ul,
-    "player_id" / PaddedString(this.player_id_length * 2, "utf_16_le"),
-    "amount" / Int32sl
-)
-
-STRUCT_ACTION_MOVE_CARD = Struct(
-    "action_id" / Const(b"\x0D\x00"),
-    "timestamp" / Int64ul,
-    "card_id" / GuidAdapter(STRUCT_GUID),
-    "target_zone" / ZONE,
-    "target_index" / Int32ul
-)
-
-STRUCT_ACTION_PLAY_FX = Struct(
-    "action_id" / Const(b"\x17\x00"),
-    "timestamp" / Int64ul,
-    "source" / GuidAdapter(STRUCT_GUID),
-    "content_id_length" / Int32ul,
-    "content_id" / PaddedString(this.content_id_length * 2, "utf_16_le"),
-    Padding(1),
-    "targets" / PrefixedArray(Int32ul, GuidAdapter(STRUCT_GUID))  # TODO: Check longer array?
-)
-
-STRUCT_ACTION_PRESENT_DISCOVER = Struct(
-    "action_id" / Const(b"\x03\x00"),
-    "timestamp" / Int64ul,
-    "choice_text_length" / Int32ul,
-    "choice_text" / PaddedString(this.choice_text_length * 2, "utf_16_le"),
-    "level" / Int32ul,  # TODO: This is a very speculative guess
-    "treasures" / PrefixedArray(Int32ul, ListUnitAdapter(STRUCT_LIST_UNIT)),
-)
-
-STRUCT_PRICE = Struct(
-    "action_id" / Padding(1),
-    "currency_name_length" / Int32ul,
-    "currency_name" / PaddedString(this.currency_name_length * 2, "utf_16_le"),
-    "price" / Int32ul
-)
-
-STRUCT_HERO = Struct(
-    "unknown" / Int8ub,
-    "card" / STRUCT_UNIT,
-    Padding(1),
-    "prices" / PrefixedArray(Int32ul, STRUCT_PRICE),
-)
-
-STRUCT_ACTION_PRESENT_HERO_DISCOVER = Struct(
-    "action_id" / Const(b"\x04\x00"),
-    "timestamp" / Int64ul,
-    "choice_text_length" / Int32ul,
-    "choice_text" / PaddedString(this.choice_text_length * 2, "utf_16_le"),
-    "heroes" / PrefixedArray(Int32ul, STRUCT_HERO),
-)
-
-STRUCT_ACTION_REMOVE_CARD = Struct(
-    "action_id" / Const(b"\x0C\x00"),
-    "timestamp" / Int64ul,
-    "card_id" / GuidAdapter(STRUCT_GUID)
-)
-
-STRUCT_ACTION_ROLL = Struct(
-    "action_id" / Const(b"\x0A\x00"),
-    "timestamp" / Int64ul
-)
-
-STRUCT_ACTION_UPDATE_CARD = Struct(
-    "action_id" / Const(b"\x15\x00"),
-    "timestamp" / Int64ul,
-    "card" / STRUCT_UNIT,
-)
-
-STRUCT_EMOTE = Struct(
-    "emote_name_length" / Int32ul,
-    "emote_name" / PaddedString(this.emote_name_length * 2, "utf_16_le")
-)
-
-STRUCT_ACTION_UPDATE_EMOTES = Struct(
-    "action_id" / Const(b"\x09\x00"),
-    "timestamp" / Int64ul,
-    "player_id_length" / Int32ul,
-    "player_id" / PaddedString(this.player_id_length * 2, "utf_16_le"),
-    "emotes" / PrefixedArray(Int32ul, STRUCT_EMOTE)
-)
-
-STRUCT_ACTION_UPDATE_TURN_TIMER = Struct(
-    "action_id" / Const(b"\x18\x00"),
-    "timestamp" / Int64ul,
-    "seconds_remaining" / Int32ul,
-    "is_enabled" / Flag,
-    "timer" / Float32l,
-
-)
-
-STRUCT_ACTION = Select(
-    STRUCT_ACTION_ATTACK,
-    STRUCT_ACTION_ADD_PLAYER,
-    STRUCT_ACTION_BRAWL_COMPLETE,
-    STRUCT_ACTION_CAST_SPELL,
-    STRUCT_ACTION_CONNECTION_INFO,
-    STRUCT_ACTION_CREATE_CARD,
-    STRUCT_ACTION_DEAL_DAMAGE,
-    STRUCT_ACTION_DEATH,
-    STRUCT_ACTION_EMOTE,
-    STRUCT_ACTION_ENTER_BRAWL_PHASE,
-    STRUCT_ACTION_ENTER_INTRO_PHASE,
-    STRUCT_ACTION_ENTER_RESULTS_PHASE,
-    STRUCT_ACTION_ENTER_SHOP_PHASE,
-    STRUCT_ACTION_MODIFY_GOLD,
-    STRUCT_ACTION_MODIFY_LEVEL,
-    STRUCT_ACTION_MODIFY_NEXT_LEVEL_XP,
-    STRUCT_ACTION_MODIFY_XP,
-    STRUCT_ACTION_MOVE_CARD,
-    STRUCT_ACTION_PLAY_FX,
-    STRUCT_ACTION_PRESENT_DISCOVER,
-    STRUCT_ACTION_PRESENT_HERO_DISCOVER,
-    STRUCT_ACTION_REMOVE_CARD,
-    STRUCT_ACTION_ROLL,
-    STRUCT_ACTION_UPDATE_CARD,
-    STRUCT_ACTION_UPDATE_EMOTES,
-    STRUCT_ACTION_UPDATE_TURN_TIMER
-)
+            return [None, obj]
+
+
+class CompilableSelect(Select):
+    """Select that can also be compiled (construct's own Select is always linked into compiled parsers as is)."""
+
+    def _emitparse(self, code):
+        fname = "parse_select_{}".format(code.allocateId())
+        block = """
+            def {}(io, this):
+                fallback = io.tell()
+        """.format(fname)
+        for subcon in self.subcons:
+            block += """
+                try:
+                    return {}
+                except ExplicitError:
+                    raise
+                except Exception:
+                    io.seek(fallback)
+            """.format(subcon._compileparse(code))
+        block += """
+                raise SelectError("no subconstruct matched")
+        """
+        code.append(block)
+        return "{}(io, this)".format(fname)
+
+
+class DeferredField:
+    """
+    The raw memoryview slice of a field that has not been decoded yet, with the context parameters of the parse that
+    deferred it (GUID decoder, string pool) to decode it the same way. See LazyField.
+    """
+    __slots__ = ["view", "decoder", "params"]
+
+    def __init__(self, view, decoder, params):
+        self.view = view
+        self.decoder = decoder
+        self.params = params
+
+    def decode(self):
+        return self.decoder(self.view, **self.params)
+
+    def __eq__(self, other):
+        if isinstance(other, DeferredField):
+            other = other.decode()
+        return self.decode() == other
+
+    def __repr__(self):
+        return "DeferredField({!r})".format(self.decode())
+
+
+class LazyField(Subconstruct):
+    """
+    Parses subcon as usual, except when the stream is parsed with a `view` context parameter (a memoryview over the
+    same buffer, see ActionDecoder). In that case the field is only measured and skipped, and a DeferredField holding
+    its memoryview slice is returned in its place, to be decoded by LazyContainer on first access.
+
+    The slice is decoded with decoder(view, **params), params being the context parameters of the parse other than
+    view; by default, with subcon.parse.
+    """
+
+    def __init__(self, subcon, measure, decoder=None):
+        super().__init__(subcon)
+        self.measure = measure
+        self.decoder = decoder if decoder is not None else subcon.parse
+
+    def _parse(self, stream, context, path):
+        view = context._params.get("view")
+        if view is None:
+            return self.subcon._parsereport(stream, context, path)
+        start = stream_tell(stream, path)
+        length = self.measure(view, start, context)
+        if start + length > len(view):
+            raise StreamError("stream read less than specified amount, expected {}".format(length), path=path)
+        stream_seek(stream, start + length, 0, path)
+        params = {name: value for name, value in context._params.items() if name != "view"}
+        return DeferredField(view[start:start + length], self.decoder, params)
+
+    def _emitparse(self, code):
+        # Compiled parsers always decode eagerly
+        return self.subcon._compileparse(code)
+
+
+class LazyContainer(Container):
+    """Container that decodes DeferredField values, and replaces them with the result, the first time they are read."""
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        if isinstance(value, DeferredField):
+            value = value.decode()
+            self[key] = value
+        return value
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+
+class LazyContainerAdapter(Adapter):
+    """Turns the parsed Container into a LazyContainer when parsing with a `view` context parameter."""
+
+    def _decode(self, obj, context, path):
+        if context._params.get("view") is None:
+            return obj
+        return LazyContainer(obj)
+
+    def _emitparse(self, code):
+        return self.subcon._compileparse(code)
+
+    def _encode(self, obj, context, path):
+        return obj
+
+
+def _decode_utf16(raw) -> str:
+    try:
+        return bytes(raw).decode("utf_16_le").rstrip("\x00")
+    except UnicodeDecodeError:
+        raise StringError("cannot use encoding 'utf_16_le' to decode {!r}".format(bytes(raw)))
+
+
+class StringPool:
+    """
+    Maps raw UTF-16LE byte strings to already-decoded, interned str objects, so player ids, names and the like that
+    repeat throughout a record are only decoded once. A pool can be shared between readers to deduplicate strings
+    across records.
+    """
+
+    def __init__(self):
+        self.strings = {}
+
+    def __len__(self):
+        return len(self.strings)
+
+    def decode(self, raw: bytes) -> str:
+        try:
+            return self.strings[raw]
+        except KeyError:
+            string = self.strings[raw] = sys.intern(_decode_utf16(raw))
+            return string
+
+
+class Utf16String(Subconstruct):
+    """
+    PaddedString(length, "utf_16_le") that decodes through the `string_pool` context parameter (a StringPool) when one
+    is given.
+    """
+
+    def __init__(self, length):
+        super().__init__(PaddedString(length, "utf_16_le"))
+        self.length = length
+
+    def _parse(self, stream, context, path):
+        return _read_utf16_string(stream, evaluate(self.length, context), context, path)
+
+    def _emitparse(self, code):
+        code.append("from record_parser import _read_utf16_string")
+        return "_read_utf16_string(io, {!r}, this)".format(self.length)
+
+
+def _read_utf16_string(stream, length: int, context, path="(compiled)") -> str:
+    raw = stream_read(stream, length, path)
+    string_pool = context._params.get("string_pool")
+    if string_pool is None:
+        return _decode_utf16(raw)
+    return string_pool.decode(raw)
+
+
+def _decode_deferred_utf16(view, string_pool: Optional[StringPool] = None, **params) -> str:
+    if string_pool is None:
+        return _decode_utf16(view)
+    return string_pool.decode(bytes(view))
+
+
+def LazyUtf16String(length):
+    """A Utf16String of the given byte length that can be left undecoded, see LazyField."""
+    return LazyField(Utf16String(length), lambda view, offset, context: evaluate(length, context),
+                     _decode_deferred_utf16)
+
 
 id_to_action_name = {b'\x01\x00': 'ActionConnectionInfo',
                      b'\x02\x00': 'ActionAddPlayer',
@@ -439,3 +341,607 @@ id_to_action_name = {b'\x01\x00': 'ActionConnectionInfo',
                      b'\x1d\x00': 'ActionDealDamage',
                      b'!\x00': 'ActionBrawlComplete'}
 
+_SCHEMA_NAMES = {"action_name_to_struct", "id_to_action_struct"}
+
+
+def _schema():
+    import record_schema
+    return record_schema
+
+
+def __getattr__(name):
+    # The STRUCT_* definitions live in record_schema, which is only imported the first time one of them is used
+    if name.startswith("STRUCT_") or name in _SCHEMA_NAMES:
+        return getattr(_schema(), name)
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
+class ActionDispatch(Construct):
+    """
+    Parses a single action by peeking at its 2-byte action id and invoking the one struct registered for it, rather
+    than trying every action struct in turn like a Select would.
+    """
+
+    def __init__(self, id_to_struct):
+        super().__init__()
+        self.id_to_struct = id_to_struct
+        self.flagbuildnone = False
+
+    def _parse(self, stream, context, path):
+        fallback = stream_tell(stream, path)
+        action_id = stream_read(stream, 2, path)
+        stream_seek(stream, fallback, 0, path)
+        try:
+            subcon = self.id_to_struct[action_id]
+        except KeyError:
+            raise MappingError("unknown action id {!r}".format(action_id), path=path)
+        return subcon._parsereport(stream, context, path)
+
+    def _build(self, obj, stream, context, path):
+        try:
+            subcon = self.id_to_struct[obj["action_id"]]
+        except KeyError:
+            raise MappingError("cannot build action without a known action_id", path=path)
+        return subcon._build(obj, stream, context, path)
+
+    def _sizeof(self, context, path):
+        raise SizeofError("actions are variable-length", path=path)
+
+
+def _fixed_size(con) -> Optional[int]:
+    try:
+        return con.sizeof()
+    except (SizeofError, KeyError, AttributeError, TypeError):
+        return None
+
+
+def _compile_skipper(con):
+    """
+    Compiles con into a function (buffer, offset, context) -> offset that steps over one instance of it without
+    building any containers: fixed-size members are skipped by their size, and only the integers that later lengths
+    and counts depend on are actually unpacked.
+    """
+    if isinstance(con, Renamed):
+        inner = con.subcon.subcon if isinstance(con.subcon, Rebuild) else con.subcon
+        if isinstance(inner, FormatField):
+            name = con.name
+            field = struct.Struct(inner.fmtstr)
+            size = field.size
+
+            def skip_named_field(buffer, offset, context):
+                context[name] = field.unpack_from(buffer, offset)[0]
+                return offset + size
+            return skip_named_field
+        return _compile_skipper(con.subcon)
+    if isinstance(con, Const):
+        value = con.value
+        size = len(value)
+
+        def skip_const(buffer, offset, context):
+            if buffer[offset:offset + size] != value:
+                raise ConstError("expected {!r}".format(value))
+            return offset + size
+        return skip_const
+    size = _fixed_size(con)
+    if size is not None:
+        return lambda buffer, offset, context: offset + size
+    if isinstance(con, (Struct, Sequence, FocusedSeq)):
+        skippers = [_compile_skipper(subcon) for subcon in con.subcons]
+
+        def skip_struct(buffer, offset, context):
+            context = {"_": context}
+            for skipper in skippers:
+                offset = skipper(buffer, offset, context)
+            return offset
+        return skip_struct
+    if isinstance(con, Select):
+        skippers = [_compile_skipper(subcon) for subcon in con.subcons]
+
+        def skip_select(buffer, offset, context):
+            for skipper in skippers:
+                try:
+                    return skipper(buffer, offset, context)
+                except (ConstructError, struct.error):
+                    pass
+            raise SelectError("no subconstruct matched")
+        return skip_select
+    if isinstance(con, Array):
+        count = con.count
+        element_size = _fixed_size(con.subcon)
+        if element_size is not None:
+            return lambda buffer, offset, context: offset + evaluate(count, context) * element_size
+        skipper = _compile_skipper(con.subcon)
+
+        def skip_array(buffer, offset, context):
+            for _ in range(evaluate(count, context)):
+                offset = skipper(buffer, offset, context)
+            return offset
+        return skip_array
+    if isinstance(con, FixedSized):
+        length = con.length
+        return lambda buffer, offset, context: offset + evaluate(length, context)
+    if isinstance(con, Subconstruct):
+        return _compile_skipper(con.subcon)
+    raise SizeofError("cannot skip over {!r} without parsing it".format(con))
+
+
+class _SkipperTable(dict):
+    """Maps action ids to skippers, compiling each one the first time it is needed."""
+
+    def __missing__(self, action_id):
+        skipper = self[action_id] = _compile_skipper(_schema().id_to_action_struct[action_id])
+        return skipper
+
+
+action_skippers = _SkipperTable()
+
+
+# The types of the actions decoded by fast_action_codecs, defined once here so that they can be pickled
+ActionRoll = namedtuple("ActionRoll", ["action_id", "timestamp"])
+ActionRemoveCard = namedtuple("ActionRemoveCard", ["action_id", "timestamp", "card_id"])
+ActionMoveCard = namedtuple("ActionMoveCard", ["action_id", "timestamp", "card_id", "target_zone", "target_index"])
+ActionCastSpell = namedtuple("ActionCastSpell", ["action_id", "timestamp", "card_id", "target"])
+ActionEnterIntroPhase = namedtuple("ActionEnterIntroPhase", ["action_id", "timestamp"])
+ActionUpdateTurnTimer = namedtuple("ActionUpdateTurnTimer",
+                                   ["action_id", "timestamp", "seconds_remaining", "is_enabled", "timer"])
+ActionDeath = namedtuple("ActionDeath", ["action_id", "timestamp", "target"])
+ActionAttack = namedtuple("ActionAttack", ["action_id", "timestamp", "attacker", "defender"])
+ActionDealDamage = namedtuple("ActionDealDamage", ["action_id", "timestamp", "target", "source", "damage"])
+
+
+class FastActionCodec:
+    """
+    Decodes a fixed-size action straight from a buffer offset with a precomputed struct.Struct format, producing a
+    lightweight record_type namedtuple instead of a construct Container. The matching STRUCT_ACTION_* definition
+    remains the reference spec; the two must agree field for field.
+    """
+
+    def __init__(self, record_type, fmt: str, guid_fields=(), converters=None):
+        self.action_name = record_type.__name__
+        self.record_type = record_type
+        self.struct = struct.Struct(fmt)
+        self.size = self.struct.size
+        if converters is None:
+            converters = {}
+        self.guid_indices = [record_type._fields.index(field) for field in guid_fields]
+        self.conversions = [(record_type._fields.index(field), converter) for field, converter in converters.items()]
+
+    def unpack_from(self, buffer, offset: int = 0, decode_guid=guid_bytes_to_hex):
+        try:
+            values = self.struct.unpack_from(buffer, offset)
+        except struct.error:
+            raise StreamError("stream read less than specified amount, expected {}".format(self.size))
+        if self.guid_indices or self.conversions:
+            values = list(values)
+            for index in self.guid_indices:
+                values[index] = decode_guid(values[index])
+            for index, converter in self.conversions:
+                values[index] = converter(values[index])
+        return self.record_type._make(values)
+
+
+def _decode_zone(value):
+    return ZONE._decode(value, None, None)
+
+
+fast_action_codecs = {
+    b'\x0a\x00': FastActionCodec(ActionRoll, "<2sQ"),
+    b'\x0c\x00': FastActionCodec(ActionRemoveCard, "<2sQ16s", ["card_id"]),
+    b'\x0d\x00': FastActionCodec(ActionMoveCard, "<2sQ16sBI", ["card_id"], {"target_zone": _decode_zone}),
+    b'\x0e\x00': FastActionCodec(ActionCastSpell, "<2sQ16s16s", ["card_id", "target"]),
+    b'\x11\x00': FastActionCodec(ActionEnterIntroPhase, "<2sQ"),
+    b'\x18\x00': FastActionCodec(ActionUpdateTurnTimer, "<2sQI?f"),
+    b'\x1b\x00': FastActionCodec(ActionDeath, "<2sQ16s", ["target"]),
+    b'\x1c\x00': FastActionCodec(ActionAttack, "<2sQ16s16sx", ["attacker", "defender"]),
+    b'\x1d\x00': FastActionCodec(ActionDealDamage, "<2sQ16s16sI", ["target", "source"]),
+}
+
+
+class ActionDecoder:
+    """
+    Decodes actions out of an in-memory record buffer (bytes or an mmap). Fixed-size actions go through
+    fast_action_codecs, everything else through STRUCT_ACTION. With lazy=True, the LazyField members (art_id,
+    frame_override, server_ip, valid_targets) are left as memoryview slices of the buffer until they are accessed.
+
+    GUIDs are decoded in the guid_format representation ("hex", "bytes" or "int", see GUID_FORMATTERS) and interned,
+    so each distinct GUID in the record is a single object. Strings are decoded through string_pool, a fresh
+    StringPool unless one is passed in to share between records.
+
+    With compiled=True, actions are parsed with the generated code from compiled_schema instead of the interpreted
+    STRUCT_ACTION. Compiled parsers always decode eagerly, so this cannot be combined with lazy.
+    """
+
+    def __init__(self, buffer, lazy: bool = False, guid_format: str = "hex", string_pool: Optional[StringPool] = None,
+                 compiled: bool = False):
+        if lazy and compiled:
+            raise ValueError("compiled parsers do not support lazy decoding")
+        self.buffer = buffer
+        if isinstance(buffer, mmap.mmap):
+            self.stream = buffer
+        else:
+            self.stream = io.BytesIO(buffer)
+        self.view = memoryview(buffer) if lazy else None
+        self.decode_guid = make_guid_decoder(guid_format)
+        if compiled:
+            from compiled_schema import compiled_action_struct
+            self.action_struct = compiled_action_struct()
+        else:
+            self.action_struct = _schema().STRUCT_ACTION
+        self.string_pool = string_pool if string_pool is not None else StringPool()
+
+    def refill(self, buffer):
+        """Decodes from buffer from now on, keeping the interned GUIDs and strings. Not for lazy decoders."""
+        if self.view is not None:
+            raise ValueError("lazy decoders cannot change buffers")
+        # Parsed containers can keep the old stream alive in reference cycles, closing it frees its buffer right away
+        self.stream.close()
+        self.buffer = buffer
+        self.stream = io.BytesIO(buffer)
+
+    def skip(self, offset: int) -> int:
+        """Returns the offset just past the action starting at offset, without decoding it."""
+        action_id = bytes(self.buffer[offset:offset + 2])
+        codec = fast_action_codecs.get(action_id)
+        if codec is not None:
+            end = offset + codec.size
+        else:
+            try:
+                skipper = action_skippers[action_id]
+            except KeyError:
+                raise MappingError("unknown action id {!r}".format(action_id))
+            try:
+                end = skipper(self.buffer, offset, {})
+            except (struct.error, IndexError):
+                end = len(self.buffer) + 1
+        if end > len(self.buffer):
+            raise StreamError("action at offset {} runs past the end of the record".format(offset))
+        return end
+
+    def decode(self, offset: int):
+        """Decodes the action starting at offset, returning it along with the offset just past its end."""
+        codec = fast_action_codecs.get(bytes(self.buffer[offset:offset + 2]))
+        if codec is not None:
+            return codec.unpack_from(self.buffer, offset, self.decode_guid), offset + codec.size
+        self.stream.seek(offset)
+        action = self.action_struct.parse_stream(self.stream, view=self.view, guid_decoder=self.decode_guid,
+                                                 string_pool=self.string_pool)
+        return action, self.stream.tell()
+
+    def close(self):
+        if self.view is not None:
+            self.view.release()
+        if isinstance(self.buffer, mmap.mmap):
+            try:
+                self.buffer.close()
+            except BufferError:
+                # Deferred fields still reference the mapping; it is unmapped once the last of them is released.
+                pass
+
+
+# Every action starts with its 2-byte id followed by this. Non-zero timestamps count up by one per action.
+STRUCT_ACTION_TIMESTAMP = struct.Struct("<Q")
+# How much of a record iter_actions reads at a time, without use_mmap
+READ_CHUNK_SIZE = 1 << 20
+# Actions are at most a few kilobytes; one that fails to parse with this much of the record after it is not incomplete
+MAX_ACTION_SIZE = 1 << 16
+# How far past the last timestamp seen a resynchronization point may be, i.e. how many actions may be lost at once
+MAX_RESYNC_TIMESTAMP_GAP = 1 << 16
+
+
+class RecoveryReport:
+    """
+    Diagnostics of a recovering parse (see iter_actions): the byte ranges that were skipped, each with the reason the
+    action starting there could not be decoded, and how often each unknown action id was encountered.
+    """
+
+    def __init__(self):
+        self.skipped_ranges: List[Tuple[int, int, str]] = []
+        self.unknown_opcodes: Dict[int, int] = {}
+
+    def __bool__(self):
+        return bool(self.skipped_ranges)
+
+    def __repr__(self):
+        return "RecoveryReport(skipped_ranges={!r}, unknown_opcodes={!r})".format(self.skipped_ranges,
+                                                                                   self.unknown_opcodes)
+
+    @property
+    def skipped_bytes(self) -> int:
+        return sum(end - start for start, end, _ in self.skipped_ranges)
+
+    def add_skip(self, start: int, end: int, reason: str, opcode: Optional[int] = None):
+        self.skipped_ranges.append((start, end, reason))
+        if opcode is not None:
+            self.unknown_opcodes[opcode] = self.unknown_opcodes.get(opcode, 0) + 1
+
+
+class TimingStats:
+    """How many times something happened, how many bytes it covered and how long it took in total."""
+
+    def __init__(self, count: int = 0, size: int = 0, seconds: float = 0.0):
+        self.count = count
+        self.bytes = size
+        self.seconds = seconds
+
+    def __repr__(self):
+        return "TimingStats(count={}, bytes={}, seconds={:.6f})".format(self.count, self.bytes, self.seconds)
+
+    def __eq__(self, other):
+        if not isinstance(other, TimingStats):
+            return NotImplemented
+        return (self.count, self.bytes, self.seconds) == (other.count, other.bytes, other.seconds)
+
+    def add(self, count: int, size: int, seconds: float):
+        self.count += count
+        self.bytes += size
+        self.seconds += seconds
+
+
+class DecodeStats:
+    """
+    Hot-path metrics of a parse (see iter_actions): the count, bytes and cumulative decode time of every action type,
+    and named timers for everything else, like run_history_reader's time in Unit.from_unit_struct and per phase of
+    extract_game_from_record_file. Stats of several records can be merged into one, e.g. for a whole batch.
+    """
+
+    def __init__(self):
+        self.actions: Dict[str, TimingStats] = {}
+        self.timers: Dict[str, TimingStats] = {}
+        self.records = 0
+
+    def __repr__(self):
+        return "DecodeStats(records={}, actions={}, decode_seconds={:.6f})".format(self.records, self.action_count,
+                                                                                 self.decode_seconds)
+
+    @property
+    def action_count(self) -> int:
+        return sum(stats.count for stats in self.actions.values())
+
+    @property
+    def decoded_bytes(self) -> int:
+        return sum(stats.bytes for stats in self.actions.values())
+
+    @property
+    def decode_seconds(self) -> float:
+        return sum(stats.seconds for stats in self.actions.values())
+
+    def add_action(self, action_name: str, size: int, seconds: float):
+        stats = self.actions.get(action_name)
+        if stats is None:
+            stats = self.actions[action_name] = TimingStats()
+        stats.add(1, size, seconds)
+
+    def add_time(self, name: str, seconds: float, count: int = 1):
+        stats = self.timers.get(name)
+        if stats is None:
+            stats = self.timers[name] = TimingStats()
+        stats.add(count, 0, seconds)
+
+    @contextlib.contextmanager
+    def timer(self, name: str):
+        """Adds the time spent in the with block to the timer called name."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def timed(self, name: str, func):
+        """func, wrapped to add the time of every call to the timer called name."""
+        def timed_func(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add_time(name, time.perf_counter() - start)
+        return timed_func
+
+    def merge(self, other: "DecodeStats") -> "DecodeStats":
+        """Adds other's stats to these, returning self."""
+        for mine, theirs in ((self.actions, other.actions), (self.timers, other.timers)):
+            for name, stats in theirs.items():
+                mine.setdefault(name, TimingStats()).add(stats.count, stats.bytes, stats.seconds)
+        self.records += other.records
+        return self
+
+    @classmethod
+    def aggregate(cls, stats: Iterable["DecodeStats"]) -> "DecodeStats":
+        total = cls()
+        for record_stats in stats:
+            total.merge(record_stats)
+        return total
+
+    def as_dict(self) -> dict:
+        return {"records": self.records,
+                "actions": {name: vars(stats).copy() for name, stats in sorted(self.actions.items())},
+                "timers": {name: vars(stats).copy() for name, stats in sorted(self.timers.items())}}
+
+    def format(self) -> str:
+        """A table of the action types by decode time, followed by the timers."""
+        lines = ["{:<28} {:>10} {:>12} {:>10} {:>7} {:>9}".format("action", "count", "bytes", "seconds", "time%",
+                                                                   "us/action")]
+        total = self.decode_seconds or 1.0
+        for name, stats in sorted(self.actions.items(), key=lambda item: item[1].seconds, reverse=True):
+            lines.append("{:<28} {:>10} {:>12} {:>10.4f} {:>6.1f}% {:>9.2f}".format(
+                name, stats.count, stats.bytes, stats.seconds, 100 * stats.seconds / total,
+                1e6 * stats.seconds / stats.count))
+        lines.append("{:<28} {:>10} {:>12} {:>10.4f}".format("total", self.action_count, self.decoded_bytes,
+                                                            self.decode_seconds))
+        lines.append("")
+        lines.append("{:<28} {:>10} {:>12} {:>10}".format("timer", "count", "", "seconds"))
+        for name, stats in sorted(self.timers.items()):
+            lines.append("{:<28} {:>10} {:>12} {:>10.4f}".format(name, stats.count, "", stats.seconds))
+        return "\n".join(lines)
+
+
+def _is_resync_point(decoder: "ActionDecoder", offset: int, last_timestamp: int) -> bool:
+    buffer = decoder.buffer
+    if bytes(buffer[offset:offset + 2]) not in id_to_action_name:
+        return False
+    if offset + 2 + STRUCT_ACTION_TIMESTAMP.size > len(buffer):
+        return False
+    timestamp = STRUCT_ACTION_TIMESTAMP.unpack_from(buffer, offset + 2)[0]
+    if not last_timestamp < timestamp <= last_timestamp + MAX_RESYNC_TIMESTAMP_GAP:
+        return False
+    try:
+        end = decoder.skip(offset)
+    except ConstructError:
+        return False
+    return end == len(buffer) or bytes(buffer[end:end + 2]) in id_to_action_name
+
+
+def find_resync_offset(decoder: "ActionDecoder", start: int, last_timestamp: int) -> Optional[int]:
+    """
+    The first offset after start at which a plausible action begins: a known action id, a timestamp shortly after
+    last_timestamp, a body that can be skipped over, and either the end of the record or another known action id
+    right after it. None if there is no such offset.
+    """
+    buffer = decoder.buffer
+    for offset in range(start + 1, len(buffer) - 1):
+        # All action ids are below 256
+        if buffer[offset + 1] == 0 and _is_resync_point(decoder, offset, last_timestamp):
+            return offset
+    return None
+
+
+def iter_actions(path_or_file: Union[str, os.PathLike, BinaryIO], use_mmap: bool = False,
+                 action_names: Optional[Iterable[str]] = None, guid_format: str = "hex",
+                 string_pool: Optional[StringPool] = None, report: Optional[RecoveryReport] = None,
+                 compiled: bool = False, stats: Optional[DecodeStats] = None,
+                 chunk_size: int = READ_CHUNK_SIZE) -> Iterator[Tuple[int, object]]:
+    """
+    Yields (byte offset, action) pairs one at a time, stopping at the end of the record or at the first action that
+    fails to parse. When given a file object, it is left positioned at the first byte that was not decoded, so f.read()
+    returns whatever could not be parsed.
+
+    If a RecoveryReport is given, an action that fails to parse (an unknown action id, say) does not end the record:
+    the bytes up to the next plausible action (see find_resync_offset) are skipped, recorded in the report, and
+    parsing carries on from there. The file is then always left at the end of the record.
+
+    The file is read chunk_size bytes at a time, the undecoded end of a chunk being carried over to the next, so memory
+    use stays around one chunk whatever the size of the record. With use_mmap=True the file is memory-mapped instead,
+    and actions are decoded lazily from the mapping (see ActionDecoder), or eagerly if compiled is set.
+
+    If action_names is given, only actions of those types are decoded and yielded; all others are skipped over by
+    length alone.
+
+    guid_format selects how GUIDs are represented, string_pool can be shared between calls to deduplicate strings
+    across records, and compiled switches to the generated parsers, see ActionDecoder.
+
+    If a DecodeStats is given, the count, size and decode time of every decoded action are added to it, along with the
+    time spent reading the record under the "read" timer.
+    """
+    if isinstance(path_or_file, (str, os.PathLike)):
+        with open(path_or_file, 'rb') as f:
+            yield from iter_actions(f, use_mmap, action_names, guid_format, string_pool, report, compiled, stats,
+                                    chunk_size)
+        return
+    if action_names is not None:
+        wanted_ids = {action_id for action_id, action_name in id_to_action_name.items() if action_name in action_names}
+    f = path_or_file
+    start = f.tell()
+    read_start = time.perf_counter()
+    if use_mmap and os.fstat(f.fileno()).st_size > 0:
+        # Compiled parsers cannot defer fields, they decode the mapping eagerly
+        decoder = ActionDecoder(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), lazy=not compiled,
+                                guid_format=guid_format, string_pool=string_pool, compiled=compiled)
+        base = 0
+        end_of_file = True
+    else:
+        decoder = ActionDecoder(f.read(chunk_size), guid_format=guid_format, string_pool=string_pool,
+                                compiled=compiled)
+        base = start
+        end_of_file = False
+    if stats is not None:
+        stats.records += 1
+        stats.add_time("read", time.perf_counter() - read_start)
+    offset = start - base
+    last_timestamp = 0
+    try:
+        while True:
+            if offset >= len(decoder.buffer):
+                if end_of_file:
+                    break
+                base, offset, end_of_file = _read_next_chunk(f, decoder, base, offset, chunk_size, stats)
+                continue
+            action = None
+            try:
+                if action_names is not None and bytes(decoder.buffer[offset:offset + 2]) not in wanted_ids:
+                    end = decoder.skip(offset)
+                elif stats is not None:
+                    decode_start = time.perf_counter()
+                    action, end = decoder.decode(offset)
+                    stats.add_action(id_to_action_name[bytes(decoder.buffer[offset:offset + 2])], end - offset,
+                                     time.perf_counter() - decode_start)
+                else:
+                    action, end = decoder.decode(offset)
+            except ConstructError as e:
+                if not end_of_file and len(decoder.buffer) - offset < max(chunk_size, MAX_ACTION_SIZE):
+                    # Most likely an action cut by the end of the chunk: try again with the next chunk
+                    base, offset, end_of_file = _read_next_chunk(f, decoder, base, offset, chunk_size, stats)
+                    continue
+                if report is None:
+                    break
+                resync_offset = skip_undecodable(decoder, base, offset, last_timestamp, e, report,
+                                                 complete=end_of_file)
+                if resync_offset is None:
+                    base, offset, end_of_file = _read_next_chunk(f, decoder, base, offset, chunk_size, stats)
+                else:
+                    offset = resync_offset
+                continue
+            if report is not None:
+                timestamp = STRUCT_ACTION_TIMESTAMP.unpack_from(decoder.buffer, offset + 2)[0]
+                last_timestamp = timestamp or last_timestamp
+            action_offset, offset = offset, end
+            if action is not None:
+                yield base + action_offset, action
+    finally:
+        decoder.close()
+        f.seek(base + offset)
+
+
+def _read_next_chunk(f: BinaryIO, decoder: ActionDecoder, base: int, offset: int, chunk_size: int,
+                     stats: Optional[DecodeStats]) -> Tuple[int, int, bool]:
+    """
+    Appends the next chunk of f to the undecoded end of the decoder's buffer, from offset on. Returns the file offset
+    of the new buffer, the offset in it to carry on from, and whether f has been read to the end.
+    """
+    read_start = time.perf_counter()
+    chunk = f.read(chunk_size)
+    if stats is not None:
+        stats.add_time("read", time.perf_counter() - read_start)
+    if not chunk:
+        return base, offset, True
+    decoder.refill(bytes(decoder.buffer[offset:]) + chunk)
+    return base + offset, 0, False
+
+
+def skip_undecodable(decoder: ActionDecoder, base: int, offset: int, last_timestamp: int, error: ConstructError,
+                     report: RecoveryReport, complete: bool = True) -> Optional[int]:
+    """
+    Records the bytes from offset to the next resynchronization point as skipped (at their position in the file, the
+    buffer starting at base), and returns that point. If there is none, the rest of the buffer is skipped when it
+    holds the complete record; otherwise nothing is recorded and None is returned, as the point may not be written yet.
+    """
+    action_id = bytes(decoder.buffer[offset:offset + 2])
+    opcode = None
+    if len(action_id) == 2 and action_id not in id_to_action_name:
+        opcode = int.from_bytes(action_id, "little")
+        reason = "unknown action id {:#06x}".format(opcode)
+    else:
+        reason = "{}: {}".format(type(error).__name__, str(error).strip().splitlines()[-1] if str(error) else "")
+    end = find_resync_offset(decoder, offset, last_timestamp)
+    if end is None:
+        if not complete:
+            return None
+        end = len(decoder.buffer)
+    report.add_skip(base + offset, base + end, reason, opcode)
+    return end
+
+
+def parse_actions(f: BinaryIO):
+    """
+    Drop-in replacement for GreedyRange(STRUCT_ACTION).parse_stream(f): decodes actions until one fails to parse and
+    leaves f positioned at the first byte that could not be decoded.
+    """
+    return [action for _, action in iter_actions(f)]
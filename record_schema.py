@@ -0,0 +1,376 @@
+"""
+The construct definitions of every record action. Built the first time they are needed rather than when record_parser
+is imported; record_parser re-exports all of these names.
+"""
+import struct
+
+from construct import Bytes, Const, Flag, Float32l, Int8ub, Int16ul, Int32sl, Int32ul, Int64ul, Padding, PrefixedArray, \
+    Sequence, Struct, this
+
+from record_parser import KEYWORD, SUBTYPE, ZONE, ActionDispatch, CompilableSelect, GuidAdapter, LazyContainerAdapter, \
+    LazyField, LazyUtf16String, ListUnitAdapter, Utf16String, id_to_action_name
+
+STRUCT_GUID = Struct(
+    "field_1" / Int32ul,
+    "field_2" / Int16ul,
+    "field_3" / Int16ul,
+    "field_4" / Int64ul
+)
+
+
+def _measure_optional_list_guid(view, offset, context):
+    if view[offset] == 1:
+        return 1
+    count = struct.unpack_from("<I", view, offset + 1)[0]
+    return 5 + 16 * count
+
+
+STRUCT_OPTIONAL_LIST_GUID = CompilableSelect(Const(b"\x01"),
+                                             Sequence(Const(b"\x00"), PrefixedArray(Int32ul, GuidAdapter(Bytes(16)))))
+
+STRUCT_UNIT = LazyContainerAdapter(Struct(
+    "card_id" / GuidAdapter(Bytes(16)),
+    "template_id" / Int32ul,
+    Padding(1),
+    "is_locked" / Flag,
+    "is_targeted" / Flag,  # Some of these still aren't tested
+    "is_golden" / Flag,
+    "is_movable" / Flag,
+    "makes_pair" / Flag,
+    "makes_triple" / Flag,
+    "zone" / ZONE,
+    "slot" / Int32sl,
+    "cost" / Int32ul,
+    "attack" / Int32ul,
+    "health" / Int32ul,
+    "counter" / Int32sl,
+    "damage" / Int32sl,
+    Padding(1),
+    "subtypes" / PrefixedArray(Int32ul, SUBTYPE),
+    Padding(1),
+    "keywords" / PrefixedArray(Int32ul, KEYWORD),
+    "valid_targets" / LazyField(ListUnitAdapter(STRUCT_OPTIONAL_LIST_GUID), _measure_optional_list_guid),
+    "card_id_again" / GuidAdapter(Bytes(16)),
+    "art_id_length" / Int32ul,
+    "art_id" / LazyUtf16String(this.art_id_length * 2),
+    "player_id_length" / Int32ul,
+    "player_id" / Utf16String(this.player_id_length * 2),
+    "frame_override_length" / Int32ul,
+    "frame_override" / LazyUtf16String(this.frame_override_length * 2),
+))
+
+STRUCT_LIST_UNIT = CompilableSelect(Const(b"\x01"), Sequence(Const(b"\x00"), STRUCT_UNIT))
+
+STRUCT_ACTION_ADD_PLAYER = Struct(
+    "action_id" / Const(b"\x02\x00"),
+    "timestamp" / Int64ul,
+    "health" / Int32ul,
+    "gold" / Int32ul,
+    "experience" / Int32ul,
+    "next_level_xp" / Int32ul,
+    "level" / Int32ul,
+    "place" / Int32ul,
+    "player_id_length" / Int32ul,
+    "player_id" / Utf16String(this.player_id_length * 2),
+    "player_name_length" / Int32ul,
+    "player_name" / Utf16String(this.player_name_length * 2),
+    Padding(1),
+    "card_id" / GuidAdapter(Bytes(16)),
+    "template_id" / Int32ul
+)
+
+STRUCT_ACTION_ATTACK = Struct(
+    "action_id" / Const(b"\x1C\x00"),
+    "timestamp" / Int64ul,
+    "attacker" / GuidAdapter(Bytes(16)),
+    "defender" / GuidAdapter(Bytes(16)),
+    Padding(1)
+)
+
+STRUCT_ACTION_BRAWL_COMPLETE = Struct(
+    "action_id" / Const(b"\x21\x00"),
+    "timestamp" / Int64ul,
+    "unknown_1" / Int8ub,  # Always 0? Padding byte?
+    "round" / Int32ul,  # This is a guess
+    "id_1_length" / Int32ul,
+    "player_id_1" / Utf16String(this.id_1_length * 2),
+    "id_2_length" / Int32ul,
+    "player_id_2" / Utf16String(this.id_2_length * 2),
+)
+
+STRUCT_ACTION_CAST_SPELL = Struct(
+    "action_id" / Const(b"\x0E\x00"),
+    "timestamp" / Int64ul,
+    "card_id" / GuidAdapter(Bytes(16)),
+    "target" / GuidAdapter(Bytes(16))
+)
+
+STRUCT_ACTION_CONNECTION_INFO = LazyContainerAdapter(Struct(
+    "action_id" / Const(b"\x01\x00"),
+    "timestamp" / Int64ul,
+    "session_length" / Int32ul,
+    "session_id" / Utf16String(this.session_length * 2),
+    "build_length" / Int32ul,
+    "build_id" / Utf16String(this.build_length * 2),
+    "server_length" / Int32ul,
+    "server_ip" / LazyUtf16String(this.server_length * 2),
+))
+
+STRUCT_ACTION_CREATE_CARD = Struct(
+    "action_id" / Const(b"\x0B\x00"),
+    "timestamp" / Int64ul,
+    "card" / STRUCT_UNIT,
+)
+
+STRUCT_ACTION_DEAL_DAMAGE = Struct(
+    "action_id" / Const(b"\x1D\x00"),
+    "timestamp" / Int64ul,
+    "target" / GuidAdapter(Bytes(16)),
+    "source" / GuidAdapter(Bytes(16)),
+    "damage" / Int32ul
+)
+
+STRUCT_ACTION_DEATH = Struct(
+    "action_id" / Const(b"\x1B\x00"),
+    "timestamp" / Int64ul,
+    "target" / GuidAdapter(Bytes(16))
+)
+
+STRUCT_ACTION_EMOTE = Struct(
+    "action_id" / Const(b"\x19\x00"),
+    "timestamp" / Int64ul,
+    "player_id_length" / Int32ul,
+    "player_id" / Utf16String(this.player_id_length * 2),
+    "emote_name_length" / Int32ul,
+    "emote_name" / Utf16String(this.emote_name_length * 2)
+)
+
+STRUCT_ACTION_ENTER_BRAWL_PHASE = Struct(
+    "action_id" / Const(b"\x1A\x00"),
+    "timestamp" / Int64ul,
+    Padding(1),
+    "player_1_health" / Int32ul,
+    Padding(20),
+    "player_1_id_length" / Int32ul,
+    "player_1_id" / Utf16String(this.player_1_id_length * 2),
+    "player_1_name_length" / Int32ul,
+    "player_1_name" / Utf16String(this.player_1_name_length * 2),
+    Padding(1),
+    "player_1_card_id" / GuidAdapter(Bytes(16)),
+    "player_1_card_template_id" / Int32ul,
+    Padding(1),
+    "player_2_health" / Int32ul,
+    Padding(20),
+    "player_2_id_length" / Int32ul,
+    "player_2_id" / Utf16String(this.player_2_id_length * 2),
+    "player_2_name_length" / Int32ul,
+    "player_2_name" / Utf16String(this.player_2_name_length * 2),
+    Padding(1),
+    "player_2_card_id" / GuidAdapter(Bytes(16)),
+    "player_2_card_template_id" / Int32ul,
+    "player_1_id_length_again" / Int32ul,
+    "player_1_id_again" / Utf16String(this.player_1_id_length_again * 2),
+    "player_2_id_length_again" / Int32ul,
+    "player_2_id_again" / Utf16String(this.player_2_id_length_again * 2),
+)
+
+STRUCT_ACTION_ENTER_INTRO_PHASE = Struct(
+    "action_id" / Const(b"\x11\x00"),
+    "timestamp" / Int64ul
+)
+
+STRUCT_ACTION_ENTER_RESULTS_PHASE = Struct(
+    "action_id" / Const(b"\x13\x00"),
+    "timestamp" / Int64ul,
+    "health" / Int32ul,
+    "gold" / Int32ul,
+    "experience" / Int32ul,
+    "next_level_xp" / Int32ul,
+    "level" / Int32ul,
+    "place" / Int32ul,
+    "player_id_length" / Int32ul,
+    "player_id" / Utf16String(this.player_id_length * 2),
+    "player_name_length" / Int32ul,
+    "player_name" / Utf16String(this.player_name_length * 2),
+    Padding(1),
+    "player_hero_id" / GuidAdapter(Bytes(16)),
+    "player_card_template_id" / Int32ul,
+    "placement" / Int32ul,
+    "dust_reward" / Int32ul,
+    "rank_reward" / Int32sl,
+    "crown_reward" / Int32ul,
+    "first_win_dust_reward" / Int32ul,
+    "unknown" / Int32ul,
+    "characters" / PrefixedArray(Int32ul, ListUnitAdapter(STRUCT_LIST_UNIT)),
+    "treasures" / PrefixedArray(Int32ul, ListUnitAdapter(STRUCT_LIST_UNIT)),
+)
+
+STRUCT_ACTION_ENTER_SHOP_PHASE = Struct(
+    "action_id" / Const(b"\x12\x00"),
+    "timestamp" / Int64ul,
+    "health" / Int32ul,
+    Padding(20),
+    "player_id_length" / Int32ul,
+    "player_id" / Utf16String(this.player_id_length * 2),
+    "player_name_length" / Int32ul,
+    "player_name" / Utf16String(this.player_name_length * 2),
+    Padding(1),
+    "player_card_id" / GuidAdapter(Bytes(16)),
+    "player_card_template_id" / Int32ul,
+    "opponent_id_length" / Int32ul,
+    "opponent_id" / Utf16String(this.opponent_id_length * 2),
+    "round" / Int32ul,
+    "gold" / Int32ul
+)
+
+STRUCT_ACTION_MODIFY_GOLD = Struct(
+    "action_id" / Const(b"\x05\x00"),
+    "timestamp" / Int64ul,
+    "player_id_length" / Int32ul,
+    "player_id" / Utf16String(this.player_id_length * 2),
+    "amount" / Int32sl,
+)
+
+STRUCT_ACTION_MODIFY_LEVEL = Struct(
+    "action_id" / Const(b"\x08\x00"),
+    "timestamp" / Int64ul,
+    "player_id_length" / Int32ul,
+    "player_id" / Utf16String(this.player_id_length * 2),
+    "amount" / Int32sl
+)
+
+STRUCT_ACTION_MODIFY_NEXT_LEVEL_XP = Struct(
+    "action_id" / Const(b"\x07\x00"),
+    "timestamp" / Int64ul,
+    "player_id_length" / Int32ul,
+    "player_id" / Utf16String(this.player_id_length * 2),
+    "new_value" / Int32sl
+)
+
+STRUCT_ACTION_MODIFY_XP = Struct(
+    "action_id" / Const(b"\x06\x00"),
+    "timestamp" / Int64ul,
+    "player_id_length" / Int32ul,
+    "player_id" / Utf16String(this.player_id_length * 2),
+    "amount" / Int32sl
+)
+
+STRUCT_ACTION_MOVE_CARD = Struct(
+    "action_id" / Const(b"\x0D\x00"),
+    "timestamp" / Int64ul,
+    "card_id" / GuidAdapter(Bytes(16)),
+    "target_zone" / ZONE,
+    "target_index" / Int32ul
+)
+
+STRUCT_ACTION_PLAY_FX = Struct(
+    "action_id" / Const(b"\x17\x00"),
+    "timestamp" / Int64ul,
+    "source" / GuidAdapter(Bytes(16)),
+    "content_id_length" / Int32ul,
+    "content_id" / Utf16String(this.content_id_length * 2),
+    Padding(1),
+    "targets" / PrefixedArray(Int32ul, GuidAdapter(Bytes(16)))  # TODO: Check longer array?
+)
+
+STRUCT_ACTION_PRESENT_DISCOVER = Struct(
+    "action_id" / Const(b"\x03\x00"),
+    "timestamp" / Int64ul,
+    "choice_text_length" / Int32ul,
+    "choice_text" / Utf16String(this.choice_text_length * 2),
+    "level" / Int32ul,  # TODO: This is a very speculative guess
+    "treasures" / PrefixedArray(Int32ul, ListUnitAdapter(STRUCT_LIST_UNIT)),
+)
+
+STRUCT_PRICE = Struct(
+    "action_id" / Padding(1),
+    "currency_name_length" / Int32ul,
+    "currency_name" / Utf16String(this.currency_name_length * 2),
+    "price" / Int32ul
+)
+
+STRUCT_HERO = Struct(
+    "unknown" / Int8ub,
+    "card" / STRUCT_UNIT,
+    Padding(1),
+    "prices" / PrefixedArray(Int32ul, STRUCT_PRICE),
+)
+
+STRUCT_ACTION_PRESENT_HERO_DISCOVER = Struct(
+    "action_id" / Const(b"\x04\x00"),
+    "timestamp" / Int64ul,
+    "choice_text_length" / Int32ul,
+    "choice_text" / Utf16String(this.choice_text_length * 2),
+    "heroes" / PrefixedArray(Int32ul, STRUCT_HERO),
+)
+
+STRUCT_ACTION_REMOVE_CARD = Struct(
+    "action_id" / Const(b"\x0C\x00"),
+    "timestamp" / Int64ul,
+    "card_id" / GuidAdapter(Bytes(16))
+)
+
+STRUCT_ACTION_ROLL = Struct(
+    "action_id" / Const(b"\x0A\x00"),
+    "timestamp" / Int64ul
+)
+
+STRUCT_ACTION_UPDATE_CARD = Struct(
+    "action_id" / Const(b"\x15\x00"),
+    "timestamp" / Int64ul,
+    "card" / STRUCT_UNIT,
+)
+
+STRUCT_EMOTE = Struct(
+    "emote_name_length" / Int32ul,
+    "emote_name" / Utf16String(this.emote_name_length * 2)
+)
+
+STRUCT_ACTION_UPDATE_EMOTES = Struct(
+    "action_id" / Const(b"\x09\x00"),
+    "timestamp" / Int64ul,
+    "player_id_length" / Int32ul,
+    "player_id" / Utf16String(this.player_id_length * 2),
+    "emotes" / PrefixedArray(Int32ul, STRUCT_EMOTE)
+)
+
+STRUCT_ACTION_UPDATE_TURN_TIMER = Struct(
+    "action_id" / Const(b"\x18\x00"),
+    "timestamp" / Int64ul,
+    "seconds_remaining" / Int32ul,
+    "is_enabled" / Flag,
+    "timer" / Float32l,
+
+)
+
+action_name_to_struct = {'ActionConnectionInfo': STRUCT_ACTION_CONNECTION_INFO,
+                         'ActionAddPlayer': STRUCT_ACTION_ADD_PLAYER,
+                         'ActionPresentDiscover': STRUCT_ACTION_PRESENT_DISCOVER,
+                         'ActionPresentHeroDiscover': STRUCT_ACTION_PRESENT_HERO_DISCOVER,
+                         'ActionModifyGold': STRUCT_ACTION_MODIFY_GOLD,
+                         'ActionModifyXP': STRUCT_ACTION_MODIFY_XP,
+                         'ActionModifyNextLevelXP': STRUCT_ACTION_MODIFY_NEXT_LEVEL_XP,
+                         'ActionModifyLevel': STRUCT_ACTION_MODIFY_LEVEL,
+                         'ActionUpdateEmotes': STRUCT_ACTION_UPDATE_EMOTES,
+                         'ActionRoll': STRUCT_ACTION_ROLL,
+                         'ActionCreateCard': STRUCT_ACTION_CREATE_CARD,
+                         'ActionRemoveCard': STRUCT_ACTION_REMOVE_CARD,
+                         'ActionMoveCard': STRUCT_ACTION_MOVE_CARD,
+                         'ActionCastSpell': STRUCT_ACTION_CAST_SPELL,
+                         'ActionEnterIntroPhase': STRUCT_ACTION_ENTER_INTRO_PHASE,
+                         'ActionEnterShopPhase': STRUCT_ACTION_ENTER_SHOP_PHASE,
+                         'ActionEnterResultsPhase': STRUCT_ACTION_ENTER_RESULTS_PHASE,
+                         'ActionUpdateCard': STRUCT_ACTION_UPDATE_CARD,
+                         'ActionPlayFX': STRUCT_ACTION_PLAY_FX,
+                         'ActionUpdateTurnTimer': STRUCT_ACTION_UPDATE_TURN_TIMER,
+                         'ActionEmote': STRUCT_ACTION_EMOTE,
+                         'ActionEnterBrawlPhase': STRUCT_ACTION_ENTER_BRAWL_PHASE,
+                         'ActionDeath': STRUCT_ACTION_DEATH,
+                         'ActionAttack': STRUCT_ACTION_ATTACK,
+                         'ActionDealDamage': STRUCT_ACTION_DEAL_DAMAGE,
+                         'ActionBrawlComplete': STRUCT_ACTION_BRAWL_COMPLETE}
+
+id_to_action_struct = {action_id: action_name_to_struct[action_name]
+                       for action_id, action_name in id_to_action_name.items()}
+
+STRUCT_ACTION = ActionDispatch(id_to_action_struct)
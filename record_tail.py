@@ -0,0 +1,98 @@
+import os
+import time
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from construct import ConstructError
+
+from record_parser import (MAX_ACTION_SIZE, STRUCT_ACTION_TIMESTAMP, ActionDecoder, RecoveryReport, StringPool,
+                           id_to_action_name, skip_undecodable)
+
+
+class RecordTail:
+    """
+    Follows a record file while the game is still writing it. Each poll reads only the bytes appended since the last
+    one and decodes the actions they complete; a partially written action at the end of the file is kept buffered
+    until the rest of it arrives, rather than being treated as the end of the record.
+
+    `offset` is the byte offset just past the last fully decoded action, and `pending` holds the bytes after it that
+    do not form a complete action yet. If the file shrinks (the game started a new record under the same name), the
+    tail starts over from the beginning.
+
+    An action that fails to decode is waited for while it could still run past the end of the file: a cut action
+    does not always fail with a StreamError (one cut inside a Select fails with a SelectError). Only an unknown
+    action id, or a failure more than MAX_ACTION_SIZE bytes before the end of the file, is skipped over up to the next
+    plausible action, as in a recovering iter_actions, and recorded in `report`.
+    """
+
+    def __init__(self, path, guid_format: str = "hex", string_pool: Optional[StringPool] = None,
+                 report: Optional[RecoveryReport] = None):
+        self.path = os.fspath(path)
+        self.guid_format = guid_format
+        self.string_pool = string_pool if string_pool is not None else StringPool()
+        self.report = report if report is not None else RecoveryReport()
+        self.offset = 0
+        self.pending = b""
+        self.action_count = 0
+        self.last_timestamp = 0
+
+    @property
+    def read_position(self) -> int:
+        return self.offset + len(self.pending)
+
+    def reset(self):
+        self.offset = 0
+        self.pending = b""
+        self.action_count = 0
+        self.last_timestamp = 0
+
+    def poll(self) -> List[Tuple[int, object]]:
+        """Returns (byte offset, action) for every action completed since the last poll, possibly none."""
+        try:
+            with open(self.path, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                if size < self.read_position:
+                    self.reset()
+                if size == self.read_position:
+                    return []
+                f.seek(self.read_position)
+                new_bytes = f.read(size - self.read_position)
+        except FileNotFoundError:
+            return []
+        buffer = self.pending + new_bytes
+        decoder = ActionDecoder(buffer, guid_format=self.guid_format, string_pool=self.string_pool)
+        actions = []
+        position = 0
+        while position < len(buffer):
+            try:
+                action, end = decoder.decode(position)
+            except ConstructError as e:
+                if buffer[position:position + 2] in id_to_action_name and len(buffer) - position < MAX_ACTION_SIZE:
+                    # Possibly an action the game has not finished writing; try again once more bytes arrive.
+                    break
+                end = skip_undecodable(decoder, self.offset, position, self.last_timestamp, e, self.report,
+                                       complete=False)
+                if end is None:
+                    # The next action after the corrupt bytes is not complete yet
+                    break
+                position = end
+                continue
+            actions.append((self.offset + position, action))
+            self.last_timestamp = STRUCT_ACTION_TIMESTAMP.unpack_from(buffer, position + 2)[0] or self.last_timestamp
+            position = end
+        decoder.close()
+        self.offset += position
+        self.pending = buffer[position:]
+        self.action_count += len(actions)
+        return actions
+
+    def follow(self, interval: float = 0.5, stop: Optional[Callable[[], bool]] = None) \
+            -> Iterator[Tuple[int, object]]:
+        """
+        Polls every `interval` seconds, yielding each new action as it is completed, until stop() returns True
+        (forever if stop is None).
+        """
+        while True:
+            yield from self.poll()
+            if stop is not None and stop():
+                return
+            time.sleep(interval)
@@ -5,67 +5,166 @@ import datetime
 import os
 import pathlib
 import pprint
-import json
-from typing import List
-
-from construct import GreedyRange
-
-from record_parser import STRUCT_ACTION, id_to_action_name, parse_preamble
-
+import sys
+import time
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+from action_handlers import ActionHandler, run_handlers
+from board_replay import BoardReplay, BoardSnapshot
+from record_parser import KEYWORD, SUBTYPE, DecodeStats, RecoveryReport, id_to_action_name, parse_preamble
+from template_db import default_template_db
+
+
+def __getattr__(name):
+    # template-ids.json is no longer loaded at import; the old dict is still available, built on first access and
+    # kept as a module attribute from then on, so that later lookups do not come back here
+    if name == "template_id_dict":
+        template_id_dict = globals()["template_id_dict"] = default_template_db().as_dict()
+        return template_id_dict
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
+# Bump whenever a parser or reconstruction change alters the extracted Game objects, so that games cached by
+# game_cache.GameCache get re-extracted
+PARSER_VERSION = 3
+
+
+class EnumBitset:
+    """Codes sets of values of a construct Enum as ints, bit n standing for value n."""
+
+    def __init__(self, enum):
+        self.names_by_value = {value: str(name) for value, name in enum.decmapping.items()}
+        self.values_by_name = {name: value for value, name in self.names_by_value.items()}
+        self._names = {}
+
+    def mask(self, values) -> int:
+        """
+        The bitset of values: decoded enum values, or names, or unknown values (which decode as ints) as ints or digit
+        strings.
+        """
+        mask = 0
+        for value in values:
+            if hasattr(value, "intvalue"):
+                value = value.intvalue
+            elif isinstance(value, str):
+                value = int(value) if value.isdigit() else self.values_by_name[value]
+            mask |= 1 << value
+        return mask
+
+    def names(self, mask: int) -> Tuple[str, ...]:
+        """The names of the values in mask, in value order. Unknown values are named by their number."""
+        try:
+            return self._names[mask]
+        except KeyError:
+            names = self._names[mask] = tuple(self.names_by_value.get(value, str(value))
+                                              for value in range(mask.bit_length()) if mask >> value & 1)
+            return names
+
+
+SUBTYPE_BITS = EnumBitset(SUBTYPE)
+KEYWORD_BITS = EnumBitset(KEYWORD)
+
+
+class _Slotted:
+    """
+    Base of the model classes, which use __slots__ to keep the many thousands of them held by analyses small. They
+    pickle as a tuple of their slot values, and games pickled before they had slots (as __dict__ states) still load,
+    through _upgrade_state.
+    """
+    __slots__ = ()
+
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        if isinstance(state, dict):
+            state = self._upgrade_state(state)
+            for name in self.__slots__:
+                setattr(self, name, state.get(name))
+        else:
+            for name, value in zip(self.__slots__, state):
+                setattr(self, name, value)
 
-# Copied from SBB Tracker's template ID mapping
-# (https://github.com/SBBTracker/SBBTracker/blob/main/assets/template-ids.json)
-template_id_dict = json.load(open("template-ids.json", 'r'))
+    @classmethod
+    def _upgrade_state(cls, state: dict) -> dict:
+        return state
 
 
-class Unit:
+class Unit(_Slotted):
+    """
+    Subtypes and keywords are stored as bitsets of their enum values (see EnumBitset). The subtypes and keywords
+    properties list their names in value order, without the duplicates records sometimes have.
+    """
+    __slots__ = ("health", "attack", "name", "zone", "subtype_mask", "keyword_mask")
 
     def __init__(self, health, attack, name, zone, keywords=None, subtypes=None):
         self.health = health
         self.attack = attack
         self.name = name
-        self.zone = zone
-        if keywords is None:
-            self.keywords = []
-        else:
-            self.keywords = keywords
-        if subtypes is None:
-            self.subtypes = []
-        else:
-            self.subtypes = subtypes
+        self.zone = None if zone is None else sys.intern(str(zone))
+        self.keyword_mask = 0 if keywords is None else KEYWORD_BITS.mask(keywords)
+        self.subtype_mask = 0 if subtypes is None else SUBTYPE_BITS.mask(subtypes)
 
     def __repr__(self):
         return "{} ({}/{})".format(self.name, self.attack, self.health)
 
+    @property
+    def keywords(self) -> List[str]:
+        return list(KEYWORD_BITS.names(self.keyword_mask))
+
+    @keywords.setter
+    def keywords(self, keywords):
+        self.keyword_mask = KEYWORD_BITS.mask(keywords)
+
+    @property
+    def subtypes(self) -> List[str]:
+        return list(SUBTYPE_BITS.names(self.subtype_mask))
+
+    @subtypes.setter
+    def subtypes(self, subtypes):
+        self.subtype_mask = SUBTYPE_BITS.mask(subtypes)
+
+    @classmethod
+    def _upgrade_state(cls, state: dict) -> dict:
+        state = dict(state)
+        state["zone"] = None if state.get("zone") is None else sys.intern(str(state["zone"]))
+        state["keyword_mask"] = KEYWORD_BITS.mask(state.pop("keywords", None) or [])
+        state["subtype_mask"] = SUBTYPE_BITS.mask(state.pop("subtypes", None) or [])
+        return state
+
     @classmethod
     def from_unit_struct(cls, unit_struct):
         if unit_struct is None:
             return None
-        health = unit_struct.health
-        attack = unit_struct.attack
-        if unit_struct.is_golden:
-            template_id = unit_struct.template_id - 1
-        else:
-            template_id = unit_struct.template_id
-        if str(template_id) in template_id_dict:
-            name = template_id_dict[str(template_id)]["Name"]
-        else:
-            name = "Unknown"
-        zone = unit_struct.zone
-        subtypes = [str(subtype) for subtype in unit_struct.subtypes]
-        keywords = [str(keyword) for keyword in unit_struct.keywords]
-        return cls(health, attack, name, zone, keywords, subtypes)
+        unit = cls.__new__(cls)
+        unit.health = unit_struct.health
+        unit.attack = unit_struct.attack
+        unit.name = default_template_db().unit_name(unit_struct.template_id, unit_struct.is_golden, "Unknown")
+        unit.zone = sys.intern(str(unit_struct.zone))
+        unit.subtype_mask = SUBTYPE_BITS.mask(unit_struct.subtypes)
+        unit.keyword_mask = KEYWORD_BITS.mask(unit_struct.keywords)
+        return unit
 
 
-class Board:
+class Board(_Slotted):
+    __slots__ = ("hero", "units", "treasures")
 
     def __init__(self, hero, units, treasures):
         self.hero = hero
         self.units = units
         self.treasures = treasures
 
+    @classmethod
+    def from_snapshot(cls, snapshot: BoardSnapshot, from_unit_struct=None):
+        from_unit_struct = from_unit_struct or Unit.from_unit_struct
+        hero = default_template_db().name(snapshot.hero.template_id, "Unknown") if snapshot.hero else "Unknown"
+        units = [from_unit_struct(card) for card in snapshot.characters]
+        treasures = [from_unit_struct(card) for card in snapshot.treasures]
+        return cls(hero, units, treasures)
+
 
-class Player:
+class Player(_Slotted):
+    __slots__ = ("hero", "health", "level", "experience", "name", "id", "place")
 
     def __init__(self, hero, health, level, experience, name, player_id, place):
         self.hero = hero
@@ -77,7 +176,8 @@ class Player:
         self.place = place
 
 
-class TreasureChoice:
+class TreasureChoice(_Slotted):
+    __slots__ = ("choices", "tier", "chosen")
 
     def __init__(self, choices, tier):
         self.choices = choices
@@ -88,7 +188,10 @@ class TreasureChoice:
         self.chosen = treasure
 
 
-class Game:
+class Game(_Slotted):
+    __slots__ = ("shops", "bought", "boards", "enemy_boards", "leaderboards", "spells", "turn", "mmr_change",
+                 "game_over", "final_results", "placement", "treasure_choices", "build_id", "final_board",
+                 "final_level", "recovery_report", "decode_stats")
 
     def __init__(self):
         self.shops = []
@@ -105,6 +208,15 @@ class Game:
         self.treasure_choices = []
         self.build_id = None
         self.final_board = None
+        self.final_level = 0
+        # Only set by extract_game_with_recovery and extract_game_with_stats
+        self.recovery_report = None
+        self.decode_stats = None
+
+    @classmethod
+    def _upgrade_state(cls, state: dict) -> dict:
+        defaults = Game()
+        return {name: state[name] if name in state else getattr(defaults, name) for name in cls.__slots__}
 
     def start_new_turn(self):
         self.turn += 1
@@ -125,48 +237,69 @@ class Game:
         self.enemy_boards.append(enemy_board)
 
 
-def extract_game_from_record_file(filename):
-    with open(filename, 'rb') as f:
-        # parse_preamble(f)
-        result = GreedyRange(STRUCT_ACTION).parse_stream(f)
-        remaining_binary_contents = f.read()
-    if len(remaining_binary_contents) != 0:
-        print("Could not parse entire record file successfully.")
-        # raise RuntimeError("Could not parse entire record file successfully.")
-    game = Game()
-    all_cards = {}
-    iterator = iter(result)
-    populate_treasure = False
-    for record in iterator:
-        action_name = id_to_action_name[record.action_id]
-        if action_name == "ActionConnectionInfo":
-            game.build_id = record.build_id
-        if action_name in ["ActionUpdateCard", "ActionCreateCard"]:
-            card = Unit.from_unit_struct(record.card)
-            all_cards[record.card.card_id] = card
-            if card.zone == "treasure" and action_name == "ActionCreateCard" and populate_treasure:
-                game.treasure_choices[-1].choose_treasure(card.name)
-                populate_treasure = False
-        if action_name in ["ActionEnterShopPhase", "ActionRoll"]:
-            if action_name == "ActionEnterShopPhase":
-                game.start_new_turn()
-            shop = []
-            record = next(iterator)
-            while (action_name := id_to_action_name[record.action_id]) in \
-                    ["ActionModifyXP", "ActionModifyLevel", "ActionModifyNextLevelXP", "ActionUpdateCard", "ActionRemoveCard", "ActionCreateCard", "ActionModifyGold", "ActionPlayFX", "ActionPresentDiscover", "ActionUpdateEmotes", "ActionAddPlayer"]:
+# Actions that can follow an ActionEnterShopPhase or ActionRoll while the shop is still being filled
+SHOP_ACTION_NAMES = frozenset(["ActionModifyXP", "ActionModifyLevel", "ActionModifyNextLevelXP", "ActionUpdateCard",
+                               "ActionRemoveCard", "ActionCreateCard", "ActionModifyGold", "ActionPlayFX",
+                               "ActionPresentDiscover", "ActionUpdateEmotes", "ActionAddPlayer"])
+
+
+class GameHandler(ActionHandler):
+    """Reconstructs the Game of the player who recorded the file, see extract_game_from_actions."""
+
+    def __init__(self, stats: Optional[DecodeStats] = None):
+        self.game = Game()
+        self.all_cards = {}
+        self.populate_treasure = False
+        # The shop being filled after an ActionEnterShopPhase or ActionRoll, None the rest of the time
+        self.shop = None
+        # Boards at every brawl, for game.boards and game.enemy_boards
+        self.replay = BoardReplay()
+        self.finished = False
+        self.from_unit_struct = Unit.from_unit_struct
+        if stats is not None:
+            self.from_unit_struct = stats.timed("Unit.from_unit_struct", self.from_unit_struct)
+
+    def handle(self, action_name: str, record):
+        if action_name in BoardReplay.action_names:
+            self.replay.handle(action_name, record)
+        if self.shop is not None:
+            if action_name in SHOP_ACTION_NAMES:
                 if action_name == "ActionCreateCard":
                     card_struct = record.card
-                    card = Unit.from_unit_struct(card_struct)
-                    all_cards[card_struct.card_id] = card
+                    card = self.from_unit_struct(card_struct)
+                    self.all_cards[card_struct.card_id] = card
                     if card_struct.zone == "shop":
-                        shop.append(card)
-                record = next(iterator)
-            if len(shop) == 0:
-                print("hmm")
-            game.add_shop(shop)
-            action_name = id_to_action_name[record.action_id]
+                        self.shop.append(card)
+                return
+            # The first action after the shop only goes through the turn actions below
+            self._add_shop()
+        else:
+            if action_name == "ActionConnectionInfo":
+                self.game.build_id = record.build_id
+            if action_name in ["ActionUpdateCard", "ActionCreateCard"]:
+                card = self.from_unit_struct(record.card)
+                self.all_cards[record.card.card_id] = card
+                if card.zone == "treasure" and action_name == "ActionCreateCard" and self.populate_treasure:
+                    self.game.treasure_choices[-1].choose_treasure(card.name)
+                    self.populate_treasure = False
+            if action_name in ["ActionEnterShopPhase", "ActionRoll"]:
+                if action_name == "ActionEnterShopPhase":
+                    self.game.start_new_turn()
+                self.shop = []
+                return
+        self._handle_turn_action(action_name, record)
+
+    def _add_shop(self):
+        if len(self.shop) == 0:
+            print("hmm")
+        self.game.add_shop(self.shop)
+        self.shop = None
+
+    def _handle_turn_action(self, action_name: str, record):
+        game = self.game
+        all_cards = self.all_cards
         if action_name == "ActionEnterBrawlPhase":
-            populate_treasure = False
+            self.populate_treasure = False
         if action_name == "ActionMoveCard":
             if all_cards[record.card_id].zone == "shop":
                 if record.target_zone == "character":
@@ -177,98 +310,206 @@ def extract_game_from_record_file(filename):
             game.cast_spell(all_cards[record.card_id])
         if action_name == "ActionPresentDiscover":
             if record.choice_text == "Choose a Treasure":
-                treasures = [Unit.from_unit_struct(treasure) for treasure in record.treasures]
+                treasures = [self.from_unit_struct(treasure) for treasure in record.treasures]
                 game.treasure_choices.append(TreasureChoice([treasure.name for treasure in treasures], record.treasures[0].cost))
-                populate_treasure = True
+                self.populate_treasure = True
         if action_name == "ActionEnterResultsPhase":
             game.mmr_change = record.rank_reward
             game.game_over = True
             game.final_level = record.level
             game.placement = record.placement
-            hero = template_id_dict[str(record.player_card_template_id)]["Name"]
+            hero = default_template_db().name(record.player_card_template_id, "Unknown")
             units = []
             treasures = []
             for character in record.characters:
                 if character is None:
                     continue
-                units.append(Unit.from_unit_struct(character))
+                units.append(self.from_unit_struct(character))
             for treasure in record.treasures:
                 if treasure is None:
                     continue
-                treasures.append(Unit.from_unit_struct(treasure))
+                treasures.append(self.from_unit_struct(treasure))
             board = Board(hero, units, treasures)
             game.final_board = board
         if action_name == "ActionAddPlayer":
-            player_hero = template_id_dict[str(record.template_id)]["Name"]
+            player_hero = default_template_db().name(record.template_id, "Unknown")
             player = Player(player_hero, record.health, record.level, record.experience, record.player_name, record.player_id, record.place)
             if game.game_over:
                 game.final_results.append(player)
             elif game.turn > 0:
                 game.leaderboards[-1].append(player)
-    return game
 
+    def result(self) -> Game:
+        if self.finished:
+            return self.game
+        self.finished = True
+        if self.shop is not None:
+            # The record ended while a shop was being filled
+            self._add_shop()
+        for snapshot in self.replay.result():
+            self.game.add_battle(Board.from_snapshot(snapshot.player, self.from_unit_struct),
+                                 Board.from_snapshot(snapshot.opponent, self.from_unit_struct))
+        return self.game
 
-def get_build_id_from_record_file(filename):
-    with open(filename, 'rb') as f:
-        result = GreedyRange(STRUCT_ACTION).parse_stream(f)
-        remaining_binary_contents = f.read()
-    if len(remaining_binary_contents) != 0:
-        print("Could not parse entire record file successfully.")
-        # raise RuntimeError("Could not parse entire record file successfully.")
-    player_id = None
-    player_name = None
-    build_id = None
-    for record in result:
-        if id_to_action_name[record.action_id] == "ActionAddPlayer" and player_id is None:
+
+class BuildIdHandler(ActionHandler):
+    """(player id, player name, build id) of one of my records, see get_build_id_from_record_file."""
+    action_names = frozenset(["ActionAddPlayer", "ActionConnectionInfo"])
+
+    def __init__(self):
+        self.player_id = None
+        self.player_name = None
+        self.build_id = None
+
+    def handle(self, action_name: str, record):
+        if action_name == "ActionAddPlayer" and self.player_id is None:
             if record.player_name not in ['ForgottenArbiter', 'Forgotten Arbiter', 'Quincunx']:
-                continue
-            player_id = record.player_id
-            player_name = record.player_name
-        if id_to_action_name[record.action_id] == "ActionConnectionInfo":
-            build_id = record.build_id
-    return player_id, player_name, build_id
-
-
-def extract_endgame_stats_from_record_file(filename):
-    with open(filename, 'rb') as f:
-        result = GreedyRange(STRUCT_ACTION).parse_stream(f)
-        remaining_binary_contents = f.read()
-    if len(remaining_binary_contents) != 0:
-        raise RuntimeError("Could not parse entire record file successfully.")
-    players = []
-    mmr_change = 0
-    game_over = False
-    board = []
-    treasures = []
-    for record in result:
-        action_name = id_to_action_name[record.action_id]
+                return
+            self.player_id = record.player_id
+            self.player_name = record.player_name
+        if action_name == "ActionConnectionInfo":
+            self.build_id = record.build_id
+
+    def result(self):
+        return self.player_id, self.player_name, self.build_id
+
+
+class EndgameStats(NamedTuple):
+    board: List[Unit]
+    treasures: List[str]
+    # (name, hero, place) of every player, by place
+    players: List[tuple]
+    mmr_change: int
+    game_over: bool
+
+
+class EndgameStatsHandler(ActionHandler):
+    """The final board, treasures and placements of a game, see extract_endgame_stats_from_record_file."""
+    action_names = frozenset(["ActionEnterResultsPhase", "ActionAddPlayer"])
+
+    def __init__(self):
+        self.players = []
+        self.mmr_change = 0
+        self.game_over = False
+        self.board = []
+        self.treasures = []
+        self.templates = default_template_db()
+
+    def handle(self, action_name: str, record):
+        templates = self.templates
         if action_name == "ActionEnterResultsPhase":
-            mmr_change = record.rank_reward
-            game_over = True
+            self.mmr_change = record.rank_reward
+            self.game_over = True
             for character in record.characters:
                 if character is None:
                     continue
-                if character.is_golden:
-                    board.append(Unit(character.health, character.attack, template_id_dict[str(character.template_id - 1)]["Name"]))
-                else:
-                    board.append(Unit(character.health, character.attack, template_id_dict[str(character.template_id)]["Name"]))
+                name = templates.unit_name(character.template_id, character.is_golden, "Unknown")
+                self.board.append(Unit(character.health, character.attack, name, character.zone))
             for treasure in record.treasures:
                 if treasure is None:
                     continue
-                treasures.append(template_id_dict[str(treasure.template_id)]["Name"])
+                self.treasures.append(templates.name(treasure.template_id, "Unknown"))
+
+        if self.game_over and action_name == "ActionAddPlayer":
+            player_hero = templates.name(record.template_id, "Unknown")
+            self.players.append((record.player_name, player_hero, record.place))
+
+    def result(self) -> EndgameStats:
+        return EndgameStats(self.board, self.treasures, sorted(self.players, key=lambda x: x[2]), self.mmr_change,
+                            self.game_over)
+
+
+def extract_game_from_record_file(filename, report: Optional[RecoveryReport] = None, compiled: bool = False,
+                                  stats: Optional[DecodeStats] = None):
+    """
+    If a DecodeStats is given, the time spent in each phase is added to its "read", "reconstruct" and "extract"
+    (total) timers, along with the decode times of the actions (see iter_actions) and the "Unit.from_unit_struct" time.
+    """
+    if stats is not None:
+        start = time.perf_counter()
+        read_seconds = stats.timers["read"].seconds if "read" in stats.timers else 0.0
+        decode_seconds = stats.decode_seconds
+    handler = GameHandler(stats)
+    # Card GUIDs are only used as all_cards keys here, so skip formatting them as hex
+    unparsed_bytes = run_handlers(filename, [handler], "bytes", report, compiled, stats)
+    game = handler.result()
+    if stats is not None:
+        seconds = time.perf_counter() - start
+        read_seconds = stats.timers["read"].seconds - read_seconds
+        decode_seconds = stats.decode_seconds - decode_seconds
+        stats.add_time("extract", seconds)
+        stats.add_time("reconstruct", seconds - read_seconds - decode_seconds)
+    if unparsed_bytes != 0:
+        print("Could not parse entire record file successfully.")
+        # raise RuntimeError("Could not parse entire record file successfully.")
+    return game
+
+
+def extract_game_with_recovery(filename):
+    """
+    Like extract_game_from_record_file, but skips over actions that cannot be parsed instead of stopping at the first
+    one. What was skipped is left in game.recovery_report.
+    """
+    report = RecoveryReport()
+    game = extract_game_from_record_file(filename, report)
+    game.recovery_report = report
+    return game
+
 
-        if game_over and action_name == "ActionAddPlayer":
-            player_hero = template_id_dict[str(record.template_id)]["Name"]
-            players.append((record.player_name, player_hero, record.place))
-    players.sort(key=lambda x: x[2])
+def extract_game_with_stats(filename, recover: bool = False):
+    """
+    Like extract_game_from_record_file (or extract_game_with_recovery if recover is set), with the DecodeStats of the
+    parse left in game.decode_stats.
+    """
+    stats = DecodeStats()
+    report = RecoveryReport() if recover else None
+    game = extract_game_from_record_file(filename, report, stats=stats)
+    if recover:
+        game.recovery_report = report
+    game.decode_stats = stats
+    return game
+
+
+def extract_game_from_actions(actions: Iterable, stats: Optional[DecodeStats] = None):
+    handler = GameHandler(stats)
+    for record in actions:
+        handler.handle(id_to_action_name[record.action_id], record)
+    return handler.result()
+
+
+def extract_all_from_record_file(filename, report: Optional[RecoveryReport] = None, compiled: bool = False) -> dict:
+    """
+    The game, build id and endgame stats of a record, as extract_game_from_record_file,
+    get_build_id_from_record_file and extract_endgame_stats_from_record_file would return them, in a single parse.
+    """
+    handlers = {"game": GameHandler(), "build_id": BuildIdHandler(), "endgame_stats": EndgameStatsHandler()}
+    if run_handlers(filename, handlers.values(), "bytes", report, compiled) != 0:
+        print("Could not parse entire record file successfully.")
+    return {name: handler.result() for name, handler in handlers.items()}
+
+
+def get_build_id_from_record_file(filename):
+    handler = BuildIdHandler()
+    if run_handlers(filename, [handler]) != 0:
+        print("Could not parse entire record file successfully.")
+        # raise RuntimeError("Could not parse entire record file successfully.")
+    return handler.result()
+
+
+def extract_endgame_stats_from_record_file(filename, report: Optional[RecoveryReport] = None) -> EndgameStats:
+    handler = EndgameStatsHandler()
+    if run_handlers(filename, [handler], report=report) != 0:
+        raise RuntimeError("Could not parse entire record file successfully.")
+    stats = handler.result()
     print("Final board: ")
-    pprint.pprint(board)
+    pprint.pprint(stats.board)
     print("Treasures: ")
-    pprint.pprint(treasures)
+    pprint.pprint(stats.treasures)
     print("Final placements: ")
-    pprint.pprint(players)
-    print("MMR gained: {}".format(mmr_change))
+    pprint.pprint(stats.players)
+    print("MMR gained: {}".format(stats.mmr_change))
     print("#################################")
+    return stats
 
 
 def shop_has_card_name(shop: List[Unit], card_name: str):
@@ -279,21 +520,23 @@ def shop_has_card_name(shop: List[Unit], card_name: str):
 
 
 if __name__ == "__main__":
-    save_dir = pathlib.Path(os.environ["APPDATA"]).parent.joinpath("LocalLow/Good Luck Games/Storybook Brawl")
-    filenames = save_dir.glob("record_*.txt")
-    sorted_by_recent = sorted(filenames, key=os.path.getctime, reverse=True)
-    most_recent_games = sorted_by_recent[:200]
+    from batch_ingest import default_save_dir, find_record_files, ingest_records
+    from game_cache import GameCache
+
+    # Restricted to my games from the current patch
+    most_recent_games = find_record_files(default_save_dir(), limit=200,
+                                          since=datetime.datetime.fromisoformat("2022-02-12"))
     has_tree = 0
     bought_tree = 0
     total_placement_has_tree = 0
     total_placement_bought_tree = 0
     total_placement_overall = 0
     games = []
-    for game in most_recent_games:
-        # Restricted to my games from the current patch
-        if datetime.datetime.fromtimestamp(os.path.getctime(game)) < datetime.datetime.fromisoformat("2022-02-12"):
-            break
-        games.append(extract_game_from_record_file(game))
+    for result in ingest_records(most_recent_games, cache=GameCache("game_cache")):
+        if result.ok:
+            games.append(result.value)
+        else:
+            print("Failed to parse {}:\n{}".format(result.path, result.error))
         # extract_endgame_stats_from_record_file(game)
         # time = datetime.datetime.fromtimestamp(os.path.getctime(game)).strftime('%Y-%m-%dT%H:%M:%S')
         # print(time, get_build_id_from_record_file(game))
@@ -0,0 +1,350 @@
+"""
+Generates synthetic record files for scale and load testing. Every action is built with the record_schema
+STRUCT_ACTION_* definitions, so the output is exactly what the parser expects, and the same seed always produces the
+same bytes.
+
+    python synthetic_records.py corpus_dir -n 1000 --turns 20 --players 8 --seed 1
+"""
+import argparse
+import os
+import random
+from typing import Iterator, List, Optional, Tuple
+
+from record_parser import KEYWORD, SUBTYPE
+from record_schema import action_name_to_struct
+from template_db import CHARACTER, HERO, SPELL, TREASURE, default_template_db
+
+SUBTYPE_NAMES = [str(subtype) for subtype in SUBTYPE.decmapping.values()]
+KEYWORD_NAMES = [str(keyword) for keyword in KEYWORD.decmapping.values()]
+MAX_BOARD_SIZE = 7
+STARTING_HEALTH = 40
+
+
+def _string(name: str, value: str, length_name: Optional[str] = None) -> dict:
+    """A UTF-16 string field along with the character count field in front of it."""
+    return {length_name or name + "_length": len(value), name: value}
+
+
+class SyntheticPlayer:
+
+    def __init__(self, rng: random.Random, index: int, hero_template_id: int):
+        self.player_id = "{:016X}".format(rng.getrandbits(64))
+        self.name = "Player{}".format(index + 1)
+        self.hero_card_id = rng.getrandbits(128).to_bytes(16, "little")
+        self.hero_template_id = hero_template_id
+        self.health = STARTING_HEALTH
+        self.level = 2
+        self.experience = 0
+        self.place = 0
+
+    @property
+    def alive(self) -> bool:
+        return self.health > 0
+
+
+class SyntheticGame:
+    """
+    One game from the point of view of its first player: hero choice, then for every turn a shop phase (shops, rolls,
+    purchases, spells, treasure picks, leaderboard updates) and a brawl (attack, damage and death bursts), and finally
+    the results phase with the final board and placements.
+    """
+
+    def __init__(self, turns: int = 15, players: int = 8, seed=0, shop_size: int = 5, max_rolls: int = 3,
+                 brawl_length: int = 12):
+        if players < 2:
+            raise ValueError("a game needs at least two players")
+        self.turns = turns
+        self.player_count = players
+        self.seed = seed
+        self.shop_size = shop_size
+        self.max_rolls = max_rolls
+        self.brawl_length = brawl_length
+
+    def _setup(self):
+        self.rng = random.Random(self.seed)
+        self.timestamp = 0
+        templates = default_template_db()
+        by_category = {CHARACTER: [], TREASURE: [], HERO: [], SPELL: []}
+        for template_id, name in enumerate(templates.names):
+            category = templates.category(template_id)
+            if category in by_category:
+                by_category[category].append(template_id)
+        self.characters = by_category[CHARACTER]
+        self.treasures = by_category[TREASURE]
+        self.heroes = by_category[HERO]
+        self.spells = by_category[SPELL]
+        self.players = [SyntheticPlayer(self.rng, index, self.rng.choice(self.heroes))
+                        for index in range(self.player_count)]
+        self.me = self.players[0]
+        self.gold = 0
+        self.board = []
+        self.owned_treasures = []
+        self.shop = []
+
+    def _new_card_id(self) -> bytes:
+        return self.rng.getrandbits(128).to_bytes(16, "little")
+
+    def _action(self, action_name: str, fields: dict) -> Tuple[str, dict]:
+        # Visual effects carry no timestamp; every other action gets the next one
+        if action_name == "ActionPlayFX":
+            timestamp = 0
+        else:
+            self.timestamp += 1
+            timestamp = self.timestamp
+        return action_name, dict(fields, timestamp=timestamp)
+
+    def _unit(self, template_id: int, zone: str, slot: int, player: SyntheticPlayer, is_golden: bool = False,
+              attack: Optional[int] = None, health: Optional[int] = None, cost: int = 3,
+              card_id: Optional[bytes] = None) -> dict:
+        rng = self.rng
+        card_id = card_id if card_id is not None else self._new_card_id()
+        unit = dict(card_id=card_id, template_id=template_id + 1 if is_golden else template_id, is_locked=False,
+                    is_targeted=False, is_golden=is_golden, is_movable=zone in ("shop", "character", "hand"),
+                    makes_pair=False, makes_triple=False, zone=zone, slot=slot, cost=cost,
+                    attack=attack if attack is not None else rng.randint(0, 12),
+                    health=health if health is not None else rng.randint(1, 12), counter=-1, damage=0,
+                    subtypes=rng.sample(SUBTYPE_NAMES, rng.randint(0, 2)),
+                    keywords=rng.sample(KEYWORD_NAMES, rng.randint(0, 1)), valid_targets=None,
+                    card_id_again=card_id)
+        unit.update(_string("art_id", ""))
+        unit.update(_string("player_id", player.player_id))
+        unit.update(_string("frame_override", ""))
+        return unit
+
+    def _play_fx(self, source: bytes, targets: List[bytes]) -> Tuple[str, dict]:
+        fields = dict(source=source, targets=targets)
+        fields.update(_string("content_id", self.rng.choice(["Buff", "Summon", "Hit", "Heal"])))
+        return self._action("ActionPlayFX", fields)
+
+    def _player_fields(self, player: SyntheticPlayer) -> dict:
+        fields = dict(health=max(player.health, 0), gold=self.gold if player is self.me else 0,
+                      experience=player.experience, next_level_xp=player.level + 1, level=player.level,
+                      place=player.place)
+        fields.update(_string("player_id", player.player_id))
+        fields.update(_string("player_name", player.name))
+        return fields
+
+    def _add_players(self) -> Iterator[Tuple[str, dict]]:
+        for player in self.players:
+            yield self._action("ActionAddPlayer", dict(self._player_fields(player), card_id=player.hero_card_id,
+                                                       template_id=player.hero_template_id))
+
+    def _modify(self, action_name: str, field: str, value: int) -> Tuple[str, dict]:
+        return self._action(action_name, dict(_string("player_id", self.me.player_id), **{field: value}))
+
+    def _intro(self) -> Iterator[Tuple[str, dict]]:
+        yield self._action("ActionEnterIntroPhase", {})
+        heroes = []
+        for slot, template_id in enumerate(self.rng.sample(self.heroes, 2)):
+            heroes.append(dict(unknown=0, card=self._unit(template_id, "hero", slot, self.me), prices=[]))
+        yield self._action("ActionPresentHeroDiscover", dict(_string("choice_text", "Choose a Hero"), heroes=heroes))
+        fields = {}
+        fields.update(_string("session_id", "{:032x}".format(self.rng.getrandbits(128)), "session_length"))
+        fields.update(_string("build_id", "synthetic", "build_length"))
+        fields.update(_string("server_ip", "127.0.0.1", "server_length"))
+        yield self._action("ActionConnectionInfo", fields)
+        yield self._action("ActionUpdateTurnTimer", dict(seconds_remaining=60, is_enabled=True, timer=60.0))
+        emotes = [_string("emote_name", name) for name in ("Hello", "Wow", "Oops")]
+        yield self._action("ActionUpdateEmotes", dict(_string("player_id", self.me.player_id), emotes=emotes))
+        yield from self._add_players()
+
+    def _fill_shop(self) -> Iterator[Tuple[str, dict]]:
+        for card in self.shop:
+            yield self._action("ActionRemoveCard", dict(card_id=card["card_id"]))
+        self.shop = []
+        for slot in range(self.shop_size):
+            if self.rng.random() < 0.15:
+                unit = self._unit(self.rng.choice(self.spells), "shop", slot, self.me, attack=0, health=0)
+            else:
+                unit = self._unit(self.rng.choice(self.characters), "shop", slot, self.me)
+            self.shop.append(unit)
+            yield self._action("ActionCreateCard", dict(card=unit))
+            yield self._play_fx(unit["card_id"], [])
+            for _ in range(self.rng.randint(0, 3)):
+                yield self._action("ActionUpdateCard", dict(card=unit))
+
+    def _buy(self) -> Iterator[Tuple[str, dict]]:
+        if not self.shop:
+            return
+        card = self.shop.pop(self.rng.randrange(len(self.shop)))
+        self.gold = max(self.gold - 3, 0)
+        yield self._modify("ActionModifyGold", "amount", -3)
+        if card["template_id"] in self.spells:
+            yield self._action("ActionCastSpell", dict(card_id=card["card_id"], target=self.me.hero_card_id))
+            yield self._play_fx(card["card_id"], [self.me.hero_card_id])
+            return
+        if len(self.board) >= MAX_BOARD_SIZE:
+            sold = self.board.pop(self.rng.randrange(len(self.board)))
+            yield self._action("ActionRemoveCard", dict(card_id=sold["card_id"]))
+        yield self._action("ActionMoveCard", dict(card_id=card["card_id"], target_zone="character",
+                                                  target_index=len(self.board)))
+        card = dict(card, zone="character", slot=len(self.board))
+        self.board.append(card)
+        for _ in range(self.rng.randint(1, 4)):
+            yield self._action("ActionUpdateCard", dict(card=card))
+
+    def _treasure_pick(self, turn: int) -> Iterator[Tuple[str, dict]]:
+        tier = min(2 + turn // 3, 7)
+        choices = [self._unit(template_id, "treasure", slot, self.me, attack=0, health=0, cost=tier)
+                   for slot, template_id in enumerate(self.rng.sample(self.treasures, 3))]
+        fields = dict(_string("choice_text", "Choose a Treasure"), level=tier, treasures=choices)
+        yield self._action("ActionPresentDiscover", fields)
+        chosen = dict(self.rng.choice(choices), card_id=self._new_card_id())
+        chosen["card_id_again"] = chosen["card_id"]
+        self.owned_treasures.append(chosen)
+        yield self._action("ActionCreateCard", dict(card=chosen))
+
+    def _shop_phase(self, turn: int, opponent: SyntheticPlayer) -> Iterator[Tuple[str, dict]]:
+        self.gold = min(2 + turn, 10)
+        fields = dict(health=self.me.health, player_card_id=self.me.hero_card_id,
+                      player_card_template_id=self.me.hero_template_id, round=turn, gold=self.gold)
+        fields.update(_string("player_id", self.me.player_id))
+        fields.update(_string("player_name", self.me.name))
+        fields.update(_string("opponent_id", opponent.player_id))
+        yield self._action("ActionEnterShopPhase", fields)
+        yield from self._fill_shop()
+        self.me.experience += 1
+        yield self._modify("ActionModifyXP", "amount", 1)
+        if self.me.experience >= self.me.level + 1 and self.me.level < 6:
+            self.me.level += 1
+            self.me.experience = 0
+            yield self._modify("ActionModifyLevel", "amount", 1)
+            yield self._modify("ActionModifyNextLevelXP", "new_value", self.me.level + 1)
+        yield self._modify("ActionModifyGold", "amount", self.gold)
+        yield self._action("ActionUpdateTurnTimer", dict(seconds_remaining=60, is_enabled=True, timer=60.0))
+        yield from self._add_players()
+        for _ in range(self.rng.randint(0, self.max_rolls)):
+            yield from self._buy()
+            yield self._action("ActionRoll", {})
+            yield from self._fill_shop()
+        yield from self._buy()
+        if turn % 3 == 0:
+            yield from self._treasure_pick(turn)
+        yield self._modify("ActionModifyGold", "amount", 0)
+
+    def _brawl(self, turn: int, opponent: SyntheticPlayer) -> Iterator[Tuple[str, dict]]:
+        fields = dict(player_1_health=self.me.health, player_1_card_id=self.me.hero_card_id,
+                      player_1_card_template_id=self.me.hero_template_id, player_2_health=opponent.health,
+                      player_2_card_id=opponent.hero_card_id, player_2_card_template_id=opponent.hero_template_id)
+        for prefix, player in (("player_1", self.me), ("player_2", opponent)):
+            fields.update(_string(prefix + "_id", player.player_id))
+            fields.update(_string(prefix + "_name", player.name))
+            fields.update(_string(prefix + "_id_again", player.player_id, prefix + "_id_length_again"))
+        yield self._action("ActionEnterBrawlPhase", fields)
+        mine = [self._unit(card["template_id"], "character", slot, self.me, card["is_golden"], card["attack"],
+                           card["health"]) for slot, card in enumerate(self.board)]
+        theirs = [self._unit(self.rng.choice(self.characters), "character", slot, opponent)
+                  for slot in range(min(turn, MAX_BOARD_SIZE))]
+        for unit in mine + theirs:
+            yield self._action("ActionCreateCard", dict(card=unit))
+        alive_mine = [unit["card_id"] for unit in mine]
+        alive_theirs = [unit["card_id"] for unit in theirs]
+        for _ in range(self.rng.randint(self.brawl_length // 2, self.brawl_length)):
+            if not alive_mine or not alive_theirs:
+                break
+            attacker = self.rng.choice(alive_mine)
+            defender = self.rng.choice(alive_theirs)
+            if self.rng.random() < 0.5:
+                attacker, defender = defender, attacker
+            yield self._action("ActionAttack", dict(attacker=attacker, defender=defender))
+            yield self._action("ActionDealDamage", dict(target=defender, source=attacker,
+                                                        damage=self.rng.randint(1, 10)))
+            if self.rng.random() < 0.7:
+                yield self._action("ActionDealDamage", dict(target=attacker, source=defender,
+                                                            damage=self.rng.randint(1, 10)))
+            if self.rng.random() < 0.3:
+                yield self._play_fx(attacker, [defender])
+            if self.rng.random() < 0.6:
+                for alive in (alive_mine, alive_theirs):
+                    if defender in alive:
+                        alive.remove(defender)
+                yield self._action("ActionDeath", dict(target=defender))
+        won = len(alive_mine) >= len(alive_theirs)
+        loser = opponent if won else self.me
+        damage = self.rng.randint(1, 5) + turn // 2
+        loser.health -= damage
+        fields = dict(unknown_1=0, round=turn)
+        fields.update(_string("player_id_1", self.me.player_id, "id_1_length"))
+        fields.update(_string("player_id_2", opponent.player_id, "id_2_length"))
+        yield self._action("ActionBrawlComplete", fields)
+        yield self._action("ActionDealDamage", dict(target=loser.hero_card_id, source=loser.hero_card_id,
+                                                    damage=damage))
+        for player in self.players[1:]:
+            if player is not opponent and player.alive:
+                player.health -= self.rng.randint(0, 4)
+        self._assign_places()
+
+    def _assign_places(self):
+        eliminated = sorted((player for player in self.players if not player.alive and player.place == 0),
+                            key=lambda player: player.health)
+        remaining = sum(player.alive for player in self.players)
+        for offset, player in enumerate(eliminated):
+            player.place = remaining + len(eliminated) - offset
+
+    def _results(self) -> Iterator[Tuple[str, dict]]:
+        survivors = sorted((player for player in self.players if player.place == 0),
+                           key=lambda player: player.health, reverse=True)
+        for place, player in enumerate(survivors, 1):
+            player.place = place
+        characters = [dict(card, zone="character", slot=slot) for slot, card in enumerate(self.board)]
+        characters += [None] * (MAX_BOARD_SIZE - len(characters))
+        fields = dict(self._player_fields(self.me), player_hero_id=self.me.hero_card_id,
+                      player_card_template_id=self.me.hero_template_id, placement=self.me.place,
+                      dust_reward=10 * (9 - self.me.place), rank_reward=50 - 12 * self.me.place, crown_reward=0,
+                      first_win_dust_reward=0, unknown=0, characters=characters,
+                      treasures=self.owned_treasures[-3:] + [None] * (3 - len(self.owned_treasures[-3:])))
+        yield self._action("ActionEnterResultsPhase", fields)
+        yield from self._add_players()
+
+    def actions(self) -> Iterator[Tuple[str, dict]]:
+        """(action name, fields) for every action of the game, in order."""
+        self._setup()
+        yield from self._intro()
+        for turn in range(1, self.turns + 1):
+            opponents = [player for player in self.players[1:] if player.alive]
+            if not opponents or not self.me.alive:
+                break
+            opponent = self.rng.choice(opponents)
+            yield from self._shop_phase(turn, opponent)
+            yield from self._brawl(turn, opponent)
+        yield from self._results()
+
+    def to_bytes(self) -> bytes:
+        return b"".join(action_name_to_struct[action_name].build(fields) for action_name, fields in self.actions())
+
+    def write(self, path):
+        with open(path, 'wb') as f:
+            for action_name, fields in self.actions():
+                f.write(action_name_to_struct[action_name].build(fields))
+
+
+def generate_corpus(directory, games: int, turns: int = 15, players: int = 8, seed=0, **options) -> List[str]:
+    """Writes `games` synthetic records named record_synthetic_<n>.txt to directory, returning their paths."""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for index in range(games):
+        path = os.path.join(directory, "record_synthetic_{:06d}.txt".format(index))
+        SyntheticGame(turns, players, "{}:{}".format(seed, index), **options).write(path)
+        paths.append(path)
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic Storybook Brawl record files.")
+    parser.add_argument("directory", help="Where to write the record_synthetic_*.txt files")
+    parser.add_argument("-n", "--games", type=int, default=10, help="Number of records to generate")
+    parser.add_argument("--turns", type=int, default=15, help="Maximum number of turns per game")
+    parser.add_argument("--players", type=int, default=8, help="Players per game")
+    parser.add_argument("--seed", default="0", help="Seed; the same seed always generates the same corpus")
+    parser.add_argument("--shop-size", type=int, default=5, help="Cards per shop")
+    parser.add_argument("--max-rolls", type=int, default=3, help="Maximum rolls per turn")
+    parser.add_argument("--brawl-length", type=int, default=12, help="Maximum attacks per brawl")
+    args = parser.parse_args(argv)
+    paths = generate_corpus(args.directory, args.games, args.turns, args.players, args.seed,
+                            shop_size=args.shop_size, max_rolls=args.max_rolls, brawl_length=args.brawl_length)
+    print("Wrote {} records to {}".format(len(paths), args.directory))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
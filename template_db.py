@@ -0,0 +1,125 @@
+import json
+import os
+from typing import Dict, List, Optional
+
+# Copied from SBB Tracker's template ID mapping
+# (https://github.com/SBBTracker/SBBTracker/blob/main/assets/template-ids.json)
+DEFAULT_TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "template-ids.json")
+
+CHARACTER = "character"
+TREASURE = "treasure"
+HERO = "hero"
+SPELL = "spell"
+
+# Template Ids look like SBB_CHARACTER_FROGPRINCE
+_ID_PREFIX_TO_CATEGORY = {"SBB_CHARACTER_": CHARACTER, "SBB_TREASURE_": TREASURE, "SBB_HERO_": HERO,
+                          "SBB_SPELL_": SPELL}
+
+
+def _category_of(template_string_id: str) -> Optional[str]:
+    for prefix, category in _ID_PREFIX_TO_CATEGORY.items():
+        if template_string_id.startswith(prefix):
+            return category
+    return None
+
+
+class TemplateDB:
+    """
+    Names and categories of card templates, indexed directly by integer template id. The JSON file is only read the
+    first time a lookup needs it.
+
+    The golden version of a character has the template id just after the normal one, so unit_name(template_id,
+    is_golden=True) looks the name up in a table already shifted by one.
+    """
+
+    def __init__(self, path=DEFAULT_TEMPLATE_PATH):
+        self.path = os.fspath(path)
+        self._names: Optional[List[Optional[str]]] = None
+        self._golden_names: List[Optional[str]] = []
+        self._categories: List[Optional[str]] = []
+        self._string_ids: List[Optional[str]] = []
+
+    def _load(self):
+        with open(self.path, 'r') as f:
+            templates = json.load(f)
+        size = max((int(template_id) for template_id in templates), default=-1) + 2
+        names = [None] * size
+        categories = [None] * size
+        string_ids = [None] * size
+        for template_id, template in templates.items():
+            template_id = int(template_id)
+            names[template_id] = template["Name"]
+            string_ids[template_id] = template["Id"]
+            categories[template_id] = _category_of(template["Id"])
+        self._golden_names = [None] + names[:-1]
+        self._categories = categories
+        self._string_ids = string_ids
+        self._names = names
+
+    @property
+    def names(self) -> List[Optional[str]]:
+        """Template names indexed by template id, None where there is no template."""
+        if self._names is None:
+            self._load()
+        return self._names
+
+    def __len__(self):
+        return sum(name is not None for name in self.names)
+
+    def __contains__(self, template_id: int) -> bool:
+        names = self.names
+        return 0 <= template_id < len(names) and names[template_id] is not None
+
+    def name(self, template_id: int, default: Optional[str] = None) -> Optional[str]:
+        names = self.names
+        if 0 <= template_id < len(names):
+            name = names[template_id]
+            if name is not None:
+                return name
+        return default
+
+    def unit_name(self, template_id: int, is_golden: bool = False, default: Optional[str] = None) -> Optional[str]:
+        """The name of a unit, given the template id it has in a record (which is one higher if it is golden)."""
+        names = self.names
+        if is_golden:
+            names = self._golden_names
+        if 0 <= template_id < len(names):
+            name = names[template_id]
+            if name is not None:
+                return name
+        return default
+
+    def base_id(self, template_id: int, is_golden: bool = False) -> int:
+        """The template id of the normal version of a unit."""
+        return template_id - 1 if is_golden else template_id
+
+    def category(self, template_id: int) -> Optional[str]:
+        """One of CHARACTER, TREASURE, HERO or SPELL, or None for an unknown template."""
+        if template_id not in self:
+            return None
+        return self._categories[template_id]
+
+    def string_id(self, template_id: int) -> Optional[str]:
+        """The template's internal Id, like SBB_CHARACTER_FROGPRINCE."""
+        if template_id not in self:
+            return None
+        return self._string_ids[template_id]
+
+    def as_dict(self) -> Dict[str, dict]:
+        """The templates in the same form as template-ids.json."""
+        return {str(template_id): {"Id": self._string_ids[template_id], "Name": name}
+                for template_id, name in enumerate(self.names) if name is not None}
+
+
+_default_template_db = TemplateDB()
+
+
+def default_template_db() -> TemplateDB:
+    return _default_template_db
+
+
+def set_template_path(path) -> TemplateDB:
+    """Makes the template database at path the default one, e.g. for a newer template-ids.json."""
+    global _default_template_db
+    _default_template_db = TemplateDB(path)
+    return _default_template_db
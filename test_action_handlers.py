@@ -0,0 +1,86 @@
+import io
+import os
+import pickle
+
+import pytest
+
+import action_handlers
+import record_parser
+import run_history_reader
+
+RECORD = os.path.join("test_samples", "example_record.bin")
+
+
+class CountingHandler(action_handlers.ActionHandler):
+
+    def __init__(self, action_names=None, log=None):
+        self.action_names = action_names
+        self.counts = {}
+        self.log = log
+
+    def handle(self, action_name, action):
+        self.counts[action_name] = self.counts.get(action_name, 0) + 1
+        if self.log is not None:
+            self.log.append((self, action.timestamp))
+
+    def result(self):
+        return self.counts
+
+
+def test_incomplete_handler_cannot_be_created():
+    class NoResultHandler(action_handlers.ActionHandler):
+
+        def handle(self, action_name, action):
+            pass
+
+    with pytest.raises(TypeError):
+        NoResultHandler()
+
+
+def test_subscribed_action_names():
+    rolls = CountingHandler(frozenset(["ActionRoll"]))
+    deaths = CountingHandler(frozenset(["ActionDeath", "ActionRoll"]))
+    assert action_handlers.subscribed_action_names([rolls, deaths]) == {"ActionRoll", "ActionDeath"}
+    assert action_handlers.subscribed_action_names([rolls, CountingHandler()]) is None
+
+
+def test_run_handlers_dispatches_in_one_pass():
+    log = []
+    rolls = CountingHandler(frozenset(["ActionRoll"]), log)
+    everything = CountingHandler(None, log)
+    assert action_handlers.run_handlers(RECORD, [rolls, everything]) == 0
+    assert rolls.result() == {"ActionRoll": 26}
+    assert sum(everything.result().values()) == 8777
+    assert everything.result()["ActionRoll"] == 26
+    # Both handlers see an action before the next one is dispatched, in the order they were given
+    first_roll = [index for index, (handler, _) in enumerate(log) if handler is rolls][0]
+    assert log[first_roll - 1][0] is everything or log[first_roll + 1][0] is everything
+    assert log[first_roll][1] == log[first_roll + 1][1]
+
+
+def test_run_handlers_only_decodes_subscribed_actions():
+    stats = record_parser.DecodeStats()
+    handler = CountingHandler(frozenset(["ActionRoll", "ActionDeath"]))
+    action_handlers.run_handlers(RECORD, [handler], stats=stats)
+    assert set(stats.actions) == {"ActionRoll", "ActionDeath"}
+    assert stats.action_count == sum(handler.result().values())
+
+
+def test_run_handlers_reports_unparsed_bytes():
+    with open(RECORD, 'rb') as f:
+        binary = f.read()
+    handler = CountingHandler()
+    assert action_handlers.run_handlers(io.BytesIO(binary[:-3]), [handler]) > 0
+    assert sum(handler.result().values()) == 8776
+
+
+def test_extract_all_matches_separate_extractors(capsys):
+    products = run_history_reader.extract_all_from_record_file(RECORD)
+    game = run_history_reader.extract_game_from_record_file(RECORD)
+    assert pickle.dumps(products["game"]) == pickle.dumps(game)
+    assert products["build_id"] == run_history_reader.get_build_id_from_record_file(RECORD)
+    # Units have no __eq__
+    endgame_stats = run_history_reader.extract_endgame_stats_from_record_file(RECORD)
+    assert pickle.dumps(products["endgame_stats"]) == pickle.dumps(endgame_stats)
+    assert products["endgame_stats"].game_over
+    assert "Final placements" in capsys.readouterr().out
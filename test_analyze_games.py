@@ -0,0 +1,61 @@
+import analyze_games
+from run_history_reader import Board, Game, Player, TreasureChoice, Unit
+
+
+def make_player(name, player_id, place, level=6):
+    return Player("Hero", 0, level, 0, name, player_id, place)
+
+
+def make_game(placement, final_level, bought, rolls, treasures, units, opponents):
+    game = Game()
+    game.placement = placement
+    game.turn = len(bought)
+    me = make_player("Me", analyze_games.MAIN_PLAYER_ID, placement, final_level)
+    game.final_results = [me] + [make_player(name, name, place) for name, place in opponents]
+    game.leaderboards = [[make_player("Me", analyze_games.MAIN_PLAYER_ID, placement, level)] for level, _ in bought]
+    game.bought = [[[Unit(1, 1, name, "Character") for name in names]] for _, names in bought]
+    game.shops = [[None] * (turn_rolls + 1) for turn_rolls in rolls]
+    for tier, chosen in treasures:
+        choice = TreasureChoice(["A", "B", "C"], tier)
+        choice.choose_treasure(chosen)
+        game.treasure_choices.append(choice)
+    game.final_board = Board("Hero", [Unit(1, 1, name, "Character", keywords, subtypes)
+                                      for name, keywords, subtypes in units], [])
+    return game
+
+
+def sample_games():
+    slay_board = [("Baba Yaga", [], []), ("Knight", ["slay"], [])]
+    good_boy_board = [("Good Boy", [], [])]
+    return [
+        make_game(1, 6, [(2, ["Wolf", "Wolf"]), (3, ["Bear"])], [2, 4], [(2, "Sword"), (3, "Skip")], slay_board,
+                  [("Rival", 2), ("Other", 5)]),
+        make_game(4, 5, [(2, ["Wolf"]), (2, ["Bear"])], [0, 1], [(2, "Shield"), (3, "Sword")], good_boy_board,
+                  [("Rival", 1)]),
+        make_game(2, 6, [(3, ["Bear"])], [3], [(2, "Sword")], good_boy_board, [("Rival", 3), ("Other", 1)]),
+    ]
+
+
+def test_treasure_report_counts_over_all_tiers():
+    treasures = analyze_games.analyze_games(sample_games())["treasures"]
+    rows = list(treasures.itertuples(index=False, name=None))
+    assert rows == [(2, "Sword", 3, 7 / 3), (2, "Shield", 1, 4.0), (3, "Sword", 3, 7 / 3)]
+
+
+def test_comp_report_only_counts_level_6_games():
+    comps = analyze_games.analyze_games(sample_games())["comps"]
+    assert list(comps.itertuples(index=False, name=None)) == [("Slay", 1, 1.0), ("Good Boy", 1, 2.0)]
+
+
+def test_purchase_report_counts_each_unit_once_per_game_and_level():
+    purchases = analyze_games.analyze_games(sample_games())["purchases"]
+    rows = list(purchases.itertuples(index=False, name=None))
+    assert rows == [(2, "Wolf", 2, 2.5), (2, "Bear", 1, 4.0), (3, "Bear", 2, 1.5)]
+
+
+def test_rolls_and_opponent_reports():
+    reports = analyze_games.analyze_games(sample_games())
+    assert list(reports["rolls"].itertuples(index=False, name=None)) == [(1, 5 / 3), (2, 2.5)]
+    opponents = list(reports["opponents"].itertuples(index=False, name=None))
+    assert opponents == [("Me", 0, 3), ("Rival", 2, 1), ("Other", 1, 1)]
+
@@ -0,0 +1,64 @@
+import os
+import shutil
+
+import pytest
+
+import batch_ingest
+import run_history_reader
+
+
+@pytest.fixture
+def record_paths(tmp_path):
+    paths = []
+    for i in range(3):
+        path = tmp_path / "record_{}.txt".format(i)
+        shutil.copy(os.path.join("test_samples", "example_record.bin"), path)
+        paths.append(os.fspath(path))
+    return paths
+
+
+def test_ingest_records_in_order(record_paths):
+    expected = run_history_reader.get_build_id_from_record_file(record_paths[0])
+    results = list(batch_ingest.ingest_records(record_paths, workers=2,
+                                               extractor=run_history_reader.get_build_id_from_record_file))
+    assert [result.path for result in results] == record_paths
+    assert all(result.ok and result.value == expected for result in results)
+
+
+def test_ingest_records_isolates_failures(record_paths):
+    paths = record_paths[:1] + ["does_not_exist.txt"] + record_paths[1:]
+    results = list(batch_ingest.ingest_records(paths, workers=2, ordered=False,
+                                               extractor=run_history_reader.get_build_id_from_record_file))
+    assert sorted(result.path for result in results) == sorted(paths)
+    failed = [result for result in results if not result.ok]
+    assert len(failed) == 1
+    assert failed[0].path == "does_not_exist.txt"
+    assert "FileNotFoundError" in failed[0].error
+
+
+def test_ingest_records_in_process(record_paths):
+    results = list(batch_ingest.ingest_records(record_paths, workers=1,
+                                               extractor=run_history_reader.get_build_id_from_record_file))
+    assert len(results) == 3
+    assert all(result.ok for result in results)
+
+
+def test_find_record_files(record_paths, tmp_path):
+    (tmp_path / "not_a_record.txt").write_text("")
+    found = batch_ingest.find_record_files(tmp_path, limit=2)
+    assert len(found) == 2
+    assert all(os.path.basename(path).startswith("record_") for path in found)
+
+
+def test_ingest_records_aggregates_decode_stats(record_paths):
+    results = list(batch_ingest.ingest_records(record_paths, workers=2,
+                                               extractor=run_history_reader.extract_game_with_stats))
+    assert all(result.ok for result in results)
+    stats = batch_ingest.DecodeStats.aggregate(result.value.decode_stats for result in results)
+    assert stats.records == 3
+    assert stats.action_count == 3 * 8777
+    assert stats.decoded_bytes == sum(os.path.getsize(path) for path in record_paths)
+    assert stats.timers["extract"].count == 3
+    assert stats.timers["Unit.from_unit_struct"].count == \
+        3 * results[0].value.decode_stats.timers["Unit.from_unit_struct"].count
+    assert "ActionEnterResultsPhase" in stats.format()
@@ -0,0 +1,54 @@
+import os
+import shutil
+
+import pytest
+
+import benchmark
+
+
+def test_parse_importtime():
+    output = "\n".join([
+        "import time: self [us] | cumulative | imported package",
+        "import time:       932 |      65010 |   construct",
+        "import time:      3633 |      82088 | record_parser",
+    ])
+    assert benchmark.parse_importtime(output, "record_parser") == 82088
+    assert benchmark.parse_importtime(output, "construct") == 65010
+    with pytest.raises(ValueError):
+        benchmark.parse_importtime(output, "run_history_reader")
+
+
+def test_measure_import_time():
+    timings = benchmark.measure_import_time("record_parser", repeat=2)
+    assert len(timings) == 2
+    assert all(timing > 0 for timing in timings)
+
+
+def test_benchmark_actions_measures_interpreted_and_compiled(tmp_path):
+    shutil.copy(os.path.join("test_samples", "ActionCreateCard.bin"), tmp_path)
+    results = benchmark.benchmark_actions(str(tmp_path), min_time=0.001, buffer_size=1024)
+    assert set(results) == {"actions/ActionCreateCard/{}/{}".format(variant, metric)
+                            for variant in ("interpreted", "compiled") for metric in ("actions_per_sec", "mb_per_sec")}
+    assert all(metric.value > 0 and metric.higher_is_better for metric in results.values())
+
+
+def test_benchmark_memory():
+    results = benchmark.benchmark_memory()
+    peak = results["memory/example_record.bin/interpreted/peak_mb"]
+    assert peak.value > 0 and not peak.higher_is_better
+
+
+def test_results_round_trip_and_compare(tmp_path):
+    baseline = {"a/actions_per_sec": benchmark.Metric(100.0, "actions/s", True),
+                "b/seconds": benchmark.Metric(2.0, "s", False),
+                "c/seconds": benchmark.Metric(1.0, "s", False)}
+    path = tmp_path / "baseline.json"
+    benchmark.save_results(path, baseline)
+    assert benchmark.load_results(path) == baseline
+    current = {"a/actions_per_sec": benchmark.Metric(50.0, "actions/s", True),
+               "b/seconds": benchmark.Metric(1.0, "s", False),
+               "d/seconds": benchmark.Metric(1.0, "s", False)}
+    comparisons = benchmark.compare_results(baseline, current)
+    assert [(comparison.name, comparison.speedup) for comparison in comparisons] == \
+        [("a/actions_per_sec", 0.5), ("b/seconds", 2.0)]
+    assert [comparison.is_regression(0.1) for comparison in comparisons] == [True, False]
@@ -0,0 +1,57 @@
+import io
+import os
+
+import board_replay
+import run_history_reader
+import synthetic_records
+from record_parser import id_to_action_name, iter_actions
+
+RECORD = os.path.join("test_samples", "example_record.bin")
+PLAYER_ID = "429402B2E2AD1FA4"
+
+
+def test_replay_brawls_on_example_record():
+    snapshots = board_replay.replay_brawls(RECORD)
+    assert len(snapshots) == 17
+    assert [snapshot.turn for snapshot in snapshots] == list(range(1, 18))
+    assert all(snapshot.player.player_id == PLAYER_ID for snapshot in snapshots)
+    assert all(snapshot.opponent.player_id != PLAYER_ID for snapshot in snapshots)
+    # The first board was bought and moved to the hand before the first brawl
+    assert snapshots[0].player.characters == ()
+    assert [card.template_id for card in snapshots[0].player.hand] == [102]
+    last = snapshots[-1]
+    assert [card.slot for card in last.player.characters] == [0, 1, 3, 4, 5, 6]
+    assert len(last.opponent.characters) == 7
+    assert len(last.opponent.treasures) == 3
+    assert all(card.zone == "character" for card in last.opponent.characters)
+
+
+def test_snapshots_are_not_changed_by_later_actions():
+    replay = board_replay.BoardReplay()
+    actions = list(iter_actions(RECORD))
+    for _, action in actions[:320]:
+        replay.handle(id_to_action_name[action.action_id], action)
+    snapshot = replay.result()[-1]
+    before = [(card.card_id, card.attack, card.health) for card in snapshot.player.characters]
+    assert len(before) == 5
+    for _, action in actions[320:400]:
+        replay.handle(id_to_action_name[action.action_id], action)
+    assert [(card.card_id, card.attack, card.health) for card in snapshot.player.characters] == before
+    assert replay.board(PLAYER_ID) != snapshot.player
+
+
+def test_game_boards_are_filled():
+    game = run_history_reader.extract_game_from_record_file(RECORD)
+    assert len(game.boards) == len(game.enemy_boards) == 17
+    assert game.boards[-1].hero == game.final_board.hero
+    assert [repr(unit) for unit in game.boards[-1].units] == [repr(unit) for unit in game.final_board.units]
+    assert [unit.name for unit in game.enemy_boards[-1].treasures] == \
+        ["Deck of Many Things", "Horn of Olympus", "Summoning Portal"]
+
+
+def test_replay_brawls_on_synthetic_record():
+    binary = synthetic_records.SyntheticGame(turns=6, players=4, seed=2).to_bytes()
+    game = run_history_reader.extract_game_from_actions(action for _, action in iter_actions(io.BytesIO(binary)))
+    snapshots = board_replay.replay_brawls(io.BytesIO(binary))
+    assert len(snapshots) == game.turn
+    assert all(len(snapshot.opponent.characters) == min(snapshot.turn, 7) for snapshot in snapshots)
@@ -0,0 +1,64 @@
+import os
+from collections import Counter
+
+import numpy as np
+import pytest
+
+import columnar_export
+import record_parser
+
+EXAMPLE_RECORD = os.path.join("test_samples", "example_record.bin")
+
+
+@pytest.fixture(scope="module")
+def export():
+    return columnar_export.export_actions([EXAMPLE_RECORD])
+
+
+def test_tables_have_one_row_per_action(export):
+    counts = Counter(record_parser.id_to_action_name[action.action_id]
+                     for _, action in record_parser.iter_actions(EXAMPLE_RECORD))
+    for action_name, count in counts.items():
+        assert len(export[action_name]) == count
+    assert len(export["ActionUpdateCard"]) == 5474
+
+
+def test_columns_match_parsed_actions(export):
+    attacks = [action for _, action in record_parser.iter_actions(EXAMPLE_RECORD, action_names={"ActionAttack"})]
+    assert export.decode("ActionAttack", "attacker") == [action.attacker for action in attacks]
+    assert list(export["ActionAttack"]["timestamp"]) == [action.timestamp for action in attacks]
+    golds = [action for _, action in record_parser.iter_actions(EXAMPLE_RECORD, action_names={"ActionModifyGold"})]
+    assert export.decode("ActionModifyGold", "player_id") == [action.player_id for action in golds]
+    assert list(export["ActionModifyGold"]["amount"]) == [action.amount for action in golds]
+
+
+def test_units_table(export):
+    units = export["units"]
+    update_code = export.string_code("ActionUpdateCard")
+    assert np.count_nonzero(units["action"] == update_code) == 5474
+    results = units[units["action"] == export.string_code("ActionEnterResultsPhase")]
+    # Seven character slots with one empty, and three treasures
+    assert len(results) == 9
+    (_, results_action), = record_parser.iter_actions(EXAMPLE_RECORD, action_names={"ActionEnterResultsPhase"})
+    characters = [character for character in results_action.characters if character is not None]
+    assert list(results["template_id"][:6]) == [character.template_id for character in characters]
+    for character, subtype_mask in zip(characters, results["subtype_mask"]):
+        for name, value in record_parser.SUBTYPE.encmapping.items():
+            assert (name in character.subtypes) == bool(subtype_mask & (1 << value))
+    frame = export.to_pandas("units")
+    assert len(frame) == len(units)
+    assert str(frame["zone"].iloc[0]) == "none"
+
+
+def test_save_npz(export, tmp_path):
+    path = tmp_path / "export.npz"
+    export.save_npz(path)
+    with np.load(path, allow_pickle=True) as loaded:
+        assert np.array_equal(loaded["table_ActionAttack"], export["ActionAttack"])
+        assert list(loaded["guids"]) == export.guids
+
+
+def test_write_parquet(export, tmp_path):
+    pytest.importorskip("pyarrow")
+    export.write_parquet(tmp_path)
+    assert os.path.exists(tmp_path / "units.parquet")
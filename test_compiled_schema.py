@@ -0,0 +1,109 @@
+import glob
+import io
+import os
+
+import construct
+import pytest
+
+import compiled_schema
+import record_parser
+import record_schema
+
+
+@pytest.fixture(scope="module")
+def cache_dir(tmp_path_factory):
+    return tmp_path_factory.mktemp("compiled_schema")
+
+
+def test_compiled_structs_match_interpreted_on_samples(cache_dir):
+    compiled = compiled_schema.compiled_action_structs(cache_dir)
+    paths = sorted(glob.glob(os.path.join("test_samples", "Action*.bin")))
+    assert paths
+    for path in paths:
+        action_name = os.path.basename(path)[:-len(".bin")]
+        with open(path, 'rb') as f:
+            binary = f.read()
+        assert compiled[action_name].parse(binary) == record_schema.action_name_to_struct[action_name].parse(binary)
+
+
+def test_compiled_action_struct_matches_interpreted_on_record(cache_dir):
+    with open(os.path.join("test_samples", "example_record.bin"), 'rb') as f:
+        reference = construct.GreedyRange(record_schema.STRUCT_ACTION).parse_stream(f)
+    with open(os.path.join("test_samples", "example_record.bin"), 'rb') as f:
+        result = construct.GreedyRange(compiled_schema.compiled_action_struct(cache_dir)).parse_stream(f)
+    assert len(result) == len(reference) == 8777
+    assert result == reference
+
+
+def test_compiled_iter_actions_matches_interpreted():
+    path = os.path.join("test_samples", "example_record.bin")
+    for guid_format in ("hex", "bytes"):
+        compiled = list(record_parser.iter_actions(path, guid_format=guid_format, compiled=True))
+        assert compiled == list(record_parser.iter_actions(path, guid_format=guid_format))
+
+
+def test_compiled_parser_rejects_truncated_action(cache_dir):
+    with open(os.path.join("test_samples", "ActionCreateCard.bin"), 'rb') as f:
+        binary = f.read()
+    parser = compiled_schema.compiled_action_struct(cache_dir)
+    for length in (len(binary) - 1, len(binary) - 20, 12):
+        with pytest.raises(construct.ConstructError):
+            parser.parse(binary[:length])
+    with pytest.raises(construct.MappingError):
+        parser.parse(b"\x0f\x00" + binary[2:])
+
+
+def test_compiled_module_is_cached_on_disk(cache_dir):
+    compiled_schema.load_compiled_module(cache_dir)
+    path = os.path.join(cache_dir, "compiled_schema_{}.py".format(compiled_schema.schema_fingerprint()))
+    assert os.path.exists(path)
+    with open(path) as f:
+        assert f.read() == compiled_schema.generate_source()
+    compiled_schema._compiled_modules.clear()
+    module = compiled_schema.load_compiled_module(cache_dir)
+    assert module.__file__ == path
+
+
+def test_compiled_builds_with_reference_struct(cache_dir):
+    with open(os.path.join("test_samples", "ActionRoll.bin"), 'rb') as f:
+        binary = f.read()
+    parser = compiled_schema.compiled_action_structs(cache_dir)["ActionRoll"]
+    assert parser.build(parser.parse(binary)) == binary
+
+
+def test_compiled_module_replaces_stale_modules(tmp_path):
+    stale = tmp_path / "compiled_schema_0000000000000000.py"
+    stale.write_text("parse_action = None\n")
+    (tmp_path / "__pycache__").mkdir()
+    stale_bytecode = tmp_path / "__pycache__" / "compiled_schema_0000000000000000.cpython-00.pyc"
+    stale_bytecode.write_bytes(b"")
+    compiled_schema.load_compiled_module(tmp_path)
+    assert sorted(os.listdir(tmp_path)) == ["__pycache__", "compiled_schema_{}.py".format(
+        compiled_schema.schema_fingerprint())]
+    assert not stale_bytecode.exists()
+
+
+def test_iter_actions_compiled_over_mmap():
+    path = os.path.join("test_samples", "example_record.bin")
+    compiled = list(record_parser.iter_actions(path, use_mmap=True, compiled=True))
+    assert compiled == list(record_parser.iter_actions(path))
+    assert not any(isinstance(value, record_parser.DeferredField)
+                   for _, action in compiled if isinstance(action, dict) and "card" in action
+                   for value in dict.values(action.card))
+
+
+def test_compiled_cannot_be_lazy():
+    with pytest.raises(ValueError):
+        record_parser.ActionDecoder(b"", lazy=True, compiled=True)
+
+
+def test_iter_actions_compiled_stops_at_truncated_action():
+    with open(os.path.join("test_samples", "example_record.bin"), 'rb') as f:
+        binary = f.read()[:-3]
+    compiled_file = io.BytesIO(binary)
+    compiled = list(record_parser.iter_actions(compiled_file, compiled=True))
+    interpreted_file = io.BytesIO(binary)
+    interpreted = list(record_parser.iter_actions(interpreted_file))
+    assert len(compiled) == len(interpreted) == 8776
+    assert compiled == interpreted
+    assert compiled_file.read() == interpreted_file.read() != b""
@@ -0,0 +1,92 @@
+import functools
+import os
+import shutil
+
+import pytest
+
+import batch_ingest
+import game_cache
+import run_history_reader
+
+
+@pytest.fixture
+def record_path(tmp_path):
+    path = tmp_path / "record_example.txt"
+    shutil.copy(os.path.join("test_samples", "ActionRoll.bin"), path)
+    return path
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return game_cache.GameCache(tmp_path / "cache")
+
+
+def test_cache_round_trip(cache, record_path):
+    extractor = run_history_reader.get_build_id_from_record_file
+    assert cache.get(record_path, extractor) is None
+    cache.put(record_path, extractor, ("id", "name", "build"))
+    assert cache.get(record_path, extractor) == ("id", "name", "build")
+    assert cache.get(record_path, run_history_reader.extract_game_from_record_file) is None
+
+
+def test_cache_invalidated_by_changes(cache, record_path):
+    extractor = run_history_reader.get_build_id_from_record_file
+    cache.put(record_path, extractor, "value")
+    with open(record_path, 'ab') as f:
+        f.write(b"\x00")
+    assert cache.get(record_path, extractor) is None
+
+
+def test_cache_invalidated_by_parser_version(cache, record_path, monkeypatch):
+    extractor = run_history_reader.get_build_id_from_record_file
+    cache.put(record_path, extractor, "value")
+    monkeypatch.setattr(game_cache, "PARSER_VERSION", run_history_reader.PARSER_VERSION + 1)
+    assert cache.get(record_path, extractor) is None
+
+
+def test_content_hash_ignores_touched_files(tmp_path, record_path):
+    cache = game_cache.GameCache(tmp_path / "cache", use_content_hash=True)
+    extractor = run_history_reader.get_build_id_from_record_file
+    cache.put(record_path, extractor, "value")
+    stat = os.stat(record_path)
+    os.utime(record_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert cache.get(record_path, extractor) == "value"
+    with open(record_path, 'r+b') as f:
+        f.write(b"\xff")
+    assert cache.get(record_path, extractor) is None
+
+
+def test_ingest_records_only_parses_uncached_files(cache, record_path, tmp_path):
+    other_path = tmp_path / "record_other.txt"
+    shutil.copy(record_path, other_path)
+    parsed = []
+
+    def extractor(path):
+        parsed.append(path)
+        return len(parsed)
+
+    first = list(batch_ingest.ingest_records([record_path], workers=1, extractor=extractor, cache=cache))
+    second = list(batch_ingest.ingest_records([record_path, other_path], workers=1, extractor=extractor, cache=cache))
+    assert parsed == [os.fspath(record_path), os.fspath(other_path)]
+    assert [result.value for result in first] == [1]
+    assert [result.value for result in second] == [1, 2]
+
+
+def test_ingest_records_with_partial_extractor(cache, record_path):
+    parsed = []
+
+    def extractor(path, value):
+        parsed.append(path)
+        return value
+
+    first = functools.partial(extractor, value="first")
+    assert [result.value for result in batch_ingest.ingest_records([record_path], workers=1, extractor=first,
+                                                                   cache=cache)] == ["first"]
+    assert [result.value for result in batch_ingest.ingest_records([record_path], workers=1, extractor=first,
+                                                                   cache=cache)] == ["first"]
+    # A partial binding other arguments is another extractor
+    second = functools.partial(extractor, value="second")
+    assert cache.get(record_path, second) is None
+    assert [result.value for result in batch_ingest.ingest_records([record_path], workers=1, extractor=second,
+                                                                   cache=cache)] == ["second"]
+    assert len(parsed) == 2
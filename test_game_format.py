@@ -0,0 +1,105 @@
+import io
+import os
+import pickle
+
+import pytest
+
+import game_format
+import run_history_reader
+import synthetic_records
+from record_parser import iter_actions
+
+RECORD = os.path.join("test_samples", "example_record.bin")
+
+
+def as_tuples(game):
+    """Every stored attribute of game as nested tuples, since the model classes have no __eq__."""
+    def unit(unit):
+        return None if unit is None else (unit.name, unit.zone, unit.attack, unit.health, unit.subtype_mask,
+                                          unit.keyword_mask)
+
+    def units(units):
+        return [unit(item) for item in units]
+
+    def player(player):
+        return player.hero, player.name, player.id, player.health, player.level, player.experience, player.place
+
+    def board(board):
+        return None if board is None else (board.hero, units(board.units), units(board.treasures))
+
+    return (game.turn, game.mmr_change, game.game_over, game.placement, game.final_level, game.build_id,
+            [[units(shop) for shop in shops] for shops in game.shops],
+            [[units(shop) for shop in shops] for shops in game.bought],
+            [units(spells) for spells in game.spells],
+            [[player(item) for item in leaderboard] for leaderboard in game.leaderboards],
+            [player(item) for item in game.final_results],
+            [(choice.choices, choice.tier, choice.chosen) for choice in game.treasure_choices],
+            [board(item) for item in game.boards], [board(item) for item in game.enemy_boards],
+            board(game.final_board))
+
+
+def synthetic_games(count):
+    games = []
+    for seed in range(count):
+        binary = synthetic_records.SyntheticGame(turns=4 + seed, players=4, seed=seed).to_bytes()
+        games.append(run_history_reader.extract_game_from_actions(action for _, action in iter_actions(
+            io.BytesIO(binary))))
+    return games
+
+
+def test_game_round_trip_is_smaller_than_pickle():
+    game = run_history_reader.extract_game_from_record_file(RECORD)
+    payload = game_format.encode_game(game)
+    loaded = game_format.decode_game(payload)
+    assert as_tuples(loaded) == as_tuples(game)
+    assert loaded.recovery_report is None and loaded.decode_stats is None
+    assert loaded.final_board.units[0].subtypes == game.final_board.units[0].subtypes
+    # Equal units are stored once and shared
+    assert loaded.final_board.units[0] is loaded.boards[-1].units[0]
+    assert len(payload) < len(pickle.dumps(game)) / 2
+
+
+def test_signed_and_missing_values_round_trip():
+    game = synthetic_games(1)[0]
+    game.mmr_change = -35
+    game.final_board = None
+    game.build_id = None
+    game.shops[0][0][0].health = -2
+    assert as_tuples(game_format.decode_game(game_format.encode_game(game))) == as_tuples(game)
+    game.build_id = "a\0b"
+    with pytest.raises(ValueError):
+        game_format.encode_game(game)
+
+
+def test_streaming_and_random_access(tmp_path):
+    games = synthetic_games(3) + [run_history_reader.extract_game_from_record_file(RECORD)]
+    path = tmp_path / ("games" + game_format.GAMES_SUFFIX)
+    game_format.dump_games(games, path)
+    expected = [as_tuples(game) for game in games]
+    assert [as_tuples(game) for game in game_format.iter_games(path)] == expected
+    assert [as_tuples(game) for game in game_format.load_games(path)] == expected
+    with game_format.GameFile(path) as game_file:
+        assert len(game_file) == 4
+        assert as_tuples(game_file[2]) == expected[2]
+        assert as_tuples(game_file[-1]) == expected[-1]
+        assert as_tuples(game_file[0]) == expected[0]
+        with pytest.raises(IndexError):
+            game_file[4]
+
+
+def test_bad_games_files(tmp_path):
+    path = tmp_path / "bad.sbbg"
+    path.write_bytes(b"SBBX\x01\x00\x00")
+    with pytest.raises(ValueError):
+        game_format.load_games(path)
+    with pytest.raises(ValueError):
+        list(game_format.iter_games(path))
+
+    # A writer that was never closed leaves frames that can be streamed, but no index
+    writer = game_format.GameWriter(path)
+    writer.write(synthetic_games(1)[0])
+    writer.f.close()
+    with pytest.raises(ValueError):
+        game_format.GameFile(path)
+    with pytest.raises(ValueError):
+        list(game_format.iter_games(path))
@@ -0,0 +1,91 @@
+import os
+import sqlite3
+
+import pytest
+
+import analyze_games
+import game_store
+import run_history_reader
+from test_analyze_games import sample_games
+
+RECORD = os.path.join("test_samples", "example_record.bin")
+PLAYER_ID = "429402B2E2AD1FA4"
+
+
+@pytest.fixture(scope="module")
+def game():
+    return run_history_reader.extract_game_from_record_file(RECORD)
+
+
+def test_reports_match_analyze_games():
+    games = sample_games()
+    reports = analyze_games.analyze_games(games)
+    with game_store.GameStore() as store:
+        store.add_games(games)
+        assert len(store) == 3
+        assert store.purchases_by_level(analyze_games.MAIN_PLAYER_ID) == \
+            list(reports["purchases"].itertuples(index=False, name=None))
+        assert store.purchases_by_level(analyze_games.MAIN_PLAYER_ID, level=3) == [(3, "Bear", 2, 1.5)]
+        assert store.rolls_by_turn() == list(reports["rolls"].itertuples(index=False, name=None))
+        assert store.head_to_head(analyze_games.MAIN_PLAYER_ID) == [("Rival", "Rival", 2, 1), ("Other", "Other", 1, 1)]
+        assert store.head_to_head(analyze_games.MAIN_PLAYER_ID, "Other") == [("Other", "Other", 1, 1)]
+
+
+def test_example_game(game, tmp_path):
+    path = tmp_path / "games.sqlite"
+    with game_store.GameStore(path) as store:
+        game_id = store.add_game(game, RECORD)
+    with game_store.GameStore(path) as store:
+        connection = store.connection
+        assert connection.execute("SELECT turns, placement, build_id FROM games WHERE game = ?",
+                                  (game_id,)).fetchone() == (game.turn, game.placement, game.build_id)
+        purchases = connection.execute("SELECT name FROM purchases ORDER BY turn, roll, position").fetchall()
+        assert [name for name, in purchases] == [unit.name for shops in game.bought for shop in shops for unit in shop]
+        assert connection.execute("SELECT COUNT(*) FROM final_board_units WHERE kind = 'character'").fetchone()[0] == \
+            len(game.final_board.units)
+
+        tier_2 = [choice for choice in game.treasure_choices if choice.tier == 2]
+        rates = store.treasure_pick_rates(2)
+        assert sum(row.offered for row in rates) == sum(len(choice.choices) for choice in tier_2)
+        assert sorted(row.name for row in rates if row.picked) == sorted(choice.chosen for choice in tier_2)
+        assert all(row.pick_rate == row.picked / row.offered for row in rates)
+        assert {row.tier for row in store.treasure_pick_rates()} == {choice.tier for choice in game.treasure_choices}
+
+        assert len(store.head_to_head(PLAYER_ID)) == len(game.final_results) - 1
+        plan = connection.execute("EXPLAIN QUERY PLAN SELECT * FROM results WHERE player_id = ?", (PLAYER_ID,))
+        assert any("results_player" in row[-1] for row in plan)
+
+
+def test_adding_a_source_again_replaces_its_game(game):
+    with game_store.GameStore() as store:
+        store.add_games([game, game], ["a", "b"])
+        store.add_game(game, "a")
+        assert len(store) == 2
+        # The rows of the replaced game went with it
+        assert store.connection.execute("SELECT COUNT(DISTINCT game) FROM leaderboards").fetchone()[0] == 2
+        assert store.connection.execute("SELECT COUNT(DISTINCT game) FROM treasure_options").fetchone()[0] == 2
+        with pytest.raises(ValueError):
+            store.add_games([game], ["a", "b"])
+
+    # Of the games of a batch with the same source, the last one is kept
+    other = run_history_reader.Game()
+    other.placement = 7
+    with game_store.GameStore() as store:
+        store.add_games([game, game], ["a", "a"])
+        assert len(store) == 1
+        ids = store.add_games([game, other, game, other], ["a", "a", "b", None])
+        assert len(store) == 3
+        assert ids[0] == ids[1] and len(set(ids)) == 3
+        assert store.connection.execute("SELECT placement FROM games WHERE source = 'a'").fetchone() == (7,)
+        assert store.connection.execute("SELECT COUNT(*) FROM turns WHERE game = ?", (ids[0],)).fetchone() == (0,)
+        assert store.connection.execute("SELECT COUNT(*) FROM turns WHERE game = ?", (ids[2],)).fetchone() == \
+            (game.turn,)
+
+
+def test_other_store_versions_are_rejected(tmp_path):
+    path = tmp_path / "games.sqlite"
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA user_version = {}".format(game_store.STORE_VERSION + 1))
+    connection.close()
+    with pytest.raises(ValueError):
+        game_store.GameStore(path)
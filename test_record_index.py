@@ -0,0 +1,53 @@
+import os
+import shutil
+
+import pytest
+
+import record_index
+import record_parser
+
+
+@pytest.fixture
+def record_path(tmp_path):
+    path = tmp_path / "record_example.txt"
+    shutil.copy(os.path.join("test_samples", "example_record.bin"), path)
+    return path
+
+
+def test_build_action_index_matches_full_parse(record_path):
+    index = record_index.build_action_index(record_path)
+    actions = list(record_parser.iter_actions(record_path))
+    assert len(index) == len(actions) == 8777
+    assert index.is_complete
+    assert list(index.offsets) == [offset for offset, _ in actions]
+    assert list(index.timestamps) == [action.timestamp for _, action in actions]
+    assert os.path.exists(record_index.index_path_for(record_path))
+
+
+def test_load_action_index_round_trips(record_path):
+    built = record_index.build_action_index(record_path)
+    loaded = record_index.load_action_index(record_path)
+    assert loaded.offsets == built.offsets
+    assert loaded.action_ids == built.action_ids
+    assert loaded.timestamps == built.timestamps
+    assert loaded.parsed_length == built.parsed_length
+
+
+def test_load_action_index_rebuilds_stale_index(record_path):
+    record_index.build_action_index(record_path)
+    with open(record_path, 'ab') as f:
+        f.write(b"\x00")
+    index = record_index.load_action_index(record_path)
+    assert index.record_size == os.path.getsize(record_path)
+    assert not index.is_complete
+
+
+def test_iter_indexed_actions(record_path):
+    shops = list(record_index.iter_indexed_actions(record_path, ["ActionEnterShopPhase"]))
+    assert len(shops) == 17
+    assert [action.round for _, action in shops] == list(range(1, 18))
+    index = record_index.load_action_index(record_path)
+    results_offset = index.last_offset_of("ActionEnterResultsPhase")
+    (offset, results), = record_index.iter_indexed_actions(record_path, ["ActionEnterResultsPhase"], index)
+    assert offset == results_offset
+    assert results.placement == 1
@@ -1,8 +1,13 @@
 import record_parser
 from typing import Tuple
+import io
 import os
+import pickle
 import math
+import subprocess
+import sys
 import pytest
+import construct
 
 def load_binary_file(base_filename: str) -> bytes:
     binary_filename = base_filename + ".bin"
@@ -424,3 +429,360 @@ def test_create_card_alt_art():
 
 
 
+
+
+def test_action_dispatch_matches_action_structs():
+    for action_name, action_struct in record_parser.action_name_to_struct.items():
+        binary = load_binary_file(action_name)
+        assert record_parser.STRUCT_ACTION.parse(binary) == action_struct.parse(binary)
+
+
+def test_action_dispatch_rejects_unknown_action_id():
+    binary = b"\x0F\x00" + load_binary_file("ActionRoll")[2:]
+    with pytest.raises(construct.MappingError):
+        record_parser.STRUCT_ACTION.parse(binary)
+
+
+def test_action_dispatch_parses_example_record():
+    with open(os.path.join("test_samples", "example_record.bin"), 'rb') as f:
+        result = construct.GreedyRange(record_parser.STRUCT_ACTION).parse_stream(f)
+        assert f.read() == b""
+    assert len(result) == 8777
+
+
+def test_fast_codecs_match_action_structs():
+    for action_id, codec in record_parser.fast_action_codecs.items():
+        binary = load_binary_file(codec.action_name)
+        reference = record_parser.id_to_action_struct[action_id].parse(binary)
+        assert codec.size == len(binary)
+        assert reference == codec.unpack_from(binary)._asdict()
+
+
+def test_fast_actions_pickle_as_module_types():
+    binary = load_binary_file("ActionDealDamage")
+    action, _ = record_parser.ActionDecoder(binary).decode(0)
+    assert type(action) is record_parser.ActionDealDamage
+    assert type(record_parser.ActionDecoder(binary, guid_format="int").decode(0)[0]) is type(action)
+    assert pickle.loads(pickle.dumps(action)) == action
+
+
+def test_fast_codecs_match_action_structs_on_example_record():
+    with open(os.path.join("test_samples", "example_record.bin"), 'rb') as f:
+        reference = construct.GreedyRange(record_parser.STRUCT_ACTION).parse_stream(f)
+        f.seek(0)
+        result = record_parser.parse_actions(f)
+        assert f.read() == b""
+    assert len(result) == len(reference)
+    for expected, action in zip(reference, result):
+        if isinstance(action, tuple):
+            action = action._asdict()
+        assert expected == action
+
+
+def test_parse_actions_stops_at_unknown_action():
+    binary = load_binary_file("ActionRoll") + b"\x0F\x00" + load_binary_file("ActionRoll")[2:]
+    stream = io.BytesIO(binary)
+    result = record_parser.parse_actions(stream)
+    assert len(result) == 1
+    assert result[0].timestamp == 608
+    assert stream.read() == binary[len(load_binary_file("ActionRoll")):]
+
+
+def test_iter_actions_yields_offsets():
+    roll = load_binary_file("ActionRoll")
+    attack = load_binary_file("ActionAttack")
+    stream = io.BytesIO(b"prefix" + roll + attack)
+    stream.seek(6)
+    result = list(record_parser.iter_actions(stream))
+    assert [offset for offset, _ in result] == [6, 6 + len(roll)]
+    assert result[0][1].timestamp == 608
+    assert result[1][1].attacker == "ea8330c51fdf43759488e2590d9b8544"
+    assert stream.read() == b""
+
+
+def test_iter_actions_leaves_file_after_last_yielded_action():
+    roll = load_binary_file("ActionRoll")
+    stream = io.BytesIO(roll + roll + roll)
+    iterator = record_parser.iter_actions(stream)
+    next(iterator)
+    iterator.close()
+    assert stream.tell() == len(roll)
+
+
+def test_iter_actions_from_path():
+    path = os.path.join("test_samples", "example_record.bin")
+    first_offset, first_action = next(record_parser.iter_actions(path))
+    assert first_offset == 0
+    assert record_parser.id_to_action_name[first_action.action_id] == "ActionEnterIntroPhase"
+
+
+def test_iter_actions_mmap_matches_buffered_reader():
+    path = os.path.join("test_samples", "example_record.bin")
+    buffered = list(record_parser.iter_actions(path))
+    mapped = list(record_parser.iter_actions(path, use_mmap=True))
+    assert len(mapped) == len(buffered)
+    for (expected_offset, expected), (offset, action) in zip(buffered, mapped):
+        assert offset == expected_offset
+        assert action == expected
+
+
+def test_iter_actions_mmap_defers_unused_fields():
+    path = os.path.join("test_samples", "example_record.bin")
+    for _, action in record_parser.iter_actions(path, use_mmap=True):
+        if record_parser.id_to_action_name[action.action_id] == "ActionConnectionInfo":
+            assert isinstance(dict.__getitem__(action, "server_ip"), record_parser.DeferredField)
+            assert isinstance(action.build_id, str)
+            assert isinstance(action.server_ip, str)
+            assert not isinstance(dict.__getitem__(action, "server_ip"), record_parser.DeferredField)
+        if record_parser.id_to_action_name[action.action_id] == "ActionUpdateCard":
+            assert isinstance(dict.__getitem__(action.card, "frame_override"), record_parser.DeferredField)
+            assert isinstance(dict.__getitem__(action.card, "valid_targets"), record_parser.DeferredField)
+
+
+def test_lazy_and_eager_decoding_agree_on_guid_format():
+    binary = load_binary_file("UpdateCardExample9")
+    for guid_format, guid_type in (("bytes", bytes), ("int", int)):
+        eager, _ = record_parser.ActionDecoder(binary, guid_format=guid_format).decode(0)
+        lazy, _ = record_parser.ActionDecoder(binary, lazy=True, guid_format=guid_format).decode(0)
+        assert isinstance(dict.__getitem__(lazy.card, "valid_targets"), record_parser.DeferredField)
+        assert type(lazy.card.valid_targets[0]) is guid_type
+        assert lazy.card.valid_targets == eager.card.valid_targets
+    # Deferred strings go through the string pool too
+    pool = record_parser.StringPool()
+    lazy, _ = record_parser.ActionDecoder(load_binary_file("CreateCardAltArt"), lazy=True, string_pool=pool).decode(0)
+    assert lazy.card.art_id == "SKIN_HERO_DRAGONMOTHERGWEN"
+    assert lazy.card.art_id in pool.strings.values()
+
+
+def test_lazy_fields_parse_eagerly_by_default():
+    binary = load_binary_file("UpdateCardExample9")
+    result = record_parser.STRUCT_ACTION_UPDATE_CARD.parse(binary)
+    assert type(result.card) is construct.Container
+    assert len(result.card.valid_targets) == 10
+
+
+def test_skip_matches_decoded_length():
+    for action_name in record_parser.action_name_to_struct:
+        binary = load_binary_file(action_name)
+        assert record_parser.ActionDecoder(binary).skip(0) == len(binary)
+    for i in range(10):
+        binary = load_binary_file("UpdateCardExample{}".format(i))
+        assert record_parser.ActionDecoder(binary).skip(0) == len(binary)
+
+
+def test_skip_rejects_truncated_action():
+    binary = load_binary_file("ActionEnterResultsPhase")
+    with pytest.raises(construct.ConstructError):
+        record_parser.ActionDecoder(binary[:-1]).skip(0)
+
+
+def test_iter_actions_filters_action_types():
+    path = os.path.join("test_samples", "example_record.bin")
+    wanted = {"ActionAddPlayer", "ActionConnectionInfo"}
+    expected = [(offset, action) for offset, action in record_parser.iter_actions(path)
+                if record_parser.id_to_action_name[action.action_id] in wanted]
+    result = list(record_parser.iter_actions(path, action_names=wanted))
+    assert len(result) == 151
+    assert result == expected
+
+
+def test_guid_formats():
+    binary = load_binary_file("ActionAttack")
+    raw = binary[10:26]
+    assert record_parser.guid_bytes_to_hex(raw) == "ea8330c51fdf43759488e2590d9b8544"
+    assert record_parser.guid_bytes_to_int(raw) == 0xea8330c51fdf43759488e2590d9b8544
+    assert record_parser.guid_to_hex(raw) == "ea8330c51fdf43759488e2590d9b8544"
+    assert record_parser.guid_to_hex(record_parser.guid_bytes_to_int(raw)) == "ea8330c51fdf43759488e2590d9b8544"
+
+
+def test_guid_format_is_consistent_across_decoders():
+    path = os.path.join("test_samples", "example_record.bin")
+    reference = list(record_parser.iter_actions(path))
+    for guid_format, guid_type in [("bytes", bytes), ("int", int)]:
+        result = list(record_parser.iter_actions(path, guid_format=guid_format))
+        for (_, expected), (_, action) in zip(reference, result):
+            action_name = record_parser.id_to_action_name[action.action_id]
+            if action_name == "ActionAttack":
+                assert isinstance(action.attacker, guid_type)
+                assert record_parser.guid_to_hex(action.attacker) == expected.attacker
+            elif action_name == "ActionCreateCard":
+                assert isinstance(action.card.card_id, guid_type)
+                assert record_parser.guid_to_hex(action.card.card_id) == expected.card.card_id
+
+
+def test_guids_are_interned_per_record():
+    path = os.path.join("test_samples", "example_record.bin")
+    cards = {}
+    for _, action in record_parser.iter_actions(path):
+        if record_parser.id_to_action_name[action.action_id] in ["ActionCreateCard", "ActionUpdateCard"]:
+            cards.setdefault(action.card.card_id, []).append(action.card.card_id)
+    for guids in cards.values():
+        assert all(guid is guids[0] for guid in guids)
+
+
+def test_string_pool_interns_repeated_strings():
+    path = os.path.join("test_samples", "example_record.bin")
+    string_pool = record_parser.StringPool()
+    player_ids = [action.player_id for _, action in
+                  record_parser.iter_actions(path, action_names={"ActionModifyGold"}, string_pool=string_pool)]
+    assert len(player_ids) == 156
+    assert all(player_id is player_ids[0] for player_id in player_ids if player_id == player_ids[0])
+    pool_size = len(string_pool)
+    again = [action.player_id for _, action in
+             record_parser.iter_actions(path, action_names={"ActionModifyGold"}, string_pool=string_pool)]
+    assert len(string_pool) == pool_size
+    assert all(first is second for first, second in zip(player_ids, again))
+
+
+def test_utf16_string_matches_padded_string():
+    padded = construct.PaddedString(8, "utf_16_le")
+    pooled = record_parser.Utf16String(8)
+    for raw in [b"a\x00b\x00\x00\x00\x00\x00", b"a\x00b\x00c\x00d\x00", b"\x00" * 8]:
+        assert pooled.parse(raw) == padded.parse(raw)
+        assert pooled.parse(raw, string_pool=record_parser.StringPool()) == padded.parse(raw)
+    assert pooled.build("ab") == padded.build("ab")
+
+
+def _example_record():
+    with open(os.path.join("test_samples", "example_record.bin"), 'rb') as f:
+        return f.read()
+
+
+def test_iter_actions_recovers_from_unknown_action():
+    data = _example_record()
+    offsets = [offset for offset, _ in record_parser.iter_actions(io.BytesIO(data))]
+    junk = b"\x0f\x00" + b"\xaa" * 37
+    corrupted = data[:offsets[100]] + junk + data[offsets[100]:]
+    assert len(list(record_parser.iter_actions(io.BytesIO(corrupted)))) == 100
+
+    report = record_parser.RecoveryReport()
+    f = io.BytesIO(corrupted)
+    recovered = list(record_parser.iter_actions(f, report=report))
+    assert len(recovered) == 8777
+    assert recovered[100][0] == offsets[100] + len(junk)
+    assert report.skipped_ranges == [(offsets[100], offsets[100] + len(junk), "unknown action id 0x000f")]
+    assert report.unknown_opcodes == {0x0f: 1}
+    assert report.skipped_bytes == len(junk)
+    assert f.read() == b""
+
+
+def test_iter_actions_recovers_from_corrupt_action():
+    data = bytearray(_example_record())
+    offsets = [offset for offset, _ in record_parser.iter_actions(io.BytesIO(data))]
+    data[offsets[500] + 10:offsets[501]] = b"\xff" * (offsets[501] - offsets[500] - 10)
+    report = record_parser.RecoveryReport()
+    recovered = list(record_parser.iter_actions(io.BytesIO(bytes(data)), report=report))
+    assert len(recovered) == 8776
+    assert [start for start, _, _ in report.skipped_ranges] == [offsets[500]]
+    assert report.skipped_ranges[0][1] == offsets[501]
+    assert report.unknown_opcodes == {}
+
+
+def test_iter_actions_recovery_of_truncated_record():
+    data = _example_record()[:-5]
+    report = record_parser.RecoveryReport()
+    f = io.BytesIO(data)
+    recovered = list(record_parser.iter_actions(f, report=report, action_names={"ActionEnterIntroPhase"}))
+    assert [offset for offset, _ in recovered] == [0]
+    assert len(report.skipped_ranges) == 1
+    assert report.skipped_ranges[0][1] == len(data)
+    assert f.read() == b""
+
+
+def test_clean_record_has_empty_recovery_report():
+    report = record_parser.RecoveryReport()
+    assert len(list(record_parser.iter_actions(os.path.join("test_samples", "example_record.bin"), report=report))) \
+        == 8777
+    assert not report
+
+
+def test_schema_is_not_built_on_import():
+    code = "import sys, record_parser; print('record_schema' in sys.modules); record_parser.STRUCT_UNIT; " \
+           "print('record_schema' in sys.modules)"
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    assert output.split() == ["False", "True"]
+    assert record_parser.STRUCT_GUID.parse(bytes(range(16))).field_4 == int.from_bytes(bytes(range(8, 16)), "little")
+
+
+def test_action_skippers_are_compiled_on_demand():
+    assert callable(record_parser.action_skippers[b"\x02\x00"])
+    assert b"\x02\x00" in record_parser.action_skippers
+    with pytest.raises(KeyError):
+        record_parser.action_skippers[b"\x0f\x00"]
+    assert b"\x0f\x00" not in record_parser.action_skippers
+
+
+def test_guid_to_bytes_inverts_every_guid_format():
+    raw = load_binary_file("ActionDeath")[10:26]
+    for guid_format, formatter in record_parser.GUID_FORMATTERS.items():
+        assert record_parser.guid_to_bytes(formatter(raw)) == raw
+    with pytest.raises(ValueError):
+        record_parser.guid_to_bytes("abcd")
+
+
+def test_action_structs_build_parsed_samples():
+    for action_name, action_struct in record_parser.action_name_to_struct.items():
+        binary = load_binary_file(action_name)
+        parsed = action_struct.parse(binary)
+        assert action_struct.parse(action_struct.build(parsed)) == parsed
+
+
+def test_iter_actions_collects_decode_stats():
+    path = os.path.join("test_samples", "example_record.bin")
+    stats = record_parser.DecodeStats()
+    actions = list(record_parser.iter_actions(path, stats=stats))
+    assert stats.records == 1
+    assert stats.action_count == len(actions) == 8777
+    assert stats.decoded_bytes == os.path.getsize(path)
+    # Two chunks, and the empty read at the end of the file
+    assert stats.timers["read"].count == 3
+    for action_name, action_stats in stats.actions.items():
+        assert action_stats.count == sum(1 for _, action in actions
+                                          if record_parser.id_to_action_name[action.action_id] == action_name)
+        assert action_stats.seconds > 0
+    assert stats.actions["ActionRoll"].bytes == stats.actions["ActionRoll"].count * 10
+
+
+def test_iter_actions_reads_in_chunks():
+    path = os.path.join("test_samples", "example_record.bin")
+    expected = list(record_parser.iter_actions(path, chunk_size=1 << 30))
+    with open(path, 'rb') as f:
+        binary = f.read()
+    # Smaller and larger than the largest actions
+    for chunk_size in (100, 4096):
+        assert list(record_parser.iter_actions(path, chunk_size=chunk_size)) == expected
+        rolls = list(record_parser.iter_actions(path, action_names={"ActionRoll"}, chunk_size=chunk_size))
+        assert rolls == [(offset, action) for offset, action in expected
+                         if record_parser.id_to_action_name[action.action_id] == "ActionRoll"]
+        # A truncated record leaves the file at its last, incomplete action
+        f = io.BytesIO(binary[:-3])
+        assert len(list(record_parser.iter_actions(f, chunk_size=chunk_size))) == 8776
+        assert f.tell() == expected[-1][0]
+        # Recovery skips an unknown action id in the middle of a chunk
+        corrupt = bytearray(binary)
+        corrupt[expected[5000][0]:expected[5000][0] + 2] = b"\xfe\x00"
+        report = record_parser.RecoveryReport()
+        recovered = list(record_parser.iter_actions(io.BytesIO(bytes(corrupt)), report=report, chunk_size=chunk_size))
+        assert recovered == expected[:5000] + expected[5001:]
+        assert report.skipped_ranges == [(expected[5000][0], expected[5001][0], "unknown action id 0x00fe")]
+
+
+def test_decode_stats_merge():
+    first = record_parser.DecodeStats()
+    first.records = 1
+    first.add_action("ActionRoll", 10, 0.5)
+    first.add_time("read", 1.0)
+    second = record_parser.DecodeStats()
+    second.records = 1
+    second.add_action("ActionRoll", 10, 0.25)
+    second.add_action("ActionDeath", 26, 0.25)
+    with second.timer("read"):
+        pass
+    total = record_parser.DecodeStats.aggregate([first, second])
+    assert total.records == 2
+    assert total.actions["ActionRoll"] == record_parser.TimingStats(2, 20, 0.75)
+    assert total.actions["ActionDeath"] == record_parser.TimingStats(1, 26, 0.25)
+    assert total.timers["read"].count == 2
+    assert total.decode_seconds == 1.0
+    assert total.as_dict()["actions"]["ActionRoll"] == {"count": 2, "bytes": 20, "seconds": 0.75}
+    assert first.actions["ActionRoll"].count == 1
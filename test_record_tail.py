@@ -0,0 +1,100 @@
+import os
+
+import pytest
+
+import record_parser
+import record_tail
+
+
+@pytest.fixture
+def record_bytes():
+    with open(os.path.join("test_samples", "example_record.bin"), 'rb') as f:
+        return f.read()
+
+
+def test_tail_decodes_growing_record_incrementally(tmp_path, record_bytes):
+    path = tmp_path / "record_live.txt"
+    path.write_bytes(b"")
+    tail = record_tail.RecordTail(path)
+    seen = []
+    # Chunk boundaries deliberately fall in the middle of actions
+    for end in list(range(0, len(record_bytes), 7919)) + [len(record_bytes)]:
+        with open(path, 'wb') as f:
+            f.write(record_bytes[:end])
+        seen.extend(tail.poll())
+        assert tail.read_position == end
+        assert tail.offset + len(tail.pending) == end
+    expected = list(record_parser.iter_actions(os.path.join("test_samples", "example_record.bin")))
+    assert [offset for offset, _ in seen] == [offset for offset, _ in expected]
+    assert [action for _, action in seen] == [action for _, action in expected]
+    assert tail.pending == b""
+    assert tail.action_count == 8777
+
+
+def test_tail_buffers_partial_action(tmp_path, record_bytes):
+    path = tmp_path / "record_live.txt"
+    path.write_bytes(record_bytes[:5])
+    tail = record_tail.RecordTail(path)
+    assert tail.poll() == []
+    assert tail.offset == 0
+    assert tail.pending == record_bytes[:5]
+
+
+def test_tail_restarts_when_file_is_replaced(tmp_path, record_bytes):
+    path = tmp_path / "record_live.txt"
+    path.write_bytes(record_bytes[:20000])
+    tail = record_tail.RecordTail(path)
+    first = tail.poll()
+    path.write_bytes(record_bytes[:100])
+    again = tail.poll()
+    assert again and again[0][0] == 0
+    assert again[0][1] == first[0][1]
+
+
+def test_tail_waits_for_missing_file(tmp_path):
+    tail = record_tail.RecordTail(tmp_path / "record_missing.txt")
+    assert tail.poll() == []
+    assert list(tail.follow(interval=0, stop=lambda: True)) == []
+
+
+def test_tail_skips_corrupt_action_and_reports_it(tmp_path, record_bytes):
+    expected = list(record_parser.iter_actions(os.path.join("test_samples", "example_record.bin")))
+    corrupt_offset, _ = expected[100]
+    binary = bytearray(record_bytes[:expected[300][0]])
+    binary[corrupt_offset:corrupt_offset + 2] = b"\xfe\x00"
+    path = tmp_path / "record_live.txt"
+    path.write_bytes(b"")
+    tail = record_tail.RecordTail(path)
+    seen = []
+    # The first chunk ends in the middle of the action right after the corrupt one
+    for end in (expected[101][0] + 3, expected[150][0] + 5, len(binary)):
+        with open(path, 'wb') as f:
+            f.write(binary[:end])
+        seen.extend(tail.poll())
+        # Nothing before the corrupt action stays buffered
+        assert tail.offset >= corrupt_offset
+    assert [offset for offset, _ in seen] == [offset for offset, _ in expected[:300] if offset != corrupt_offset]
+    assert tail.pending == b""
+    assert tail.report.skipped_ranges == [(corrupt_offset, expected[101][0], "unknown action id 0x00fe")]
+    assert tail.report.unknown_opcodes == {0xfe: 1}
+
+
+def test_tail_waits_for_action_cut_inside_select(tmp_path, monkeypatch):
+    with open(os.path.join("test_samples", "ActionCreateCard.bin"), 'rb') as f:
+        binary = f.read()
+    path = tmp_path / "record_live.txt"
+    # Cut inside valid_targets, which fails with a SelectError rather than a StreamError
+    path.write_bytes(binary[:72])
+
+    def no_resync(*args):
+        raise AssertionError("resync scan over a partially written action")
+
+    monkeypatch.setattr(record_parser, "find_resync_offset", no_resync)
+    tail = record_tail.RecordTail(path)
+    assert tail.poll() == []
+    assert tail.pending == binary[:72]
+    assert tail.report.skipped_ranges == [] and not tail.report.unknown_opcodes
+    monkeypatch.undo()
+    path.write_bytes(binary)
+    assert [offset for offset, _ in tail.poll()] == [0]
+    assert tail.pending == b""
@@ -0,0 +1,56 @@
+import os
+import pickle
+
+import pytest
+
+import run_history_reader
+from run_history_reader import Board, Game, Player, TreasureChoice, Unit
+
+RECORD = os.path.join("test_samples", "example_record.bin")
+
+
+def test_unit_subtypes_and_keywords_are_bitsets():
+    unit = Unit(1, 2, "Name", "character", ["slay", "4"], ["mage", "dwarf", "mage"])
+    assert unit.keyword_mask == 1 << 4 | 1 << 7
+    assert unit.keywords == ["4", "slay"]
+    assert unit.subtypes == ["mage", "dwarf"]
+    unit.subtypes = ["evil"]
+    assert unit.subtypes == ["evil"]
+    assert Unit(1, 2, "Name", "character").subtypes == []
+    with pytest.raises(KeyError):
+        run_history_reader.SUBTYPE_BITS.mask(["not a subtype"])
+
+
+def test_model_classes_are_slotted():
+    for instance in (Unit(1, 1, "Name", "shop"), Board("Hero", [], []), Player("Hero", 40, 2, 0, "Name", "ID", 0),
+                     TreasureChoice([], 2), Game()):
+        assert not hasattr(instance, "__dict__")
+        with pytest.raises(AttributeError):
+            instance.not_an_attribute = None
+
+
+def test_game_pickle_round_trip():
+    game = run_history_reader.extract_game_from_record_file(RECORD)
+    loaded = pickle.loads(pickle.dumps(game))
+    assert pickle.dumps(loaded) == pickle.dumps(game)
+    assert loaded.final_board.units[0].subtypes == game.final_board.units[0].subtypes
+
+
+def test_games_pickled_before_slots_still_load():
+    with open(os.path.join("test_samples", "legacy_game.pkl"), 'rb') as f:
+        legacy = pickle.load(f)
+    game = run_history_reader.extract_game_from_record_file(RECORD)
+    assert isinstance(legacy, Game)
+    assert legacy.turn == game.turn and legacy.placement == game.placement
+    assert legacy.recovery_report is None
+    assert [player.name for player in legacy.final_results] == [player.name for player in game.final_results]
+    for legacy_unit, unit in zip(legacy.final_board.units, game.final_board.units):
+        assert (legacy_unit.name, legacy_unit.zone, legacy_unit.subtype_mask, legacy_unit.keyword_mask) == \
+            (unit.name, unit.zone, unit.subtype_mask, unit.keyword_mask)
+    assert pickle.loads(pickle.dumps(legacy)).final_board.units[0].subtypes == game.final_board.units[0].subtypes
+
+
+def test_template_id_dict_is_built_once():
+    template_id_dict = run_history_reader.template_id_dict
+    assert run_history_reader.template_id_dict is template_id_dict
+    assert template_id_dict == run_history_reader.default_template_db().as_dict()
@@ -0,0 +1,58 @@
+import io
+import os
+
+import pytest
+
+import record_parser
+import synthetic_records
+from run_history_reader import extract_game_from_record_file
+
+
+def test_synthetic_record_parses_completely():
+    binary = synthetic_records.SyntheticGame(turns=8, players=4, seed=3).to_bytes()
+    f = io.BytesIO(binary)
+    actions = list(record_parser.iter_actions(f))
+    assert f.read() == b""
+    action_names = [record_parser.id_to_action_name[action.action_id] for _, action in actions]
+    assert action_names[0] == "ActionEnterIntroPhase"
+    assert "ActionEnterResultsPhase" in action_names
+    for action_name in ("ActionRoll", "ActionAttack", "ActionDealDamage", "ActionDeath", "ActionBrawlComplete"):
+        assert action_name in action_names
+    timestamps = [action.timestamp for _, action in actions if action.timestamp != 0]
+    assert timestamps == list(range(1, len(timestamps) + 1))
+
+
+def test_synthetic_record_is_reproducible():
+    first = synthetic_records.SyntheticGame(turns=5, seed="a").to_bytes()
+    assert synthetic_records.SyntheticGame(turns=5, seed="a").to_bytes() == first
+    assert synthetic_records.SyntheticGame(turns=5, seed="b").to_bytes() != first
+
+
+def test_synthetic_record_extracts_to_a_game(tmp_path):
+    path = os.path.join(tmp_path, "record_synthetic.txt")
+    synthetic_records.SyntheticGame(turns=10, players=8, seed=1).write(path)
+    game = extract_game_from_record_file(path)
+    assert game.game_over
+    assert game.build_id == "synthetic"
+    assert 1 <= game.turn <= 10
+    assert len(game.shops) == game.turn
+    assert len(game.leaderboards) == game.turn
+    assert sorted(player.place for player in game.final_results) == list(range(1, 9))
+    assert game.placement in range(1, 9)
+    assert all(choice.chosen in choice.choices for choice in game.treasure_choices)
+
+
+def test_generate_corpus(tmp_path):
+    paths = synthetic_records.generate_corpus(tmp_path, 3, turns=3, players=2, seed=7)
+    assert [os.path.basename(path) for path in paths] == \
+        ["record_synthetic_000000.txt", "record_synthetic_000001.txt", "record_synthetic_000002.txt"]
+    contents = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            contents.append(f.read())
+    assert len(set(contents)) == 3
+
+
+def test_synthetic_game_needs_two_players():
+    with pytest.raises(ValueError):
+        synthetic_records.SyntheticGame(players=1)
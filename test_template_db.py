@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+import template_db
+
+
+@pytest.fixture
+def templates(tmp_path):
+    path = tmp_path / "template-ids.json"
+    path.write_text(json.dumps({
+        "0": {"Id": "SBB_CHARACTER_FROGPRINCE", "Name": "Frog Prince"},
+        "5": {"Id": "SBB_CHARACTER_BABAYAGA", "Name": "Baba Yaga"},
+        "8": {"Id": "SBB_TREASURE_EASTEREGG", "Name": "Easter Egg"},
+        "9": {"Id": "SBB_HERO_MUERTE", "Name": "Muerte"},
+        "12": {"Id": "SBB_SPELL_FALLINGSTARS", "Name": "Falling Stars"},
+    }))
+    return template_db.TemplateDB(path)
+
+
+def test_template_db_loads_lazily(templates):
+    assert templates._names is None
+    assert templates.name(5) == "Baba Yaga"
+    assert templates._names is not None
+
+
+def test_template_db_lookups(templates):
+    assert len(templates) == 5
+    assert 9 in templates and 1 not in templates and -1 not in templates and 1000 not in templates
+    assert templates.name(1) is None
+    assert templates.name(1000, "Unknown") == "Unknown"
+    assert templates.unit_name(5) == "Baba Yaga"
+    assert templates.unit_name(6, is_golden=True) == "Baba Yaga"
+    assert templates.unit_name(13, is_golden=True) == "Falling Stars"
+    assert templates.unit_name(7, is_golden=True, default="Unknown") == "Unknown"
+    assert templates.base_id(6, is_golden=True) == 5
+    assert templates.string_id(8) == "SBB_TREASURE_EASTEREGG"
+
+
+def test_template_db_categories(templates):
+    assert [templates.category(template_id) for template_id in (0, 8, 9, 12, 1)] == \
+        [template_db.CHARACTER, template_db.TREASURE, template_db.HERO, template_db.SPELL, None]
+
+
+def test_template_db_as_dict_round_trips(templates):
+    with open(templates.path) as f:
+        assert templates.as_dict() == json.load(f)
+
+
+def test_default_template_db_can_be_overridden(templates):
+    previous = template_db.default_template_db()
+    try:
+        assert template_db.set_template_path(templates.path) is template_db.default_template_db()
+        assert template_db.default_template_db().name(9) == "Muerte"
+    finally:
+        template_db._default_template_db = previous
+    assert template_db.default_template_db().name(0) == "Frog Prince"